@@ -0,0 +1,489 @@
+import argparse
+import random
+import threading
+import time
+from collections import deque
+
+import matchlog
+from engine import PlayerEngine, FixedStep, KICKS, SPAWN_X, SPAWN_Y
+from net import join_connect
+from replication import EventStream
+from tetris_core import W, H, HIDDEN, TETROS, can_place, lock_piece, clear_lines, empty_board
+
+try:
+    import numpy as np
+except ImportError:  # numpy opsiyonel: yoksa skorlar tek tek evaluate() ile
+    np = None
+
+BOT_BUDGET_S = 0.002     # thinking time per update() call (one frame)
+BOT_INPUT_HZ = 0         # inputs per second while executing a plan; 0 = whole plan at once
+BOT_FPS = 60             # headless bot loop rate
+YIELD_EVERY = 64         # search states between budget checks
+LOOKAHEAD_BEAM = 4       # best placements that also get scored one preview piece deep (0 = off)
+
+# Placement score = sum(weight * feature) on the board after the lock
+# (aggregate height / cleared lines / holes / bumpiness).
+WEIGHTS = {"height": -0.51, "lines": 0.76, "holes": -0.36, "bump": -0.18}
+
+
+def _fitter(board, piece):
+    """can_place for one piece on one board, memoized: the BFS asks about most states several times."""
+    memo = {}
+
+    def fits(rot, x, y) -> bool:
+        k = (rot, x, y)
+        v = memo.get(k)
+        if v is None:
+            v = memo[k] = can_place(board, piece, rot, x, y)
+        return v
+    return fits
+
+
+def _moves(fits, st):
+    """(input, next state) pairs from st; rotations take the first kick that fits, like PlayerEngine.rotate."""
+    rot, x, y = st
+    if fits(rot, x - 1, y):
+        yield "L", (rot, x - 1, y)
+    if fits(rot, x + 1, y):
+        yield "R", (rot, x + 1, y)
+    for name, d in (("CW", 1), ("CCW", -1)):
+        nr = (rot + d) % 4
+        for dx, dy in KICKS:
+            if fits(nr, x + dx, y + dy):
+                yield name, (nr, x + dx, y + dy)
+                break
+    if fits(rot, x, y + 1):
+        yield "D", (rot, x, y + 1)
+
+
+def _path(parents, st) -> list:
+    # trailing "D"s are a straight fall onto a resting state: hard_drop does that in one go
+    while parents[st] is not None and parents[st][1] == "D":
+        st = parents[st][0]
+    out = []
+    while parents[st] is not None:
+        prev, mv = parents[st]
+        out.append((mv, st))
+        st = prev
+    out.reverse()
+    return out
+
+
+def search_placements(board, piece, start):
+    """
+    BFS over (rot, x, y) from start. Generator: yields None every YIELD_EVERY
+    states, returns (finals, parents) where finals are the resting states,
+    one per distinct set of cells, in shortest-path order.
+    """
+    fits = _fitter(board, piece)
+    parents = {start: None}
+    q = deque([start])
+    finals = []
+    seen_cells = set()
+    n = 0
+    while q:
+        st = q.popleft()
+        resting = True
+        for mv, nst in _moves(fits, st):
+            if mv == "D":
+                resting = False
+            if nst not in parents:
+                parents[nst] = (st, mv)
+                q.append(nst)
+        if resting:
+            rot, x, y = st
+            cells = frozenset((x + cx, y + cy) for cx, cy in TETROS[piece][rot])
+            if cells not in seen_cells:
+                seen_cells.add(cells)
+                finals.append(st)
+        n += 1
+        if n % YIELD_EVERY == 0:
+            yield None
+    return finals, parents
+
+
+def reach_moves(board, piece, start, target):
+    """Generator: shortest input path from start to target (BFS, stops early), None if unreachable."""
+    fits = _fitter(board, piece)
+    parents = {start: None}
+    q = deque([start])
+    n = 0
+    while q:
+        st = q.popleft()
+        if st == target:
+            return _path(parents, st)
+        for _mv, nst in _moves(fits, st):
+            if nst not in parents:
+                parents[nst] = (st, _mv)
+                q.append(nst)
+        n += 1
+        if n % YIELD_EVERY == 0:
+            yield None
+    return None
+
+
+def _score(height, lines, holes, bump):
+    # shared by evaluate / evaluate_batch so both round exactly the same way
+    return (WEIGHTS["height"] * height + WEIGHTS["lines"] * lines
+            + WEIGHTS["holes"] * holes + WEIGHTS["bump"] * bump)
+
+
+def _after_lock(board, piece, rot, x, y) -> tuple[list, int]:
+    b = [row[:] for row in board]
+    lock_piece(b, piece, rot, x, y)
+    return b, clear_lines(b)
+
+
+def evaluate(board, piece, rot, x, y) -> float:
+    """Reference scorer for one placement, straight on tetris_core boards."""
+    b, lines = _after_lock(board, piece, rot, x, y)
+
+    heights = []
+    holes = 0
+    for cx in range(W):
+        top = None
+        for cy in range(H + HIDDEN):
+            if b[cy][cx] is not None:
+                if top is None:
+                    top = cy
+            elif top is not None:
+                holes += 1
+        heights.append(0 if top is None else H + HIDDEN - top)
+    bump = sum(abs(heights[i] - heights[i + 1]) for i in range(W - 1))
+    return _score(sum(heights), lines, holes, bump)
+
+
+def evaluate_batch(board, piece, finals) -> list[float]:
+    """
+    evaluate() for every (rot, x, y) in finals at once: all result boards are
+    stacked into one (n, rows, W) array and locked / cleared / measured in
+    vectorized passes. Same numbers as evaluate(); falls back to it without numpy.
+    """
+    if np is None or not finals:
+        return [evaluate(board, piece, *st) for st in finals]
+    n, rows = len(finals), H + HIDDEN
+    occ = np.array([[v is not None for v in row] for row in board], dtype=bool)
+    occ = np.repeat(occ[None], n, axis=0)
+
+    cells = np.array([[(y + cy, x + cx) for cx, cy in TETROS[piece][rot]] for rot, x, y in finals])
+    occ[np.arange(n)[:, None], cells[..., 0], cells[..., 1]] = True
+
+    # clear_lines: full rows below the hidden area go, empty rows come in on top
+    full = occ.all(axis=2)
+    full[:, :HIDDEN] = False
+    lines = full.sum(axis=1)
+    order = np.argsort(~full, axis=1, kind="stable")     # cleared rows first, the rest in order
+    occ = np.take_along_axis(occ, order[:, :, None], axis=1)
+    occ[np.arange(rows)[None, :] < lines[:, None]] = False
+
+    filled = occ.any(axis=1)
+    heights = np.where(filled, rows - occ.argmax(axis=1), 0)
+    holes = (heights - occ.sum(axis=1)).sum(axis=1)
+    bump = np.abs(np.diff(heights, axis=1)).sum(axis=1)
+    return _score(heights.sum(axis=1), lines, holes, bump).tolist()
+
+
+def best_followup(board, piece):
+    """Generator: best evaluate() score for piece dropped in from spawn on board, None if it cannot spawn."""
+    if not can_place(board, piece, 0, SPAWN_X, SPAWN_Y):
+        return None
+    finals, _parents = yield from search_placements(board, piece, (0, SPAWN_X, SPAWN_Y))
+    return max(evaluate_batch(board, piece, finals), default=None)
+
+
+def plan_moves(board, cur, start, alt=None, preview=None, alt_preview=None, blunder: float = 0.0):
+    """
+    Generator: best placement for cur (from start) or, if alt is given, for alt
+    after a hold (from spawn). preview / alt_preview is the piece that comes
+    next in either case: the LOOKAHEAD_BEAM best placements are re-scored by
+    where that piece can go afterwards. Returns (score, use_hold, piece,
+    final state, [(input, state after)...]) or None when nothing fits.
+    With probability blunder it takes a random placement from the better half.
+    """
+    options = [(False, cur, start, preview)]
+    if alt is not None and alt != cur:
+        options.append((True, alt, (0, SPAWN_X, SPAWN_Y), alt_preview))
+
+    cands = []    # (score, use_hold, piece, final state, parents, next piece)
+    for use_hold, piece, st0, nxt in options:
+        if not can_place(board, piece, *st0):
+            continue
+        finals, parents = yield from search_placements(board, piece, st0)
+        scores = evaluate_batch(board, piece, finals)
+        cands.extend((sc, use_hold, piece, st, parents, nxt) for sc, st in zip(scores, finals))
+        yield None
+    if not cands:
+        return None
+
+    # stable sort: equal scores keep search order (hold option last)
+    cands.sort(key=lambda c: -c[0])
+    best = cands[0]
+    if blunder > 0 and random.random() < blunder:
+        best = random.choice(cands[:len(cands) // 2 + 1])
+    elif LOOKAHEAD_BEAM > 0 and best[5] is not None:
+        best_total = None
+        for c in cands[:LOOKAHEAD_BEAM]:
+            b, lines = _after_lock(board, c[2], *c[3])
+            follow = yield from best_followup(b, c[5])
+            # a placement that leaves no room for the next piece loses to any that does
+            total = float("-inf") if follow is None else follow + WEIGHTS["lines"] * lines
+            if best_total is None or total > best_total:
+                best, best_total = c, total
+    score, use_hold, piece, st, parents, _nxt = best
+    return score, use_hold, piece, st, _path(parents, st)
+
+
+class Bot:
+    """
+    Plays a PlayerEngine. update() is called once per frame: it thinks for at
+    most budget_s (the search resumes next frame), then feeds the chosen
+    inputs to the engine and hard-drops.
+    """
+
+    def __init__(self, budget_s: float = BOT_BUDGET_S, input_hz: float = BOT_INPUT_HZ, blunder: float = 0.0):
+        self.budget_s = budget_s
+        self.input_hz = input_hz
+        self.blunder = blunder    # chance per piece of a deliberately worse placement (weaker bot)
+        self._serial = None
+        self._job = None
+        self._plan = None         # (use_hold, deque of (input, state after))
+        self._target = None       # chosen resting state
+        self._at = None           # state the piece should be in before the next input
+        self._next_input = 0.0
+
+    def _plan_job(self, eng):
+        q = list(eng.next_queue)[:2]
+        alt = alt_preview = None
+        if not eng.hold_used:
+            if eng.hold is not None:
+                alt, alt_preview = eng.hold, (q[0] if q else None)
+            elif q:
+                alt, alt_preview = q[0], (q[1] if len(q) > 1 else None)
+        start = (eng.rot, eng.px, eng.py)
+        res = yield from plan_moves(eng.board, eng.cur, start, alt, q[0] if q else None, alt_preview,
+                                    self.blunder)
+        if res is None:
+            self._at = start
+            return False, deque()
+        _score, use_hold, _piece, self._target, path = res
+        self._at = (0, SPAWN_X, SPAWN_Y) if use_hold else start
+        return use_hold, deque(path)
+
+    def _reach_job(self, eng):
+        start = (eng.rot, eng.px, eng.py)
+        path = yield from reach_moves(eng.board, eng.cur, start, self._target)
+        if path is None:
+            return (yield from self._plan_job(eng))
+        self._at = start
+        return False, deque(path)
+
+    def _start(self, job):
+        self._job = job
+        self._plan = None
+
+    def _think(self, deadline: float):
+        try:
+            while time.perf_counter() < deadline:
+                next(self._job)
+        except StopIteration as done:
+            self._job = None
+            self._plan = done.value
+
+    def update(self, eng, now: float | None = None):
+        if not eng.alive:
+            return
+        if eng.piece_serial != self._serial:
+            self._serial = eng.piece_serial
+            self._start(self._plan_job(eng))
+        if self._job is not None:
+            self._think(time.perf_counter() + self.budget_s)
+            if self._job is not None:
+                return
+
+        now = time.perf_counter() if now is None else now
+        use_hold, steps = self._plan
+        while True:
+            if self.input_hz > 0:
+                if now < self._next_input:
+                    return
+                self._next_input = max(self._next_input + 1.0 / self.input_hz, now - 1.0 / self.input_hz)
+
+            if use_hold:
+                eng.do_hold()
+                self._serial = eng.piece_serial
+                self._plan = (False, steps)
+                use_hold = False
+                continue
+            if not steps:
+                eng.hard_drop()     # gravity only ever moved it further down the same column
+                return
+            if (eng.rot, eng.px, eng.py) != self._at:
+                # gravity moved the piece while we were thinking: find a new way to the same spot
+                self._start(self._reach_job(eng))
+                return
+
+            mv, st = steps.popleft()
+            if mv == "L":
+                eng.shift(-1)
+            elif mv == "R":
+                eng.shift(+1)
+            elif mv == "CW":
+                eng.rotate(+1)
+            elif mv == "CCW":
+                eng.rotate(-1)
+            else:
+                # a run of downs is one input (soft drop held)
+                eng.step_down()
+                while steps and steps[0][0] == "D":
+                    st = steps.popleft()[1]
+                    eng.step_down()
+            self._at = st
+
+
+def run_bot(peer, name: str = "Bot", budget_s: float = BOT_BUDGET_S, input_hz: float = BOT_INPUT_HZ,
+            blunder: float = 0.0):
+    """
+    Headless client over any transport (see net.join_connect): plays every
+    match the room starts until the connection closes. No rendering.
+    """
+    peer.send({"t": "hello", "name": name})
+    start_at = None
+    my_id = None
+    while peer.alive:
+        while peer.inbox:
+            msg = peer.inbox.popleft()
+            t = msg.get("t")
+            if t == "welcome":
+                my_id = msg.get("id")
+                peer.send({"t": "view", "ids": []})    # bots never look at other boards
+            elif t == "start":
+                start_at = float(msg.get("at", time.time()))
+        if start_at is not None and time.time() >= start_at:
+            at, start_at = start_at, None
+            # same key as the room (host / human clients), so the bot's events join that match
+            matchlog.begin(at, role="client", me=my_id)
+            try:
+                _play_match(peer, Bot(budget_s, input_hz, blunder), matchlog.recorder(my_id))
+            finally:
+                matchlog.end(at)
+        time.sleep(1.0 / BOT_FPS)
+
+
+def _play_match(peer, bot: Bot, record=None):
+    eng = PlayerEngine(send_atk=lambda n: peer.send({"t": "atk", "n": n}),
+                       send_dead=lambda: peer.send({"t": "dead"}))
+    eng.record = record
+    stream = EventStream(peer.send)
+    eng.on_lock = stream.on_lock
+    eng.on_garbage = stream.on_garbage
+    stepper = FixedStep(time.perf_counter())
+
+    while peer.alive:
+        while peer.inbox:
+            msg = peer.inbox.popleft()
+            t = msg.get("t")
+            if t == "atk":
+                eng.add_pending_garbage(int(msg.get("n", 0)))
+            elif t == "kfreq":
+                stream.keyframe_wanted = True
+            elif t == "end":
+                return
+
+        now = time.perf_counter()
+        for _ in range(stepper.advance(now)):
+            eng.tick()
+        bot.update(eng, now)
+        if stream.keyframe_wanted:
+            stream.keyframe(eng.board, eng.alive)
+        stream.piece(eng, now)
+        time.sleep(1.0 / BOT_FPS)
+
+
+def _connect_and_run(address: str, port: int, name: str, kw: dict):
+    try:
+        peer = join_connect(address, port)
+    except Exception as e:
+        print(f"[bot] {name}: connect to {address} failed: {e}")
+        return
+    run_bot(peer, name, **kw)
+
+
+def spawn_bot(address: str, port: int = 0, name: str = "Bot", **kw) -> threading.Thread:
+    """
+    Headless bot for address (e.g. HostServer.inproc_address()) on a daemon
+    thread. Returns at once: the connect / handshake happens on that thread.
+    """
+    th = threading.Thread(target=_connect_and_run, args=(address, port, name, kw), daemon=True)
+    th.start()
+    return th
+
+
+# ---- evaluate_batch parity check ----
+
+def _random_board(rng: random.Random) -> list:
+    """Ragged stack with holes plus a few one-gap rows, so placements also clear lines."""
+    b = empty_board()
+    rows = H + HIDDEN
+    for x in range(W):
+        for y in range(rows - rng.randint(0, H - 4), rows):
+            if rng.random() < 0.85:
+                b[y][x] = "G"
+    for y in range(rows - rng.randint(0, 4), rows):
+        gap = rng.randrange(W)
+        b[y] = [None if x == gap else "G" for x in range(W)]
+    return b
+
+
+def check_eval(boards: int = 2000, seed: int = 1) -> tuple[int, int]:
+    """
+    evaluate_batch() against evaluate() for every resting placement of every
+    piece on random boards; scores must be exactly equal. Returns
+    (placements checked, mismatches).
+    """
+    rng = random.Random(seed)
+    checked = bad = 0
+    for _ in range(boards):
+        board = _random_board(rng)
+        for piece in TETROS:
+            start = (0, SPAWN_X, SPAWN_Y)
+            if not can_place(board, piece, *start):
+                continue
+            search = search_placements(board, piece, start)
+            try:
+                while True:
+                    next(search)
+            except StopIteration as done:
+                finals, _parents = done.value
+            batch = evaluate_batch(board, piece, finals)
+            for st, got in zip(finals, batch):
+                want = evaluate(board, piece, *st)
+                if got != want:
+                    bad += 1
+                    if bad <= 10:
+                        print(f"mismatch: piece {piece} at {st}: batch {got!r} != evaluate {want!r}")
+            checked += len(finals)
+    return checked, bad
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Bot tools")
+    ap.add_argument("--check-eval", action="store_true",
+                    help="compare evaluate_batch() with evaluate() on random boards")
+    ap.add_argument("--boards", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+    if not args.check_eval:
+        ap.print_help()
+        return
+    if np is None:
+        print("numpy not installed: evaluate_batch() is evaluate(), nothing to compare")
+        return
+    t0 = time.perf_counter()
+    checked, bad = check_eval(args.boards, args.seed)
+    print(f"{checked} placements on {args.boards} boards, {bad} mismatches ({time.perf_counter() - t0:.1f}s)")
+    if bad:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+from collections import deque
+
+from tetris_core import (
+    new_bag, empty_board, can_place, lock_piece, clear_lines, add_garbage,
+)
+
+# Fixed-timestep simulation: everything below is advanced in SIM_DT steps,
+# independent of the render frame rate.
+SIM_HZ = 240
+SIM_DT = 1.0 / SIM_HZ
+MAX_CATCHUP_TICKS = SIM_HZ // 4     # after a long stall, drop the backlog beyond 0.25s
+
+SPAWN_X, SPAWN_Y = 3, 0
+
+GRAVITY_START = 0.55     # seconds per row
+GRAVITY_MIN = 0.12
+GRAVITY_RAMP = 0.002     # gravity interval shrinks by this much per second of match time
+SOFT_DROP_FACTOR = 0.12
+
+MOVE_DELAY = 0.18        # DAS
+MOVE_REPEAT = 0.085      # ARR
+
+# ---- Lock system: lock_delay + 15 lock moves (no reset exploit) ----
+LOCK_DELAY = 0.65
+MAX_LOCK_RESETS = 15
+
+# lines cleared -> garbage rows sent (4+ lines = 4)
+ATTACK_TABLE = {2: 1, 3: 2, 4: 4}
+
+KICKS = [
+    (0, 0),
+    (-1, 0), (1, 0), (-2, 0), (2, 0),
+    (0, -1), (-1, -1), (1, -1),
+    (0, -2),
+]
+
+ATTACKS_ENABLED = True
+
+
+def attack_for(cleared: int) -> int:
+    if cleared <= 0:
+        return 0
+    return ATTACK_TABLE.get(min(cleared, 4), 0)
+
+
+def gravity_at(elapsed: float) -> float:
+    return max(GRAVITY_MIN, GRAVITY_START - elapsed * GRAVITY_RAMP)
+
+
+class PlayerEngine:
+    """
+    One player's board, active piece and timers.
+    Inputs (move/rotate/hold/drop) apply immediately; tick() advances DAS,
+    gravity and lock delay by exactly SIM_DT.
+    """
+
+    def __init__(self, send_atk=None, send_dead=None, on_lock=None, on_garbage=None):
+        self.send_atk = send_atk or (lambda n: None)
+        self.send_dead = send_dead or (lambda: None)
+        # replication hooks: on_lock(board, piece, rot, x, y) after line clears,
+        # on_garbage(board, holes) after garbage rows were pushed in
+        self.on_lock = on_lock
+        self.on_garbage = on_garbage
+        # match log hook (matchlog.recorder): record(ev, **fields), must not block
+        self.record = None
+
+        self.board = empty_board()
+        self.next_queue = deque(new_bag())
+        self.board_ver = 0        # bumped whenever the locked cells change (render cache key)
+
+        self.cur = self._pop_next()
+        self.rot = 0
+        self.px, self.py = SPAWN_X, SPAWN_Y
+        self.hold = None
+        self.hold_used = False
+        self.piece_serial = 0     # bumped on spawn / hold swap (no interpolation across it)
+
+        self.alive = True
+        self.pending_garbage = 0
+        self.lines = 0            # lines cleared this match
+
+        self.sim_time = 0.0
+        self.gravity = GRAVITY_START
+        self.grav_timer = 0.0
+        self.soft_drop = False
+
+        self.left_held = False
+        self.right_held = False
+        self.move_timer = 0.0
+
+        self.lock_moves_left = MAX_LOCK_RESETS
+        self.touched_ground = False
+        self.lock_timer = 0.0
+
+        self._prev = (self.piece_serial, self.px, self.py)
+
+    # ---- pieces ----
+    def _pop_next(self):
+        if len(self.next_queue) < 7:
+            self.next_queue.extend(new_bag())
+        return self.next_queue.popleft()
+
+    def _spawn(self, piece):
+        self.cur = piece
+        self.rot = 0
+        self.px, self.py = SPAWN_X, SPAWN_Y
+        self.piece_serial += 1
+        self._reset_lock_state_new_piece()
+        self._snap()
+
+    def on_ground(self) -> bool:
+        return not can_place(self.board, self.cur, self.rot, self.px, self.py + 1)
+
+    def ghost_y(self) -> int:
+        gpy = self.py
+        while can_place(self.board, self.cur, self.rot, self.px, gpy + 1):
+            gpy += 1
+        return gpy
+
+    # ---- lock state ----
+    def _reset_lock_state_new_piece(self):
+        self.lock_moves_left = MAX_LOCK_RESETS
+        self.touched_ground = False
+        self.lock_timer = 0.0
+
+    def _use_lock_move(self):
+        if self.lock_moves_left > 0:
+            self.lock_moves_left -= 1
+            self.lock_timer = 0.0
+
+    def _after_move(self, grounded_before: bool):
+        grounded_after = self.on_ground()
+        if self.touched_ground and (grounded_before or grounded_after):
+            self._use_lock_move()
+
+    # ---- inputs ----
+    def shift(self, dx: int) -> bool:
+        if not self.alive:
+            return False
+        grounded_before = self.on_ground()
+        if can_place(self.board, self.cur, self.rot, self.px + dx, self.py):
+            self.px += dx
+            self._after_move(grounded_before)
+            self._snap()
+            return True
+        return False
+
+    def press_left(self):
+        self.left_held = True
+        self.right_held = False
+        self.move_timer = 0.0
+        self.shift(-1)
+
+    def press_right(self):
+        self.right_held = True
+        self.left_held = False
+        self.move_timer = 0.0
+        self.shift(+1)
+
+    def release_left(self):
+        self.left_held = False
+
+    def release_right(self):
+        self.right_held = False
+
+    def set_soft_drop(self, on: bool):
+        self.soft_drop = on
+
+    def step_down(self) -> bool:
+        """One row down right away (bots / scripted input); lock rules stay with tick()."""
+        if not self.alive or not can_place(self.board, self.cur, self.rot, self.px, self.py + 1):
+            return False
+        self.py += 1
+        self._snap()
+        return True
+
+    def rotate(self, dir_: int) -> bool:
+        if not self.alive:
+            return False
+        grounded_before = self.on_ground()
+        newr = (self.rot + dir_) % 4
+        for dx, dy in KICKS:
+            if can_place(self.board, self.cur, newr, self.px + dx, self.py + dy):
+                self.rot = newr
+                self.px += dx
+                self.py += dy
+                self._after_move(grounded_before)
+                self._snap()
+                return True
+        return False
+
+    def do_hold(self):
+        if not self.alive or self.hold_used:
+            return
+        self.hold_used = True
+        if self.hold is None:
+            self.hold = self.cur
+            nxt = self._pop_next()
+        else:
+            self.hold, nxt = self.cur, self.hold
+        self._spawn(nxt)
+
+    def hard_drop(self):
+        if not self.alive:
+            return
+        self.py = self.ghost_y()
+        self.apply_lock_and_spawn()
+
+    def add_pending_garbage(self, n: int):
+        if ATTACKS_ENABLED and self.alive and n > 0:
+            self.pending_garbage += int(n)
+
+    # ---- lock ----
+    def apply_lock_and_spawn(self):
+        lock_piece(self.board, self.cur, self.rot, self.px, self.py)
+        cleared = clear_lines(self.board)
+        self.lines += cleared
+        self.board_ver += 1
+        if self.on_lock is not None:
+            self.on_lock(self.board, self.cur, self.rot, self.px, self.py)
+
+        atk = 0
+        if ATTACKS_ENABLED:
+            atk = attack_for(cleared)
+            if atk > 0:
+                self.send_atk(atk)
+        if self.record is not None:
+            self.record("lock", p=self.cur, r=self.rot, x=self.px, y=self.py, lines=cleared, n=atk)
+
+        if ATTACKS_ENABLED and self.pending_garbage > 0:
+            holes = add_garbage(self.board, self.pending_garbage)
+            self.pending_garbage = 0
+            if self.on_garbage is not None:
+                self.on_garbage(self.board, holes)
+            if self.record is not None:
+                self.record("garbage", n=len(holes))
+
+        nxt = self._pop_next()
+        if not can_place(self.board, nxt, 0, SPAWN_X, SPAWN_Y):
+            self.alive = False
+            if self.record is not None:
+                self.record("topout")
+            self.send_dead()
+            return
+
+        self.hold_used = False
+        self._spawn(nxt)
+
+    # ---- fixed step ----
+    def tick(self):
+        if not self.alive:
+            return
+        self._prev = (self.piece_serial, self.px, self.py)
+        dt = SIM_DT
+
+        # DAS / ARR
+        if self.left_held or self.right_held:
+            self.move_timer += dt
+            if self.move_timer >= MOVE_DELAY:
+                self.shift(-1 if self.left_held else 1)
+                self.move_timer -= MOVE_REPEAT
+        else:
+            self.move_timer = 0.0
+
+        # gravity
+        self.grav_timer += dt
+        g = self.gravity * (SOFT_DROP_FACTOR if self.soft_drop else 1.0)
+        if self.grav_timer >= g:
+            self.grav_timer = 0.0
+            if can_place(self.board, self.cur, self.rot, self.px, self.py + 1):
+                self.py += 1
+
+        grounded = self.on_ground()
+
+        # first touch starts timer + gives 15 moves
+        if grounded and not self.touched_ground:
+            self.touched_ground = True
+            self.lock_moves_left = MAX_LOCK_RESETS
+            self.lock_timer = 0.0
+
+        # while grounded: timer runs, lock on time or on 0 moves
+        if self.touched_ground and grounded:
+            self.lock_timer += dt
+            if self.lock_moves_left <= 0 or self.lock_timer >= LOCK_DELAY:
+                self.apply_lock_and_spawn()
+
+        # if lifted (kicks etc): do NOT reset moves, only pause timer
+        if self.touched_ground and not grounded:
+            self.lock_timer = 0.0
+
+        self.sim_time += dt
+        self.gravity = gravity_at(self.sim_time)
+
+    def gravity_phase(self) -> tuple[float, float]:
+        """(fraction of the current gravity interval elapsed, interval in seconds)"""
+        g = self.gravity * (SOFT_DROP_FACTOR if self.soft_drop else 1.0)
+        return min(1.0, self.grav_timer / g), g
+
+    def _snap(self):
+        # inputs show up immediately instead of being interpolated in
+        self._prev = (self.piece_serial, self.px, self.py)
+
+    def visual_pos(self, alpha: float) -> tuple[float, float]:
+        """Active piece position interpolated between the last two ticks (alpha in [0, 1))."""
+        serial, ppx, ppy = self._prev
+        if serial != self.piece_serial or abs(self.px - ppx) > 1 or abs(self.py - ppy) > 1:
+            return float(self.px), float(self.py)
+        return ppx + (self.px - ppx) * alpha, ppy + (self.py - ppy) * alpha
+
+
+class FixedStep:
+    """Accumulates real time from time.perf_counter and reports how many SIM_DT ticks to run."""
+
+    def __init__(self, now: float):
+        self.last = now
+        self.acc = 0.0
+
+    def advance(self, now: float) -> int:
+        self.acc += max(0.0, now - self.last)
+        self.last = now
+        n = int(self.acc / SIM_DT)
+        self.acc -= n * SIM_DT
+        if n > MAX_CATCHUP_TICKS:
+            n = MAX_CATCHUP_TICKS
+            self.acc = 0.0
+        return n
+
+    @property
+    def alpha(self) -> float:
+        return min(1.0, self.acc / SIM_DT)
@@ -1,17 +1,32 @@
 import time
-from collections import deque
 import pygame
 import ui
+from engine import PlayerEngine, FixedStep
+from gcpolicy import MatchGC
+from killcam import MatchHistory
+from inputs import InputSampler, LatencyMeter, restrict_events, restore_events
+from profiler import FrameProfiler
+from render import BoardSurfaceCache, DrawScheduler
+from replication import ReplicaSet
 
 
 from tetris_core import (
     W, H, HIDDEN, TETROS, COLORS,
-    new_bag, empty_board, can_place, lock_piece, clear_lines,
-    add_garbage, board_to_string, string_to_board
+    board_to_string,
 )
 
 ATTACKS_ENABLED = True
 
+# Simulation runs at engine.SIM_HZ regardless of this; it only paces drawing.
+RENDER_FPS = 144      # 0 = uncapped
+NET_FPS = 60          # minimum loop rate while the host still has to route packets
+SPECTATE_FPS = 20     # redraw rate after death (host keeps polling the network at NET_FPS)
+WATCH_POLL_S = 0.05   # spectator screen: inbox poll while idle (host sends net.SPECTATOR_HZ)
+TAIL_EMA = 0.2        # smoothing of the always-drawn part's cost (own board .. flip)
+
+_rematch_size = None  # game window size when the last match ended in a rematch
+
+
 def common_game_loop(
     nickname: str,
     my_id: int,
@@ -25,11 +40,24 @@ def common_game_loop(
     on_exit,
     host_server,
     end_packet: dict,
+    spectate_fps: int = SPECTATE_FPS,
+    render_fps: int = RENDER_FPS,
+    event_stream=None,
+    get_opp_piece=None,
+    set_view=None,
+    rematch=None,
+    autoplay=None,
+    record=None,
+    engine=None,
 ):
-    pygame.init()
-    screen = pygame.display.set_mode((1600, 900), pygame.RESIZABLE)
+    global _rematch_size
+    ui.init_pygame()
+    screen = pygame.display.get_surface()
+    if screen is None or screen.get_size() != _rematch_size:
+        screen = pygame.display.set_mode((1600, 900), pygame.RESIZABLE)
+    # else rematch: keep the window (and its size) from the previous match
+    _rematch_size = None
     pygame.display.set_caption(f"Tetris (LAN) - {nickname}")
-    clock = pygame.time.Clock()
 
     # Layout
     cell = 30
@@ -50,15 +78,15 @@ def common_game_loop(
     right_ox = main_ox + board_px_w + margin
     mini_start_y = top_oy + players_box_h + 10
 
-    font = pygame.font.SysFont("consolas", 18)
-    big = pygame.font.SysFont("consolas", 28)
-    small = pygame.font.SysFont("consolas", 14)
+    font = ui.sys_font(18)
+    big = ui.sys_font(28)
+    small = ui.sys_font(14)
 
     def recalc_fonts(scale: float):
         nonlocal font, big, small
-        font = pygame.font.SysFont("consolas", max(14, int(18 * scale)))
-        big = pygame.font.SysFont("consolas", max(18, int(28 * scale)))
-        small = pygame.font.SysFont("consolas", max(12, int(14 * scale)))
+        font = ui.sys_font(max(14, int(18 * scale)))
+        big = ui.sys_font(max(18, int(28 * scale)))
+        small = ui.sys_font(max(12, int(14 * scale)))
 
     def recalc_layout(w, h):
         nonlocal cell, opp_cell, margin
@@ -111,148 +139,87 @@ def common_game_loop(
 
     recalc_layout(*screen.get_size())
 
-    # Game state
-    board = empty_board()
-    next_queue = deque(new_bag())
-
-    def pop_next():
-        if len(next_queue) < 7:
-            for p in new_bag():
-                next_queue.append(p)
-        return next_queue.popleft()
-
-    cur = pop_next()
-    rot = 0
-    px, py = 3, 0
-    hold = None
-    hold_used = False
-
-    alive = True
-    pending_garbage = 0
-
-    gravity = 0.55
-    grav_timer = 0.0
-    soft_drop = False
-
-    left_held = False
-    right_held = False
-    move_delay = 0.18
-    move_repeat = 0.085
-    move_timer = 0.0
-
-    # ---- Lock system: lock_delay + 15 lock moves (no reset exploit) ----
-    MAX_LOCK_RESETS = 15
-    lock_moves_left = MAX_LOCK_RESETS
-    touched_ground = False
-    lock_delay = 0.65
-    lock_timer = 0.0
-
-    start_time = time.time()
+    # Game state (fixed-timestep engine, see engine.py)
+    if engine is None:
+        eng = PlayerEngine(send_atk=send_atk, send_dead=send_dead)
+        eng.record = record     # matchlog (None = off)
+        if event_stream is not None:
+            # placement-event replication (replication.py) instead of periodic snapshots
+            eng.on_lock = event_stream.on_lock
+            eng.on_garbage = event_stream.on_garbage
+        stepper = FixedStep(time.perf_counter())
+    else:
+        # split.RemoteEngine: a worker process simulates, its stepper only syncs snapshots
+        eng, stepper = engine, engine.stepper
+    sampler = InputSampler()
+    latency = LatencyMeter()
+
     last_board_send = 0.0
 
     death_order: list[int] = []
     dead_seen: set[int] = set()
+    history = MatchHistory(my_id)     # killcam on the ranking screen
+
+    prof = FrameProfiler(f"{nickname}_{my_id}")
+    last_draw = 0.0
+
+    board_cache = BoardSurfaceCache()
+    chrome = None        # pre-rendered background: fill, header, panel frames, static labels
+    dead_overlay = None
+    # chrome + opponent slots / next+hold / rank list as last drawn; the scheduler refreshes
+    # as many of those as the frame has time for, the own board always goes on top
+    backdrop = None
+    backdrop_key = None
+    scheduler = DrawScheduler()
+    tail_s = 0.0         # smoothed cost of the part of the frame that always runs (own board .. flip)
+
+    def build_chrome(w, h):
+        nonlocal chrome, dead_overlay, backdrop, backdrop_key
+        chrome = pygame.Surface((w, h))
+        chrome.fill((12, 12, 16))
 
-    def on_ground():
-        return not can_place(board, cur, rot, px, py + 1)
-
-    def reset_lock_state_new_piece():
-        nonlocal lock_moves_left, touched_ground, lock_timer
-        lock_moves_left = MAX_LOCK_RESETS
-        touched_ground = False
-        lock_timer = 0.0
-
-    def use_lock_move():
-        nonlocal lock_moves_left, lock_timer
-        if lock_moves_left > 0:
-            lock_moves_left -= 1
-            lock_timer = 0.0
-
-    def try_rotate(dir_):
-        nonlocal rot, px, py
-        newr = (rot + dir_) % 4
-        kicks = [
-            (0, 0),
-            (-1, 0), (1, 0), (-2, 0), (2, 0),
-            (0, -1), (-1, -1), (1, -1),
-            (0, -2),
-        ]
-        for dx, dy in kicks:
-            if can_place(board, cur, newr, px + dx, py + dy):
-                rot = newr
-                px += dx
-                py += dy
-                return True
-        return False
+        # Header (üst bar aynı kalsın)
+        header_h = big.get_height() + 14
+        header_rect = pygame.Rect(margin, margin, w - 2 * margin, header_h)
+        pygame.draw.rect(chrome, (18, 18, 22), header_rect, border_radius=10)
+        pygame.draw.rect(chrome, (70, 70, 86), header_rect, 2, border_radius=10)
+        chrome.blit(big.render(f"YOU: {nickname} (id {my_id})", True, (220, 220, 230)),
+                    (header_rect.x + 12, header_rect.y + 6))
 
-    def do_hold():
-        nonlocal cur, rot, px, py, hold, hold_used
-        if hold_used:
-            return
-        hold_used = True
-        if hold is None:
-            hold = cur
-            cur = pop_next()
-        else:
-            hold, cur = cur, hold
-        rot = 0
-        px, py = 3, 0
-        reset_lock_state_new_piece()
-
-    def apply_lock_and_spawn():
-        nonlocal cur, rot, px, py, hold_used, alive, pending_garbage
-        lock_piece(board, cur, rot, px, py)
-        cleared = clear_lines(board)
-
-        if ATTACKS_ENABLED:
-            atk = 0
-            if cleared == 2:
-                atk = 1
-            elif cleared == 3:
-                atk = 2
-            elif cleared >= 4:
-                atk = 4
-            if atk > 0:
-                send_atk(atk)
-
-        if ATTACKS_ENABLED and pending_garbage > 0:
-            add_garbage(board, pending_garbage)
-            pending_garbage = 0
-
-        nxt = pop_next()
-        if not can_place(board, nxt, 0, 3, 0):
-            alive = False
-            send_dead()
-            return
+        layout = ui.compute_game_layout(w, h)
 
-        cur = nxt
-        rot = 0
-        px, py = 3, 0
-        hold_used = False
-        reset_lock_state_new_piece()
-
-    def hard_drop():
-        nonlocal py
-        while can_place(board, cur, rot, px, py + 1):
-            py += 1
-        apply_lock_and_spawn()
-
-    def draw_board(b, ox, oy, csize, ghost_piece=None):
-        pygame.draw.rect(screen, (18, 18, 22), pygame.Rect(ox - 2, oy - 2, W * csize + 4, H * csize + 4))
-        for yy in range(H):
-            for xx in range(W):
-                v = b[yy + HIDDEN][xx]
-                if v is None:
-                    pygame.draw.rect(
-                        screen, (30, 30, 36),
-                        pygame.Rect(ox + xx * csize, oy + yy * csize, csize - 1, csize - 1),
-                        1
-                    )
-                else:
-                    pygame.draw.rect(
-                        screen, COLORS.get(v, (200, 200, 200)),
-                        pygame.Rect(ox + xx * csize, oy + yy * csize, csize - 1, csize - 1)
-                    )
+        # Panel çerçeveleri
+        ui.draw_panel(chrome, layout["left_rect"], "", font, border=(220, 40, 40))
+        ui.draw_panel(chrome, layout["main_rect"], "", font, border=(220, 40, 40))
+        ui.draw_panel(chrome, layout["mid_rect"], "", font, border=(220, 40, 40))
+        ui.draw_panel(chrome, layout["rank_rect"], "oyuncu siralamasi", font, border=(220, 40, 40))
+
+        # Next + Hold panelleri (mid içinde)
+        ui.draw_panel(chrome, layout["next_rect"], "NEXT", font, border=(220, 40, 40))
+        ui.draw_panel(chrome, layout["hold_rect"], "HOLD", font, border=(220, 40, 40))
+        nxr = layout["next_rect"]
+        chrome.blit(font.render("NEXT:", True, (220, 220, 230)), (nxr.x + 10, nxr.y + 10))
+        hdr = layout["hold_rect"]
+        chrome.blit(font.render("HOLD:", True, (220, 220, 230)), (hdr.x + 10, hdr.y + 10))
+
+        dead_overlay = pygame.Surface((w, h))
+        dead_overlay.fill((0, 0, 0))
+        dead_overlay.set_alpha(140)
+
+        backdrop = chrome.copy()
+        backdrop_key = None
+
+    # === yardımcı: rect içine board sığdırma ===
+    def fit_board_in_rect(rect: pygame.Rect, cols: int, rows: int, pad: int = 14):
+        avail_w = max(10, rect.width - pad * 2)
+        avail_h = max(10, rect.height - pad * 2)
+        c = max(4, min(avail_w // cols, avail_h // rows))
+        ox = rect.x + (rect.width - cols * c) // 2
+        oy = rect.y + (rect.height - rows * c) // 2
+        return c, ox, oy
+
+    def draw_board(surf, key, b, ox, oy, csize, version=None, ghost_piece=None):
+        board_cache.blit(surf, key, b, ox, oy, csize, version)
 
         if ghost_piece:
             gp, gr, gpx, gpy = ghost_piece
@@ -260,39 +227,227 @@ def common_game_loop(
                 vx, vy = gpx + x, gpy + y - HIDDEN
                 if 0 <= vx < W and 0 <= vy < H:
                     pygame.draw.rect(
-                        screen, (90, 90, 110),
+                        surf, (90, 90, 110),
                         pygame.Rect(ox + vx * csize, oy + vy * csize, csize - 1, csize - 1),
                         1
                     )
 
-    def draw_mini_piece(piece, ox, oy, ms):
+    def draw_piece(surf, piece, rot, ppx, ppy, ox, oy, csize):
+        color = COLORS.get(piece, (200, 200, 200))
+        for (x, y) in TETROS[piece][rot]:
+            vx, vy = ppx + x, ppy + y - HIDDEN
+            if 0 <= vx < W and 0 <= vy < H:
+                pygame.draw.rect(surf, color, pygame.Rect(ox + vx * csize, oy + vy * csize, csize - 1, csize - 1))
+
+    def draw_mini_piece(surf, piece, ox, oy, ms):
         if not piece:
             return
         color = COLORS.get(piece, (200, 200, 200))
         for (x, y) in TETROS[piece][0]:
-            pygame.draw.rect(screen, color, pygame.Rect(ox + x * ms, oy + y * ms, ms - 1, ms - 1))
+            pygame.draw.rect(surf, color, pygame.Rect(ox + x * ms, oy + y * ms, ms - 1, ms - 1))
+
+    # ---- deferrable panels: each repaints its own area of the backdrop ----
+    def draw_slot(r, pid, grid):
+        backdrop.blit(chrome, r, r)
+        nm = roster.get(pid, f"Player{pid}")
+        dead = alive_map.get(pid, True) is False
+
+        if grid:
+            head = ui.fit_text(small, f"{pid}:{nm}", r.width)
+            backdrop.blit(ui.render_text(small, head, (150, 90, 90) if dead else (220, 220, 230)), (r.x, r.y))
+            c, ox, oy = fit_board_in_rect(pygame.Rect(r.x, r.y + ui.GRID_HEAD_H, r.width, r.height - ui.GRID_HEAD_H),
+                                          W, H, pad=ui.GRID_PAD)
+        else:
+            head = f"{pid}:{nm} [{'DEAD' if dead else 'LIVE'}]"
+            head = ui.fit_text(small, head, r.width - 18)
+            backdrop.blit(ui.render_text(small, head, (220, 220, 230)), (r.x + 10, r.y + 8))
+            # board'u slot içine ortala
+            c, ox, oy = fit_board_in_rect(r, W, H, pad=ui.SLOT_PAD)
+
+        b = opp_boards.get(pid)
+        if b is None:
+            return
+        draw_board(backdrop, pid, b, ox, oy, c, ghost_piece=None)
+        if get_opp_piece is not None and not dead:
+            op = get_opp_piece(pid)
+            if op is not None:
+                draw_piece(backdrop, *op, ox, oy, c)
+
+    def draw_next_hold(layout, mini):
+        # NEXT (dikey liste)
+        nxr = layout["next_rect"]
+        backdrop.blit(chrome, nxr, nxr)
+        nq = list(eng.next_queue)
+        start_x = nxr.x + 14
+        start_y = nxr.y + 40
+        step_y = mini * 4 + 10
+        max_show = max(3, (nxr.height - 50) // step_y)
+        for i in range(min(8, max_show)):
+            piece = nq[i] if i < len(nq) else None
+            if piece:
+                draw_mini_piece(backdrop, piece, start_x, start_y + i * step_y, mini)
+
+        # HOLD
+        hdr = layout["hold_rect"]
+        backdrop.blit(chrome, hdr, hdr)
+        if eng.hold:
+            draw_mini_piece(backdrop, eng.hold, hdr.x + 14, hdr.y + 40, mini)
 
-    def opp_ids_sorted():
-        ob = get_opp_boards()
-        return sorted([pid for pid in ob.keys() if pid != my_id])[:7]
+    def draw_rank(layout, alive):
+        rr = layout["rank_rect"]
+        backdrop.blit(chrome, rr, rr)
+        y_list = rr.y + 54
+        line_h = 22
+        max_list_w = rr.width - 24
+        shown, more = ui.clip_list(sorted(roster.keys()), (rr.bottom - 10 - y_list) // line_h)
+        for idx, pid in enumerate(shown, start=1):
+            nm = str(roster[pid])
+            st = "ALIVE" if alive_map.get(pid, True) else "DEAD"
+            if pid == my_id:
+                st = "YOU" if alive else "YOU(DEAD)"
+            txt = f"{idx}. {pid}: {nm} - {st}"
+            txt = ui.fit_text(small, txt, max_list_w)
+            backdrop.blit(ui.render_text(small, txt, (190, 190, 205)), (rr.x + 12, y_list))
+            y_list += line_h
+        if more:
+            backdrop.blit(ui.render_text(small, f"+{more} more", (150, 150, 165)), (rr.x + 12, y_list))
+
+    opp_page = 0
+    last_view = None     # (ids, lod) last passed to set_view (host only routes those boards to us)
+
+    my_board_s, my_board_ver = "", None
+
+    def own_board_s() -> str:
+        # re-encoded only after a lock changed the board
+        nonlocal my_board_s, my_board_ver
+        if eng.board_ver != my_board_ver:
+            my_board_ver = eng.board_ver
+            my_board_s = board_to_string(eng.board)
+        return my_board_s
+
+    def opp_ids_sorted(roster):
+        return sorted(pid for pid in roster if pid != my_id)
+
+    def shutdown():
+        match_gc.end()
+        prof.close()
+        restore_events()
+
+    def apply_game_key(event) -> bool:
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_LEFT:
+                eng.press_left()
+            elif event.key == pygame.K_RIGHT:
+                eng.press_right()
+            elif event.key == pygame.K_z:
+                eng.rotate(-1)
+            elif event.key == pygame.K_x or event.key == pygame.K_UP:
+                eng.rotate(+1)
+            elif event.key == pygame.K_c:
+                eng.do_hold()
+            elif event.key == pygame.K_SPACE:
+                eng.hard_drop()
+            elif event.key == pygame.K_DOWN:
+                eng.set_soft_drop(True)
+            else:
+                return False
+            return True
+
+        if event.type == pygame.KEYUP:
+            if event.key == pygame.K_DOWN:
+                eng.set_soft_drop(False)
+            elif event.key == pygame.K_LEFT:
+                eng.release_left()
+            elif event.key == pygame.K_RIGHT:
+                eng.release_right()
+            else:
+                return False
+            return True
+        return False
+
+    restrict_events()
+    # setup is done: freeze it, collect only between frames / on line clears from here on
+    match_gc = MatchGC()
+    match_gc.begin()
+    lines_seen = eng.lines
+    held_keys = set()     # input is sampled at ~1 kHz only while one is down (release / DAS timing)
 
     while True:
-        dt = clock.tick(60) / 1000.0
+        # dead clients only spectate: tick slower; the host still routes at full rate
+        if eng.alive:
+            fps = render_fps
+        else:
+            fps = NET_FPS if host_server is not None else spectate_fps
+        match_gc.idle(sampler.time_left(fps))
+        dt = sampler.wait_frame(fps, busy=eng.alive and bool(held_keys))
+        prof.begin_frame()
         w, h = screen.get_size()
 
-        my_board_s = board_to_string(board)
+        # input first: every event is applied at the sim tick it was sampled at
+        for t_ev, event in sampler.drain():
+            if event.type == pygame.QUIT:
+                shutdown()
+                on_exit()
+                return
+
+            if event.type == pygame.VIDEORESIZE:
+                screen = pygame.display.set_mode((event.w, event.h), pygame.RESIZABLE)
+                recalc_layout(event.w, event.h)
+                chrome = None
+
+            if event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    shutdown()
+                    on_exit()
+                    pygame.quit()
+                    return
+
+                if event.key == pygame.K_F3:
+                    prof.show_overlay = not prof.show_overlay
+                elif event.key == pygame.K_F4:
+                    prof.toggle_capture()
+                elif event.key == pygame.K_F5:
+                    latency.toggle()
+                elif event.key == pygame.K_PAGEUP:
+                    opp_page -= 1
+                elif event.key == pygame.K_PAGEDOWN:
+                    opp_page += 1
+
+            if event.type == pygame.KEYDOWN:
+                held_keys.add(event.key)
+            elif event.type == pygame.KEYUP:
+                held_keys.discard(event.key)
+
+            if event.type in (pygame.KEYDOWN, pygame.KEYUP):
+                for _ in range(stepper.advance(t_ev)):
+                    eng.tick()
+                if apply_game_key(event) and event.type == pygame.KEYDOWN:
+                    latency.input_applied(t_ev)
+        prof.lap("events")
+
+        alive = eng.alive
+        my_board_s = own_board_s()
         gained = poll_net(my_board_s, alive)
         if ATTACKS_ENABLED and alive and gained:
-            pending_garbage += int(gained)
+            eng.add_pending_garbage(gained)
 
         if end_packet.get("active"):
             from ui import show_ranking_screen
-            show_ranking_screen(end_packet, my_id)
+            shutdown()
+            start_at = show_ranking_screen(end_packet, my_id, rematch, is_host=host_server is not None,
+                                           killcam=history)
+            if start_at:
+                _rematch_size = screen.get_size()
+                return start_at  # oda açık: aynı bağlantılarla sıradaki maç (caller başlatır)
             on_exit()
             return  # pygame.quit() YOK! (menu tekrar açılacak)
 
-        now = time.time()
-        if host_server is None and (now - last_board_send) > 0.20:
+        now = time.perf_counter()
+        if event_stream is not None:
+            if event_stream.keyframe_wanted:
+                event_stream.keyframe(eng.board, alive)
+            event_stream.piece(eng, now)
+        elif host_server is None and (now - last_board_send) > 0.20:
             last_board_send = now
             send_board(my_board_s, alive)
 
@@ -304,245 +459,249 @@ def common_game_loop(
         if alive is False and my_id not in dead_seen:
             dead_seen.add(my_id)
             death_order.append(my_id)
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                on_exit()
-                return
-
-            if event.type == pygame.VIDEORESIZE:
-                screen = pygame.display.set_mode((event.w, event.h), pygame.RESIZABLE)
-                recalc_layout(event.w, event.h)
-
-            if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_ESCAPE:
-                    on_exit()
-                    pygame.quit()
-                    return
-
-                if alive:
-                    if event.key == pygame.K_LEFT:
-                        left_held = True
-                        right_held = False
-                        move_timer = 0.0
-                        grounded_before = on_ground()
-                        if can_place(board, cur, rot, px - 1, py):
-                            px -= 1
-                            grounded_after = on_ground()
-                            if touched_ground and (grounded_before or grounded_after):
-                                use_lock_move()
-
-                    elif event.key == pygame.K_RIGHT:
-                        right_held = True
-                        left_held = False
-                        move_timer = 0.0
-                        grounded_before = on_ground()
-                        if can_place(board, cur, rot, px + 1, py):
-                            px += 1
-                            grounded_after = on_ground()
-                            if touched_ground and (grounded_before or grounded_after):
-                                use_lock_move()
-
-                    elif event.key == pygame.K_z:
-                        grounded_before = on_ground()
-                        if try_rotate(-1):
-                            grounded_after = on_ground()
-                            if touched_ground and (grounded_before or grounded_after):
-                                use_lock_move()
-
-                    elif event.key == pygame.K_x or event.key == pygame.K_UP:
-                        grounded_before = on_ground()
-                        if try_rotate(+1):
-                            grounded_after = on_ground()
-                            if touched_ground and (grounded_before or grounded_after):
-                                use_lock_move()
-
-                    elif event.key == pygame.K_c:
-                        do_hold()
-
-                    elif event.key == pygame.K_SPACE:
-                        hard_drop()
-
-                    elif event.key == pygame.K_DOWN:
-                        soft_drop = True
-
-            if event.type == pygame.KEYUP:
-                if event.key == pygame.K_DOWN:
-                    soft_drop = False
-                elif event.key == pygame.K_LEFT:
-                    left_held = False
-                elif event.key == pygame.K_RIGHT:
-                    right_held = False
-
-        if alive:
-            if left_held or right_held:
-                move_timer += dt
-                if move_timer >= move_delay:
-                    step = -1 if left_held else 1
-                    grounded_before = on_ground()
-                    if can_place(board, cur, rot, px + step, py):
-                        px += step
-                        grounded_after = on_ground()
-                        if touched_ground and (grounded_before or grounded_after):
-                            use_lock_move()
-                    move_timer -= move_repeat
-            else:
-                move_timer = 0.0
-
-        if alive:
-            # gravity
-            grav_timer += dt
-            g = gravity * (0.12 if soft_drop else 1.0)
-            if grav_timer >= g:
-                grav_timer = 0.0
-                if can_place(board, cur, rot, px, py + 1):
-                    py += 1
-
-            grounded = on_ground()
-
-            # first touch starts timer + gives 15 moves
-            if grounded and not touched_ground:
-                touched_ground = True
-                lock_moves_left = MAX_LOCK_RESETS
-                lock_timer = 0.0
-
-            # while grounded: timer runs, lock on time or on 0 moves
-            if touched_ground and grounded:
-                lock_timer += dt
-                if lock_moves_left <= 0:
-                    apply_lock_and_spawn()
-                elif lock_timer >= lock_delay:
-                    apply_lock_and_spawn()
-
-            # if lifted (kicks etc): do NOT reset moves, only pause timer
-            if touched_ground and not grounded:
-                lock_timer = 0.0
-
-            elapsed = time.time() - start_time
-            gravity = max(0.12, 0.55 - elapsed * 0.002)
+            history.freeze()    # the killcam ends where you died
+        prof.lap("poll_net")
+
+        # fixed-step simulation on the monotonic clock
+        for _ in range(stepper.advance(time.perf_counter())):
+            eng.tick()
+        if autoplay is not None:
+            autoplay.update(eng, now)    # bot.Bot at the wheel (TETRIS_BOT=1)
+        if eng.lines != lines_seen:
+            lines_seen = eng.lines
+            match_gc.line_clear()
+        prof.lap("sim")
+
+        alive = eng.alive
+        board, cur, rot, px, py = eng.board, eng.cur, eng.rot, eng.px, eng.py
 
         # ghost
-        gpy = py
-        if alive:
-            while can_place(board, cur, rot, px, gpy + 1):
-                gpy += 1
+        gpy = eng.ghost_y() if alive else py
+        prof.lap("ghost")
 
-        # ---- DRAW ----
-        screen.fill((12, 12, 16))
+        if not alive:
+            now = time.perf_counter()
+            if now - last_draw < 1.0 / max(1, spectate_fps):
+                prof.end_frame(dt)
+                continue
+            last_draw = now
 
-        # Header (üst bar aynı kalsın)
-        header_h = big.get_height() + 14
-        header_rect = pygame.Rect(margin, margin, w - 2 * margin, header_h)
-        pygame.draw.rect(screen, (18, 18, 22), header_rect, border_radius=10)
-        pygame.draw.rect(screen, (70, 70, 86), header_rect, 2, border_radius=10)
-        screen.blit(big.render(f"YOU: {nickname} (id {my_id})", True, (220, 220, 230)),
-                    (header_rect.x + 12, header_rect.y + 6))
+        # ---- DRAW ----
+        if chrome is None or chrome.get_size() != (w, h):
+            build_chrome(w, h)
 
         roster = get_roster()
         opp_boards = get_opp_boards()
         alive_map = get_alive_map()
 
-        # === YENİ LAYOUT: ui.compute_game_layout ===
+        # === YENİ LAYOUT: ui.compute_game_layout (boyuta göre cache'li) ===
         layout = ui.compute_game_layout(w, h)
-
-        # Panel çerçeveleri
-        ui.draw_panel(screen, layout["left_rect"], "", font, border=(220, 40, 40))
-        ui.draw_panel(screen, layout["main_rect"], "", font, border=(220, 40, 40))
-        ui.draw_panel(screen, layout["mid_rect"], "", font, border=(220, 40, 40))
-        ui.draw_panel(screen, layout["rank_rect"], "oyuncu siralamasi", font, border=(220, 40, 40))
-
-        # Next + Hold panelleri (mid içinde)
-        ui.draw_panel(screen, layout["next_rect"], "NEXT", font, border=(220, 40, 40))
-        ui.draw_panel(screen, layout["hold_rect"], "HOLD", font, border=(220, 40, 40))
-
-        # === yardımcı: rect içine board sığdırma ===
-        def fit_board_in_rect(rect: pygame.Rect, cols: int, rows: int, pad: int = 14):
-            avail_w = max(10, rect.width - pad * 2)
-            avail_h = max(10, rect.height - pad * 2)
-            c = max(4, min(avail_w // cols, avail_h // rows))
-            ox = rect.x + (rect.width - cols * c) // 2
-            oy = rect.y + (rect.height - rows * c) // 2
-            return c, ox, oy
-
-        # === SOL PANEL: 7 mini board (3 büyük + 4 küçük) ===
-        ids = opp_ids_sorted()  # max 7 kişi
-        slots = layout["left_big"] + layout["left_small"]  # toplam 7 slot
-
-        for i, r in enumerate(slots):
-            if i >= len(ids):
-                break
-            pid = ids[i]
-            nm = roster.get(pid, f"Player{pid}")
-            st = "DEAD" if (alive_map.get(pid, True) is False) else "LIVE"
-
-            head = f"{pid}:{nm} [{st}]"
-            head = head if small.size(head)[0] <= (r.width - 18) else head[:18] + "…"
-            screen.blit(small.render(head, True, (220, 220, 230)), (r.x + 10, r.y + 8))
-
-            # board'u slot içine ortala
-            c, ox, oy = fit_board_in_rect(r, W, H, pad=16)
-            draw_board(opp_boards.get(pid, empty_board()), ox, oy, c, ghost_piece=None)
-
-        # === ORTA (MAIN) PANEL: kendi board'un büyük çizimi ===
         main_rect = layout["main_rect"]
         cell2, main_ox2, main_oy2 = fit_board_in_rect(main_rect, W, H, pad=24)
+        mini = max(6, int(10 * (cell2 / 30)))
 
-        draw_board(board, main_ox2, main_oy2, cell2, ghost_piece=(cur, rot, px, gpy))
+        prof.lap("hud")
+
+        # === SOL PANEL: <=7 rakip -> 3 büyük + 4 küçük, fazlası -> sayfalı grid ===
+        all_ids = opp_ids_sorted(roster)
+        slots, grid = ui.compute_opponent_slots(w, h, len(all_ids))
+        pages = max(1, -(-len(all_ids) // len(slots)))
+        opp_page %= pages
+        ids = all_ids[opp_page * len(slots):(opp_page + 1) * len(slots)]
+        if set_view is not None:
+            # small thumbnails only need a skyline / summary from the host
+            lod = {str(pid): lv for pid, lv in zip(ids, ui.compute_slot_lods(w, h, len(all_ids))) if lv != "full"}
+            if (ids, lod) != last_view:
+                last_view = (ids, lod)
+                set_view(ids, lod)
+
+        # new layout / page / player set: repaint the whole backdrop this frame
+        key = (w, h, grid, opp_page, pages, tuple(ids))
+        force = key != backdrop_key
+        if force:
+            backdrop_key = key
+            backdrop.blit(chrome, (0, 0))
+            if pages > 1:
+                lr = layout["left_rect"]
+                pg = ui.render_text(small, f"{opp_page + 1}/{pages}  PgUp/PgDn", (160, 160, 175))
+                backdrop.blit(pg, (lr.centerx - pg.get_width() // 2, lr.bottom - pg.get_height() - 10))
+
+        tasks = [(pid, draw_slot, (r, pid, grid)) for r, pid in zip(slots, ids)]
+        tasks.append(("next", draw_next_hold, (layout, mini)))
+        tasks.append(("rank", draw_rank, (layout, alive)))
+        # whatever is left of this frame after the part that always runs
+        deadline = time.perf_counter() + sampler.time_left(fps) - tail_s if fps > 0 else None
+        scheduler.run(tasks, deadline, force)
+        board_cache.prune(set(ids) | {my_id})
+        history.record(now, own_board_s(), (cur, rot, px, py) if alive else None, opp_boards, ids, get_opp_piece)
+
+        prof.lap("opponents")
+
+        t_tail = time.perf_counter()
+        screen.blit(backdrop, (0, 0))
+
+        # === ORTA (MAIN) PANEL: kendi board'un büyük çizimi ===
+        draw_board(screen, my_id, board, main_ox2, main_oy2, cell2, version=eng.board_ver, ghost_piece=(cur, rot, px, gpy))
         if alive:
+            # draw at the position interpolated between the last two sim ticks
+            ipx, ipy = eng.visual_pos(stepper.alpha)
             for (x, y) in TETROS[cur][rot]:
                 vx, vy = px + x, py + y - HIDDEN
                 if 0 <= vx < W and 0 <= vy < H:
                     pygame.draw.rect(
                         screen, COLORS[cur],
-                        pygame.Rect(main_ox2 + vx * cell2, main_oy2 + vy * cell2, cell2 - 1, cell2 - 1)
+                        pygame.Rect(main_ox2 + round((ipx + x) * cell2), main_oy2 + round((ipy + y - HIDDEN) * cell2),
+                                    cell2 - 1, cell2 - 1)
                     )
-
-        # === MID PANEL: NEXT listesi + HOLD (kutular küçük kalacak) ===
-        mini = max(6, int(10 * (cell2 / 30)))
-
-        # NEXT (dikey liste)
-        nxr = layout["next_rect"]
-        screen.blit(font.render("NEXT:", True, (220, 220, 230)), (nxr.x + 10, nxr.y + 10))
-        nq = list(next_queue)
-        start_x = nxr.x + 14
-        start_y = nxr.y + 40
-        step_y = mini * 4 + 10
-        max_show = max(3, (nxr.height - 50) // step_y)
-        for i in range(min(8, max_show)):
-            piece = nq[i] if i < len(nq) else None
-            if piece:
-                draw_mini_piece(piece, start_x, start_y + i * step_y, mini)
-
-        # HOLD
-        hdr = layout["hold_rect"]
-        screen.blit(font.render("HOLD:", True, (220, 220, 230)), (hdr.x + 10, hdr.y + 10))
-        if hold:
-            draw_mini_piece(hold, hdr.x + 14, hdr.y + 40, mini)
-
-        # === RANK PANEL: oyuncu listesi (senin eski players_box yerine) ===
-        rr = layout["rank_rect"]
-        y_list = rr.y + 54
-        line_h = 22
-        max_list_w = rr.width - 24
-        for idx, pid in enumerate(sorted(roster.keys())[:8], start=1):
-            nm = str(roster[pid])
-            st = "ALIVE" if alive_map.get(pid, True) else "DEAD"
-            if pid == my_id:
-                st = "YOU" if alive else "YOU(DEAD)"
-            txt = f"{idx}. {pid}: {nm} - {st}"
-            if small.size(txt)[0] > max_list_w:
-                txt = txt[: max(1, int(max_list_w / 8))] + "…"
-            screen.blit(small.render(txt, True, (190, 190, 205)), (rr.x + 12, y_list))
-            y_list += line_h
+        prof.lap("own_board")
 
         # dead overlay
         if not alive:
-            overlay = pygame.Surface((w, h), pygame.SRCALPHA)
-            overlay.fill((0, 0, 0, 140))
-            screen.blit(overlay, (0, 0))
-            msg1 = big.render("OLDUN!", True, (255, 200, 200))
-            msg2 = font.render("Izliyorsun... (ESC ile cik)", True, (220, 220, 230))
+            screen.blit(dead_overlay, (0, 0))
+            msg1 = ui.render_text(big, "OLDUN!", (255, 200, 200))
+            msg2 = ui.render_text(font, "Izliyorsun... (ESC ile cik)", (220, 220, 230))
             screen.blit(msg1, (main_ox2 + (W * cell2 - msg1.get_width()) // 2, main_oy2 + (H * cell2) // 2 - 30))
             screen.blit(msg2, (main_ox2 + (W * cell2 - msg2.get_width()) // 2, main_oy2 + (H * cell2) // 2 + 10))
+        prof.lap("hud")
+
+        prof.draw(screen, small)
+        latency.draw(screen, small)
+        prof.lap("profiler")
+
+        pygame.display.flip()
+        latency.frame_shown()
+        tail_s += (time.perf_counter() - t_tail - tail_s) * TAIL_EMA
+        prof.lap("flip")
+        prof.end_frame(dt)
+
+
+def spectator_loop(peer, host_ip: str, port: int):
+    """
+    Watch-only client: every board in one paged grid, redrawn when the host's
+    reduced-rate snapshots arrive. No engine, no input besides paging.
+    """
+    ui.init_pygame()
+    screen = pygame.display.set_mode((1280, 800), pygame.RESIZABLE)
+    pygame.display.set_caption(f"Tetris (LAN) - watching {host_ip}:{port}")
+    font = ui.sys_font(20)
+    small = ui.sys_font(14)
+
+    my_id = 0
+    roster: dict[int, str] = {}
+    alive_map: dict[int, bool] = {}
+    replicas = ReplicaSet()
+    started = False
+    end_packet = {"active": False, "winner": None, "ranking": [], "roster": {}}
+    board_cache = BoardSurfaceCache()
+    page = 0
+
+    dirty = True
+    while True:
+        events = ui.wait_events(0 if dirty else WATCH_POLL_S)
+        for e in events:
+            if e.type == pygame.QUIT:
+                return
+            if e.type == pygame.VIDEORESIZE:
+                screen = pygame.display.set_mode((e.w, e.h), pygame.RESIZABLE)
+            if e.type == pygame.KEYDOWN:
+                if e.key == pygame.K_ESCAPE:
+                    return
+                if e.key == pygame.K_PAGEUP:
+                    page -= 1
+                elif e.key == pygame.K_PAGEDOWN:
+                    page += 1
+            dirty = True
+
+        while peer.inbox:
+            msg = peer.inbox.popleft()
+            t = msg.get("t")
+            dirty = True
+            if t == "welcome":
+                my_id = int(msg.get("id", 0))
+                roster.update({int(k): v for k, v in msg.get("roster", {}).items()})
+            elif t == "roster":
+                roster.clear()
+                roster.update({int(k): v for k, v in msg.get("roster", {}).items()})
+            elif t == "join":
+                roster[int(msg.get("id"))] = str(msg.get("name", ""))
+            elif t == "start":
+                started = True
+            elif t == "alive":
+                alive_map.update({int(k): bool(v) for k, v in msg.get("m", {}).items()})
+                started = True
+            elif t == "board":
+                pid = int(msg.get("id"))
+                replicas.apply(pid, msg)
+                alive_map[pid] = bool(msg.get("alive", True))
+                started = True
+            elif t == "dead":
+                alive_map[int(msg.get("id"))] = False
+            elif t == "end":
+                end_packet["active"] = True
+                end_packet["winner"] = msg.get("winner")
+                end_packet["ranking"] = msg.get("ranking", [])
+                end_packet["roster"] = {int(k): v for k, v in msg.get("roster", {}).items()}
+
+        if end_packet["active"]:
+            def next_match(_pressed):
+                # keep following the room: wait for the host's rematch
+                while peer.inbox:
+                    m = peer.inbox.popleft()
+                    if m.get("t") == "start":
+                        return float(m.get("at", 0.0))
+                    if m.get("t") == "roster":
+                        roster.clear()
+                        roster.update({int(k): v for k, v in m.get("roster", {}).items()})
+                return None if peer.alive else 0.0
+
+            if not ui.show_ranking_screen(end_packet, my_id, next_match):
+                return
+            replicas = ReplicaSet()
+            alive_map.clear()
+            board_cache.clear()
+            end_packet["active"] = False
+            started = True
+            dirty = True
+            continue
+        if not peer.alive:
+            return
+        if not dirty:
+            continue
+        dirty = False
+
+        w, h = screen.get_size()
+        screen.fill((12, 12, 16))
+        ids = sorted(roster)
+        n_alive = sum(1 for pid in ids if alive_map.get(pid, True))
+        head = f"WATCHING {host_ip}:{port}  -  {n_alive}/{len(ids)} alive  -  ESC: leave"
+        screen.blit(ui.render_text(font, ui.fit_text(font, head, w - 32), (220, 220, 230)), (16, 12))
+
+        if not started:
+            msg = ui.render_text(font, "Waiting for the host to start...", (160, 160, 175))
+            screen.blit(msg, ((w - msg.get_width()) // 2, h // 2))
+            pygame.display.flip()
+            continue
+
+        top = 16 + font.get_linesize() + 10
+        slots = ui.compute_grid_slots(16, top, w - 32, h - top - 40, max(1, len(ids)))
+        pages = max(1, -(-len(ids) // len(slots)))
+        page %= pages
+        shown = ids[page * len(slots):(page + 1) * len(slots)]
+        for r, pid in zip(slots, shown):
+            dead = alive_map.get(pid, True) is False
+            nm = ui.fit_text(small, f"{pid}:{roster.get(pid, '')}" + (" [DEAD]" if dead else ""), r.width)
+            screen.blit(ui.render_text(small, nm, (150, 90, 90) if dead else (220, 220, 230)), (r.x, r.y))
+            b = replicas.boards.get(pid)
+            if b is None:
+                continue
+            area_h = r.height - ui.GRID_HEAD_H
+            c = max(2, min((r.width - 4) // W, (area_h - 4) // H))
+            ox = r.x + (r.width - W * c) // 2
+            oy = r.y + ui.GRID_HEAD_H + 2
+            board_cache.blit(screen, pid, b, ox, oy, c)
+        board_cache.prune(set(shown))
+        if pages > 1:
+            pg = ui.render_text(small, f"{page + 1}/{pages}  PgUp/PgDn", (160, 160, 175))
+            screen.blit(pg, ((w - pg.get_width()) // 2, h - pg.get_height() - 12))
 
         pygame.display.flip()
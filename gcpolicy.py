@@ -0,0 +1,76 @@
+"""
+Match-time garbage collector policy.
+
+Setup (fonts, surfaces, layout, replicas) is collected once and frozen with
+gc.freeze(), so no later collection walks it. Automatic collection is off for
+the match; the game loop asks for collections at moments a pause does not
+show: right after a line clear and when a frame finished early. Generations
+are promoted on CPython's usual ratios, just at those points instead of in the
+middle of a frame. A young backlog past YOUNG_FORCE is collected anyway
+at the next frame boundary, so a loop that never goes idle stays bounded.
+"""
+import gc
+import os
+
+GC_ENV = "TETRIS_GC"        # "0" = leave the collector on its defaults during matches
+
+YOUNG_DUE = 2000            # gc.get_count()[0] before a young collection is due (CPython: 700)
+YOUNG_FORCE = 50000         # ... collected at the next frame boundary even without idle time
+GEN_RATIO = 10              # gen1 every 10 young collections, full every 10 gen1 (CPython's ratios)
+IDLE_YOUNG_S = 0.002        # spare frame time a gen0 / gen1 collection needs
+IDLE_FULL_S = 0.006         # ... and a full one (only the unfrozen heap is walked)
+
+
+class MatchGC:
+    def __init__(self, enabled: bool | None = None):
+        self.enabled = os.environ.get(GC_ENV, "1") != "0" if enabled is None else enabled
+        self.active = False
+        self._was_enabled = True
+
+    def begin(self):
+        if not self.enabled or self.active:
+            return
+        self._was_enabled = gc.isenabled()
+        gc.collect()
+        gc.freeze()
+        gc.disable()
+        self.active = True
+
+    def end(self):
+        if not self.active:
+            return
+        self.active = False
+        gc.unfreeze()
+        if self._was_enabled:
+            gc.enable()
+
+    def _due(self) -> int | None:
+        c0, c1, c2 = gc.get_count()
+        if c2 >= GEN_RATIO:
+            return 2
+        if c1 >= GEN_RATIO:
+            return 1
+        if c0 >= YOUNG_DUE:
+            return 0
+        return None
+
+    def idle(self, spare_s: float):
+        """Between frames: collect what is due if spare_s (time until the next frame) covers it."""
+        if not self.active:
+            return
+        gen = self._due()
+        if gen is None:
+            return
+        if spare_s >= IDLE_FULL_S:
+            gc.collect(gen)
+        elif spare_s >= IDLE_YOUNG_S:
+            gc.collect(min(gen, 1))     # a full one waits for a longer gap or a line clear
+        elif gc.get_count()[0] >= YOUNG_FORCE:
+            gc.collect(0)               # no idle frame for a long while: keep memory bounded
+
+    def line_clear(self):
+        """Rows just vanished: a pause here hides behind the board change."""
+        if self.active:
+            gen = self._due()
+            if gen is not None:
+                gc.collect(gen)
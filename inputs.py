@@ -0,0 +1,115 @@
+import time
+from collections import deque
+
+import pygame
+
+# Only these reach the queue during a match; everything else (mouse motion,
+# text input, window chatter) is dropped by SDL before it costs us anything.
+GAME_EVENTS = (pygame.QUIT, pygame.KEYDOWN, pygame.KEYUP, pygame.VIDEORESIZE)
+
+SAMPLE_STEP_S = 0.001    # polling period while waiting for the next frame (keys held)
+LATENCY_HISTORY = 240
+
+
+def restrict_events():
+    pygame.event.set_blocked(None)
+    pygame.event.set_allowed(list(GAME_EVENTS))
+
+
+def restore_events():
+    pygame.event.set_allowed(None)
+
+
+class InputSampler:
+    """
+    Drains the SDL queue at ~1 kHz while the loop waits for its next frame and
+    stamps every event with time.perf_counter(), so the simulation can apply
+    inputs at the tick they happened instead of at the next frame boundary.
+    That only runs while busy (a key is held: its release / DAS timing
+    matters); otherwise the wait is one sleep to the frame deadline, so idle,
+    dead and spectating frames do not wake up 1000 times a second.
+    """
+
+    def __init__(self):
+        self.pending: deque = deque()
+        self.next_frame = time.perf_counter()
+        self._last_frame = self.next_frame
+
+    def sample(self):
+        evs = pygame.event.get()
+        if evs:
+            now = time.perf_counter()
+            for ev in evs:
+                self.pending.append((now, ev))
+
+    def wait_frame(self, fps: int, busy: bool = True):
+        """Pace to fps (0 = no wait), sampling input meanwhile if busy. Returns the frame dt in seconds."""
+        now = time.perf_counter()
+        if fps > 0:
+            self.next_frame = max(self.next_frame + 1.0 / fps, now - 1.0 / fps)
+            while True:
+                if busy:
+                    self.sample()
+                now = time.perf_counter()
+                left = self.next_frame - now
+                if left <= 0:
+                    break
+                time.sleep(min(SAMPLE_STEP_S, left) if busy else left)
+        self.sample()
+        dt = now - self._last_frame
+        self._last_frame = now
+        return dt
+
+    def time_left(self, fps: int) -> float:
+        """Seconds until wait_frame(fps) would return (0 when uncapped or already late)."""
+        if fps <= 0:
+            return 0.0
+        return max(0.0, self.next_frame + 1.0 / fps - time.perf_counter())
+
+    def drain(self) -> list:
+        out = list(self.pending)
+        self.pending.clear()
+        return out
+
+
+class LatencyMeter:
+    """
+    Input-to-display latency: time from an input's sample stamp to the end of
+    the display.flip() of the first frame that shows its effect.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.samples = deque(maxlen=LATENCY_HISTORY)
+        self._waiting: list[float] = []
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.samples.clear()
+        self._waiting.clear()
+
+    def input_applied(self, t_in: float):
+        if self.enabled:
+            self._waiting.append(t_in)
+
+    def frame_shown(self):
+        if not self._waiting:
+            return
+        now = time.perf_counter()
+        for t_in in self._waiting:
+            self.samples.append((now - t_in) * 1000.0)
+        self._waiting.clear()
+
+    def summary(self) -> str:
+        if not self.samples:
+            return "input->flip: (press keys)"
+        s = sorted(self.samples)
+        avg = sum(s) / len(s)
+        p95 = s[min(len(s) - 1, int(len(s) * 0.95))]
+        return f"input->flip avg {avg:5.2f}ms  p95 {p95:5.2f}ms  max {s[-1]:5.2f}ms  n={len(s)}"
+
+    def draw(self, surf: pygame.Surface, font: pygame.font.Font):
+        if not self.enabled:
+            return
+        t = font.render(self.summary(), True, (240, 240, 250), (0, 0, 0))
+        surf.blit(t, (20, surf.get_height() - t.get_height() - 20))
@@ -0,0 +1,160 @@
+"""
+Killcam: the last KILLCAM_S seconds of the match as you saw it (your board and
+the opponents on screen), replayed on the ranking screen.
+"""
+from bisect import bisect_right
+from collections import deque
+
+import pygame
+
+from render import BoardSurfaceCache
+from tetris_core import W, H, HIDDEN, TETROS, COLORS, board_to_string, string_to_board
+
+KILLCAM_S = 12.0
+SAMPLE_HZ = 20
+FRAMES = int(KILLCAM_S * SAMPLE_HZ)
+MAX_OPPONENTS = 8           # thumbnails in the replay (the first ones that were on screen)
+SCRUB_STEP_S = 0.5
+DECODED_MAX = 64            # decoded boards kept while scrubbing
+
+
+class MatchHistory:
+    """
+    Ring of FRAMES samples (t, own board string, own piece, ((pid, board string,
+    piece), ...)). A board is turned into a string only when it changed and the
+    string is shared by the following samples, so memory is fixed by FRAMES
+    however long the match runs. Recording stops at your own death.
+    """
+
+    def __init__(self, my_id: int):
+        self.my_id = my_id
+        self.frames: deque = deque(maxlen=FRAMES)
+        self.frozen = False
+        self._next_t = 0.0
+        self._strings: dict[int, tuple] = {}    # pid -> (board object, string)
+
+    def record(self, now: float, own_s: str, own_piece, opp_boards: dict, ids, get_piece=None):
+        """Once per frame; samples at SAMPLE_HZ. Opponent boards must be replaced on change (replicas are)."""
+        if self.frozen or now < self._next_t:
+            return
+        self._next_t = now + 1.0 / SAMPLE_HZ
+        opp = []
+        for pid in ids[:MAX_OPPONENTS]:
+            b = opp_boards.get(pid)
+            if b is None:
+                continue
+            cached = self._strings.get(pid)
+            if cached is None or cached[0] is not b:
+                cached = self._strings[pid] = (b, board_to_string(b))
+            opp.append((pid, cached[1], get_piece(pid) if get_piece is not None else None))
+        self.frames.append((now, own_s, own_piece, tuple(opp)))
+
+    def freeze(self):
+        self.frozen = True
+        self._strings.clear()
+
+
+class KillcamView:
+    """Scrubber over a frozen MatchHistory: plays on a loop, LEFT/RIGHT / mouse on the bar to seek, P to pause."""
+
+    def __init__(self, history: MatchHistory):
+        self.frames = list(history.frames)
+        self.my_id = history.my_id
+        self.times = [f[0] for f in self.frames]
+        self.t0 = self.times[0]
+        self.length = self.times[-1] - self.t0
+        self.pos = 0.0
+        self.playing = True
+        self.cache = BoardSurfaceCache()
+        self._decoded: dict[str, list] = {}
+        self._bar = None
+        self._dragging = False
+
+    def _board(self, s: str):
+        b = self._decoded.get(s)
+        if b is None:
+            if len(self._decoded) >= DECODED_MAX:
+                self._decoded.clear()
+            b = self._decoded[s] = string_to_board(s)
+        return b
+
+    def _seek(self, pos: float):
+        self.pos = min(max(0.0, pos), self.length)
+
+    def handle(self, e) -> bool:
+        """True if the event was for the scrubber."""
+        if e.type == pygame.KEYDOWN:
+            if e.key == pygame.K_LEFT:
+                self.playing = False
+                self._seek(self.pos - SCRUB_STEP_S)
+            elif e.key == pygame.K_RIGHT:
+                self.playing = False
+                self._seek(self.pos + SCRUB_STEP_S)
+            elif e.key == pygame.K_p:
+                if not self.playing and self.pos >= self.length:
+                    self.pos = 0.0
+                self.playing = not self.playing
+            elif e.key == pygame.K_HOME:
+                self._seek(0.0)
+            else:
+                return False
+            return True
+        if e.type == pygame.MOUSEBUTTONDOWN and e.button == 1 and self._bar is not None \
+                and self._bar.inflate(0, 16).collidepoint(e.pos):
+            self._dragging = True
+            self.playing = False
+        elif e.type == pygame.MOUSEBUTTONUP and e.button == 1:
+            if not self._dragging:
+                return False
+            self._dragging = False
+        elif not (e.type == pygame.MOUSEMOTION and self._dragging):
+            return False
+        bar = self._bar
+        self._seek((e.pos[0] - bar.x) / max(1, bar.width) * self.length)
+        return True
+
+    def advance(self, dt: float):
+        if self.playing:
+            self.pos += dt
+            if self.pos > self.length:
+                self.pos = 0.0
+
+    def draw(self, screen: pygame.Surface, rect: pygame.Rect, font: pygame.font.Font):
+        i = max(0, bisect_right(self.times, self.t0 + self.pos) - 1)
+        _t, own_s, own_piece, opp = self.frames[i]
+
+        bar_h = font.get_linesize() + 14
+        area = pygame.Rect(rect.x, rect.y, rect.width, rect.height - bar_h)
+        own_w = area.width * 0.55 if opp else area.width
+        c = max(4, min(int(own_w) // W, area.height // H))
+        self._draw(screen, self.my_id, own_s, own_piece, area.x, area.y, c)
+
+        if opp:
+            gx = area.x + W * c + 16
+            cols = 2 if len(opp) > 4 else 1
+            rows = -(-len(opp) // cols)
+            gap = 6
+            sc = max(3, min((area.right - gx - gap * (cols - 1)) // (cols * W), (area.height - gap * (rows - 1)) // (rows * H)))
+            for k, (pid, s, piece) in enumerate(opp):
+                ox = gx + (k % cols) * (W * sc + gap)
+                oy = area.y + (k // cols) * (H * sc + gap)
+                self._draw(screen, pid, s, piece, ox, oy, sc)
+
+        # timeline
+        bar = self._bar = pygame.Rect(rect.x, rect.bottom - 10, rect.width, 6)
+        pygame.draw.rect(screen, (50, 50, 62), bar)
+        done = int(bar.width * (self.pos / self.length)) if self.length > 0 else bar.width
+        pygame.draw.rect(screen, (220, 40, 40), pygame.Rect(bar.x, bar.y, done, bar.height))
+        label = f"KILLCAM  -{self.length - self.pos:4.1f}s   {'||' if self.playing else '>'} P   <- -> seek"
+        screen.blit(font.render(label, True, (200, 200, 210)), (rect.x, bar.y - font.get_linesize() - 4))
+
+    def _draw(self, screen, pid, s, piece, ox, oy, c):
+        self.cache.blit(screen, pid, self._board(s), ox + 2, oy + 2, c)
+        if piece is None:
+            return
+        p, r, px, py = piece
+        color = COLORS.get(p, (200, 200, 200))
+        for (x, y) in TETROS[p][r]:
+            vx, vy = px + x, py + y - HIDDEN
+            if 0 <= vx < W and 0 <= vy < H:
+                pygame.draw.rect(screen, color, (ox + 2 + vx * c, oy + 2 + vy * c, c - 1, c - 1))
@@ -0,0 +1,265 @@
+"""
+Headless self-play league: seeded 2-8 player bot matches on a process pool,
+one parameter set (gravity curve / lock delay / attack table) per match.
+
+    python league.py --matches 2000 --out league
+    python league.py --sets my_sets.json --out league-b
+    python league.py --report --out league
+    python league.py --scaling --out league     matches/s on 1..N processes
+
+Every finished match is appended to <out>/results.jsonl right away; running the
+same command again skips the (set, seed) pairs already there. <out>/summary.json
+holds the per-set aggregates: draws (matches that hit MAX_MATCH_S) on their own,
+match length and survival curve over the decided matches only, garbage sent, and
+the last --scaling measurement (<out>/scaling.json).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+
+import bot
+import engine
+from engine import PlayerEngine, SIM_DT, SIM_HZ
+
+# Engine globals a parameter set may override (per worker process, per match).
+TUNABLE = ("GRAVITY_START", "GRAVITY_MIN", "GRAVITY_RAMP", "LOCK_DELAY", "MAX_LOCK_RESETS", "ATTACK_TABLE")
+
+DEFAULT_SETS = {
+    "baseline": {},
+    "ramp-x2": {"GRAVITY_RAMP": 0.004},
+    "lock-short": {"LOCK_DELAY": 0.5, "MAX_LOCK_RESETS": 10},
+    "attack-plus": {"ATTACK_TABLE": {"1": 0, "2": 1, "3": 2, "4": 5}},
+}
+
+MIN_PLAYERS, MAX_PLAYERS = 2, 8
+MAX_MATCH_S = 600.0          # simulated seconds; longer matches end as a draw (solo bots top out well before)
+BOT_HZ = 60                  # bot.update() rate in simulated time
+# (inputs per second, blunder chance): one picked per seat from the match seed.
+# Mid-level bots on purpose: stronger ones survive indefinitely and the match only ends at the cap.
+BOT_SKILLS = ((6, 0.3), (8, 0.25), (10, 0.2))
+LEAGUE_LOOKAHEAD = 0         # bot.LOOKAHEAD_BEAM for league bots (cheaper, still decent)
+SURVIVAL_STEP_S = 15         # survival curve resolution
+
+RESULTS_FILE = "results.jsonl"
+SUMMARY_FILE = "summary.json"
+SCALING_FILE = "scaling.json"
+SCALING_JOBS_PER_CPU = 4     # --scaling: the same batch (this many matches per core) on every process count
+
+_defaults = {k: getattr(engine, k) for k in TUNABLE}
+
+
+def _apply(params: dict):
+    for k in TUNABLE:
+        v = params.get(k, _defaults[k])
+        if k == "ATTACK_TABLE":
+            v = {int(n): int(rows) for n, rows in v.items()}
+        setattr(engine, k, v)
+
+
+def play_match(job: tuple) -> dict:
+    """One seeded match in simulated time. Same job -> same result."""
+    set_name, params, seed = job
+    _apply(params)
+    bot.LOOKAHEAD_BEAM = LEAGUE_LOOKAHEAD
+    random.seed(seed)
+    players = random.randint(MIN_PLAYERS, MAX_PLAYERS)
+
+    t = 0.0
+    engines: list[PlayerEngine] = []
+    sent = [0] * players
+    died: list[float | None] = [None] * players
+
+    def hooks(i):
+        def send_atk(n):
+            sent[i] += n
+            for j, e in enumerate(engines):    # classic room: everyone else alive gets it
+                if j != i and e.alive:
+                    e.add_pending_garbage(n)
+
+        def send_dead():
+            died[i] = round(t, 3)
+        return send_atk, send_dead
+
+    for i in range(players):
+        atk, dead = hooks(i)
+        engines.append(PlayerEngine(send_atk=atk, send_dead=dead))
+    bots = [bot.Bot(float("inf"), *random.choice(BOT_SKILLS)) for _ in range(players)]
+
+    t0 = time.perf_counter()
+    ticks_per_bot = max(1, SIM_HZ // BOT_HZ)
+    n = 0
+    while sum(e.alive for e in engines) > 1 and t < MAX_MATCH_S:
+        if n % ticks_per_bot == 0:
+            for b, e in zip(bots, engines):
+                b.update(e, t)
+        for e in engines:
+            e.tick()
+        n += 1
+        t = n * SIM_DT
+
+    winner = next((i for i, e in enumerate(engines) if e.alive), None) if t < MAX_MATCH_S else None
+    return {
+        "set": set_name, "seed": seed, "players": players,
+        "length_s": round(t, 3), "draw": t >= MAX_MATCH_S, "winner": winner,
+        "sent": sent, "died": died, "pieces": [e.piece_serial for e in engines],
+        "cpu_s": round(time.perf_counter() - t0, 3),
+    }
+
+
+def load_results(path: str) -> list[dict]:
+    out = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    out.append(json.loads(line))
+                except ValueError:
+                    pass    # half-written last line of an interrupted run
+    except FileNotFoundError:
+        pass
+    return out
+
+
+def summarize(results: list[dict]) -> dict:
+    by_set: dict[str, list[dict]] = {}
+    for r in results:
+        by_set.setdefault(r["set"], []).append(r)
+
+    summary = {}
+    for name, rs in sorted(by_set.items()):
+        # a draw only says "lasted MAX_MATCH_S": lengths / survival come from decided matches
+        decided = [r for r in rs if not r["draw"]]
+        lengths = sorted(r["length_s"] for r in decided)
+        player_s = sum(r["length_s"] * r["players"] for r in rs)
+        deaths = [d for r in decided for d in r["died"]]
+        curve = []
+        if lengths:
+            for k in range(int(lengths[-1] // SURVIVAL_STEP_S) + 1):
+                ts = k * SURVIVAL_STEP_S
+                curve.append(round(sum(1 for d in deaths if d is None or d > ts) / len(deaths), 4))
+        summary[name] = {
+            "matches": len(rs),
+            "draws": len(rs) - len(decided),
+            "draw_rate": round((len(rs) - len(decided)) / len(rs), 4),
+            "decided": len(decided),
+            "length_avg_s": round(sum(lengths) / len(lengths), 2) if lengths else None,
+            "length_p50_s": lengths[len(lengths) // 2] if lengths else None,
+            "length_p90_s": lengths[min(len(lengths) - 1, int(len(lengths) * 0.9))] if lengths else None,
+            "garbage_per_player_min": round(sum(sum(r["sent"]) for r in rs) / max(1e-9, player_s) * 60.0, 3),
+            "survival_step_s": SURVIVAL_STEP_S,
+            "survival": curve,    # decided matches: fraction of players still alive at k * survival_step_s
+        }
+    return summary
+
+
+def _fmt(v) -> str:
+    return "-" if v is None else f"{v:.1f}"
+
+
+def print_summary(summary: dict):
+    print(f"{'set':<16}{'matches':>8}{'draws':>7}{'avg s':>9}{'p50 s':>9}{'p90 s':>9}{'gb/pl/min':>11}  survival@60s")
+    for name, s in summary.items():
+        k = 60 // s["survival_step_s"]
+        at60 = f"{s['survival'][k]:.2f}" if k < len(s["survival"]) else "-"
+        print(f"{name:<16}{s['matches']:>8}{s['draws']:>7}{_fmt(s['length_avg_s']):>9}{_fmt(s['length_p50_s']):>9}"
+              f"{_fmt(s['length_p90_s']):>9}{s['garbage_per_player_min']:>11.2f}  {at60}")
+    print("length / survival: decided matches only (draws = hit the MAX_MATCH_S cap)")
+
+
+def write_summary(out_dir: str):
+    summary = summarize(load_results(os.path.join(out_dir, RESULTS_FILE)))
+    doc = {"sets": summary}
+    try:
+        with open(os.path.join(out_dir, SCALING_FILE), "r", encoding="utf-8") as f:
+            doc["scaling"] = json.load(f)
+    except (OSError, ValueError):
+        pass
+    with open(os.path.join(out_dir, SUMMARY_FILE), "w", encoding="utf-8") as f:
+        json.dump(doc, f, indent=2)
+    print_summary(summary)
+
+
+def measure_scaling(sets: dict, out_dir: str, max_workers: int, base_seed: int = 1) -> dict:
+    """
+    Strong scaling: one fixed batch of matches played on 1, 2, 4, ... max_workers
+    processes. speedup = rate / rate on 1 process, efficiency = speedup / processes.
+    """
+    name, params = next(iter(sets.items()))
+    jobs = [(name, params, base_seed + i) for i in range(SCALING_JOBS_PER_CPU * max_workers)]
+    counts = sorted({1, max_workers} | {2 ** i for i in range(max_workers.bit_length()) if 2 ** i <= max_workers})
+    runs = []
+    for k in counts:
+        t0 = time.perf_counter()
+        with multiprocessing.Pool(k) as pool:
+            cpu = sum(r["cpu_s"] for r in pool.imap_unordered(play_match, jobs, chunksize=1))
+        wall = time.perf_counter() - t0
+        rate = len(jobs) / wall
+        base = runs[0]["matches_per_s"] if runs else rate
+        runs.append({"workers": k, "wall_s": round(wall, 2), "match_cpu_s": round(cpu, 2),
+                     "matches_per_s": round(rate, 4), "speedup": round(rate / base, 3),
+                     "efficiency": round(rate / base / k, 3)})
+        print(f"  {k:>3} processes: {rate:.3f} matches/s  speedup {rate / base:.2f}  efficiency {rate / base / k:.2f}")
+    out = {"cpus": os.cpu_count(), "set": name, "matches": len(jobs), "runs": runs}
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, SCALING_FILE), "w", encoding="utf-8") as f:
+        json.dump(out, f, indent=2)
+    return out
+
+
+def run_league(sets: dict, matches: int, out_dir: str, workers: int, base_seed: int = 1):
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, RESULTS_FILE)
+    done = {(r["set"], r["seed"]) for r in load_results(path)}
+    jobs = [(name, params, base_seed + i)
+            for i in range(matches) for name, params in sets.items()
+            if (name, base_seed + i) not in done]
+    print(f"{len(done)} matches on disk, {len(jobs)} to play on {workers} processes")
+
+    if jobs:
+        t0 = time.perf_counter()
+        with open(path, "a", encoding="utf-8") as f, multiprocessing.Pool(workers) as pool:
+            # independent jobs, tiny results: throughput scales with the process count
+            for k, res in enumerate(pool.imap_unordered(play_match, jobs, chunksize=1), 1):
+                f.write(json.dumps(res, separators=(",", ":")) + "\n")
+                f.flush()
+                if k % 50 == 0 or k == len(jobs):
+                    rate = k / (time.perf_counter() - t0)
+                    print(f"  {k}/{len(jobs)}  {rate:.2f} matches/s")
+
+    write_summary(out_dir)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Bot self-play league for engine tuning")
+    ap.add_argument("--matches", type=int, default=200, help="seeds per parameter set")
+    ap.add_argument("--sets", help="JSON file {name: {TUNABLE: value}}; default: built-in sets")
+    ap.add_argument("--out", default="league")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--seed", type=int, default=1, help="first seed")
+    ap.add_argument("--report", action="store_true", help="only rebuild summary.json from results")
+    ap.add_argument("--scaling", action="store_true", help="measure matches/s on 1..--workers processes")
+    args = ap.parse_args()
+
+    if args.report:
+        write_summary(args.out)
+        return
+
+    sets = DEFAULT_SETS
+    if args.sets:
+        with open(args.sets, "r", encoding="utf-8") as f:
+            sets = json.load(f)
+        bad = {k for p in sets.values() for k in p} - set(TUNABLE)
+        if bad:
+            raise SystemExit(f"unknown parameters: {', '.join(sorted(bad))} (tunable: {', '.join(TUNABLE)})")
+    if args.scaling:
+        measure_scaling(sets, args.out, args.workers, args.seed)
+        write_summary(args.out)
+        return
+    run_league(sets, args.matches, args.out, args.workers, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,49 @@
 import time
+_T_START = time.perf_counter()    # startup report counts from here (before the heavy imports)
+
+import multiprocessing
+import os
 import pygame
 
-from net import HostServer, join_connect, get_local_ip
+from net import HostServer, NetPeer, Connector, get_local_ip
 import ui
-from game import common_game_loop
-from tetris_core import string_to_board
+import matchlog
+from game import common_game_loop, spectator_loop
+from profiler import StartupReport
+from replication import REPLICATION_MODE, EVENT_TYPES, LOD_TYPES, EventStream, ReplicaSet
+from split import SPLIT_CLIENT, ClientProcess, RemoteEngine
 
 MAX_PLAYERS = 8
 DEFAULT_PORT = 5000
 START_DELAY_SECONDS = 2.0
+AUTOPLAY = os.environ.get("TETRIS_BOT") == "1"     # local seat played by bot.Bot (testing / demos)
+
+def autoplay_bot():
+    """bot.Bot for the local seat when TETRIS_BOT=1; the bot module is only loaded then."""
+    if not AUTOPLAY:
+        return None
+    from bot import Bot
+    return Bot()
+
+def run_client(peer, nickname: str, my_id: int, roster: dict) -> float:
+    """One match over peer. Returns the next start time if the host called a rematch."""
+    def wait_rematch(_pressed):
+        while peer.inbox:
+            msg = peer.inbox.popleft()
+            t = msg.get("t")
+            if t == "start":
+                return float(msg.get("at", time.time()))
+            if t == "roster":
+                roster.clear()
+                roster.update({int(k): v for k, v in msg.get("roster", {}).items()})
+            elif t == "join":
+                roster[int(msg.get("id"))] = str(msg.get("name", ""))
+        return None if peer.alive else 0.0
 
-def run_client(peer, nickname: str, my_id: int):
-    roster = {1: "Host"}
-    opp_boards = {}
+    replicas = ReplicaSet()
     alive_map = {}
     end_packet = {"active": False, "winner": None, "ranking": [], "roster": {}}
+    stream = EventStream(peer.send) if REPLICATION_MODE == "events" else None
 
     def drain_messages() -> int:
         atks_for_me = 0
@@ -26,21 +55,36 @@ def run_client(peer, nickname: str, my_id: int):
                 r = msg.get("roster", {})
                 roster.clear()
                 roster.update({int(k): v for k, v in r.items()})
+                for pid in roster:
+                    if pid != my_id:
+                        replicas.ensure(pid)
 
             elif t == "join":
                 pid = int(msg.get("id"))
                 nm = str(msg.get("name", f"Player{pid}"))
                 roster[pid] = nm
+                if pid != my_id:
+                    replicas.ensure(pid)
 
-            elif t == "board":
+            elif t == "board" or t in LOD_TYPES:
                 pid = int(msg.get("id"))
-                s = msg.get("s", "")
-                opp_boards[pid] = string_to_board(s)
+                # decode only on change: a new board object tells the renderer to redraw
+                replicas.apply(pid, msg)
                 alive_map[pid] = bool(msg.get("alive", True))
 
+            elif t in EVENT_TYPES:
+                pid = int(msg.get("id"))
+                if pid != my_id and replicas.apply(pid, msg):
+                    peer.send({"t": "kfreq", "id": pid})
+
+            elif t == "kfreq":
+                if stream is not None:
+                    stream.keyframe_wanted = True
+
             elif t == "dead":
                 pid = int(msg.get("id"))
                 alive_map[pid] = False
+                replicas.drop_piece(pid)
 
             elif t == "atk":
                 n = int(msg.get("n", 0))
@@ -67,7 +111,7 @@ def run_client(peer, nickname: str, my_id: int):
     def send_dead():
         peer.send({"t": "dead"})
 
-    common_game_loop(
+    return common_game_loop(
         nickname=nickname,
         my_id=my_id,
         poll_net=poll_net,
@@ -75,33 +119,69 @@ def run_client(peer, nickname: str, my_id: int):
         send_atk=send_atk,
         send_dead=send_dead,
         get_roster=lambda: roster,
-        get_opp_boards=lambda: opp_boards,
+        get_opp_boards=lambda: replicas.boards,
         get_alive_map=lambda: alive_map,
         on_exit=lambda: peer.close(),
         host_server=None,
         end_packet=end_packet,
+        event_stream=stream,
+        get_opp_piece=lambda pid: replicas.piece_at(pid, time.monotonic()),
+        set_view=lambda ids, lod: peer.send({"t": "view", "ids": ids, "lod": lod}),
+        rematch=wait_rematch,
+        autoplay=autoplay_bot(),
+        record=matchlog.recorder(my_id),
+    )
+
+def run_client_split(cp: ClientProcess, nickname: str, my_id: int, start_at: float) -> float:
+    """run_client with the engine and the connection in the worker process (split.py)."""
+    eng = RemoteEngine(cp, start_at)
+    return common_game_loop(
+        nickname=nickname,
+        my_id=my_id,
+        poll_net=lambda _s, _a: 0,
+        send_board=lambda _s, _a: None,
+        send_atk=None,
+        send_dead=None,
+        get_roster=lambda: eng.roster,
+        get_opp_boards=lambda: eng.opp_boards,
+        get_alive_map=lambda: eng.alive_map,
+        on_exit=cp.close,
+        host_server=None,
+        end_packet=eng.end_packet,
+        get_opp_piece=lambda pid: eng.opp_pieces.get(pid),
+        set_view=cp.set_view,
+        rematch=cp.rematch,
+        engine=eng,
     )
 
-def run_host(server: HostServer, nickname: str):
+def run_host(server: HostServer, nickname: str) -> float:
+    """One match. Returns the next start time if the host called a rematch (room stays open)."""
     my_id = 1
     roster = {1: nickname}
-    opp_boards = {}
+
+    def rematch(pressed):
+        return server.rematch(START_DELAY_SECONDS) if pressed else None
+
     alive_map = {}
     end_packet = {"active": False, "winner": None, "ranking": [], "roster": {}}
+    stream = EventStream(server.send_host_event) if server.replication == "events" else None
 
     def poll_net(board_s, alive):
         atks = server.poll_and_route(nickname, board_s, alive)
+        if stream is not None and server.host_keyframe_wanted:
+            server.host_keyframe_wanted = False
+            stream.keyframe_wanted = True
 
         roster.clear()
         with server._lock:
             for pid, nm in server.names.items():
                 roster[pid] = nm
+        for pid in roster:
+            if pid != my_id:
+                server.replicas.ensure(pid)
 
-        opp_boards.clear()
         alive_map.clear()
         with server._lock:
-            for pid, s in server.last_board.items():
-                opp_boards[pid] = string_to_board(s)
             for pid, a in server.last_alive.items():
                 alive_map[pid] = bool(a)
 
@@ -115,12 +195,12 @@ def run_host(server: HostServer, nickname: str):
         return atks
 
     def send_atk(n):
-        server._broadcast({"t": "atk", "n": n}, exclude=None)
+        server.send_host_attack(n)
 
     def send_dead():
         server._broadcast({"t": "dead", "id": 1}, exclude=None)
 
-    common_game_loop(
+    return common_game_loop(
         nickname=nickname,
         my_id=my_id,
         poll_net=poll_net,
@@ -128,19 +208,29 @@ def run_host(server: HostServer, nickname: str):
         send_atk=send_atk,
         send_dead=send_dead,
         get_roster=lambda: roster,
-        get_opp_boards=lambda: opp_boards,
+        get_opp_boards=lambda: server.replicas.boards,
         get_alive_map=lambda: alive_map,
         on_exit=lambda: server.stop(),
         host_server=server,
         end_packet=end_packet,
+        event_stream=stream,
+        get_opp_piece=lambda pid: server.replicas.piece_at(pid, time.monotonic()),
+        rematch=rematch,
+        autoplay=autoplay_bot(),
+        record=matchlog.recorder(my_id),
     )
 
 def main():
-    pygame.init()
+    startup = StartupReport(_T_START)
+    startup.mark("imports")
+    ui.init_pygame()
+    startup.mark("init")
+    startup.mark("fonts (cached)" if ui.warm_fonts() else "fonts (scan)")
     pygame.display.set_mode((1000, 600))
+    startup.mark("window")
 
     while True:
-        mode = ui.main_menu_screen()
+        mode = ui.main_menu_screen(lambda: startup.finish("first frame"))
 
         if mode == "host":
             local_ip = get_local_ip()
@@ -153,7 +243,13 @@ def main():
 
             ui.countdown_screen(start_at, "Game starting")
             try:
-                run_host(server, host_nick)
+                # the room survives the match: rematches reuse the same server and connections
+                server.record = matchlog.recorder()
+                while start_at:
+                    matchlog.begin(start_at, role="host", me=1, players=len(server.names))
+                    start_at = run_host(server, host_nick)
+                    if start_at:
+                        ui.countdown_screen(start_at, "Rematch")
             finally:
                 try:
                     server.stop()
@@ -165,26 +261,49 @@ def main():
             if not host_ip:
                 continue
 
-            try:
-                peer = join_connect(host_ip, port, timeout_s=3.0)
-            except Exception:
-                # basit fail ekranı
-                scr = pygame.display.set_mode((900, 300))
-                scr.fill((12, 12, 16))
-                f = pygame.font.SysFont("consolas", 18)
-                scr.blit(f.render("CONNECT FAILED", True, (240, 120, 120)), (30, 40))
-                scr.blit(f.render(f"{host_ip}:{port}", True, (200, 200, 210)), (30, 80))
-                pygame.display.flip()
-                time.sleep(2)
+            # connects in the background; the screen stays live and ESC cancels
+            peer = ui.connect_screen(Connector(host_ip, port, timeout_s=3.0), host_ip, port)
+            if peer is None:
                 continue
 
+            cp = None
             try:
                 start_at, my_id = ui.client_lobby_screen(peer, host_ip, port, nick)
                 if start_at <= 0:
                     continue
                 peer.send({"t": "hello", "name": nick})
+                roster = {1: "Host"}
+                if SPLIT_CLIENT and isinstance(peer, NetPeer):
+                    # worker starts up during the countdown
+                    cp = ClientProcess(peer, my_id, roster, start_at, autoplay=AUTOPLAY)
                 ui.countdown_screen(start_at, "Game starting")
-                run_client(peer, nick, my_id)
+                while start_at:
+                    if cp is not None:
+                        start_at = run_client_split(cp, nick, my_id, start_at)
+                    else:
+                        matchlog.begin(start_at, role="client", me=my_id)
+                        start_at = run_client(peer, nick, my_id, roster)
+                    if start_at:
+                        ui.countdown_screen(start_at, "Rematch")
+            finally:
+                if cp is not None:
+                    cp.close()
+                try:
+                    peer.close()
+                except Exception:
+                    pass
+
+        elif mode == "watch":
+            host_ip, port, _nick = ui.join_connect_screen()
+            if not host_ip:
+                continue
+
+            peer = ui.connect_screen(Connector(host_ip, port, timeout_s=3.0, role="spectator"), host_ip, port)
+            if peer is None:
+                continue
+
+            try:
+                spectator_loop(peer, host_ip, port)
             finally:
                 try:
                     peer.close()
@@ -192,4 +311,5 @@ def main():
                     pass
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()    # split.py worker in a frozen build
     main()
\ No newline at end of file
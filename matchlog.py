@@ -0,0 +1,228 @@
+"""
+Match event log: locks / line clears / attacks / garbage / deaths / rankings.
+
+Game code calls record() (one deque append, no I/O); a writer thread appends
+the ring to matchlogs/<time>-<pid>.jsonl in batches. Every machine writes its
+own file, events carry the match key (the shared start time) and the player id.
+
+    python matchlog.py import                  matchlogs/*.jsonl -> matchlog.sqlite
+    python matchlog.py import a.jsonl b.jsonl --db all.sqlite
+
+The import is incremental: files are append-only, so each import only reads
+what was added since the last one.
+"""
+import argparse
+import atexit
+import functools
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+LOG_DIR = "matchlogs"
+RING_SIZE = 16384        # events buffered between flushes; the oldest are dropped beyond that
+FLUSH_S = 0.5
+MATCHLOG_ENV = "TETRIS_MATCHLOG"     # "0" = do not record
+DEFAULT_DB = "matchlog.sqlite"
+
+# ev          fields
+# "start"     role, me, players          this process joined match m
+# "lock"      p, r, x, y, lines, n       piece locked, lines cleared, garbage rows sent
+# "garbage"   n                          garbage rows received (pushed into the board)
+# "topout"                               this player's engine died
+# "atk"       n, to                      host routing: rows from pid to ids (or "all")
+# "dead"                                 host saw pid die / leave
+# "dropped"   n                          the ring overflowed: n events before this one were lost
+# "kick"      reason                     host disconnected pid (flood / oversized frame / backlog)
+# "end"       winner, ranking, roster    host's final ranking
+
+
+class MatchLog:
+    """
+    record() is all the game thread ever does here: it stores a tuple in the
+    ring. Encoding and the file write happen on the writer thread.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.match: str | None = None
+        self.ring: deque = deque(maxlen=RING_SIZE)
+        self.dropped = 0
+        self._dropped_written = 0
+        self._f = None
+        self._stop = False
+        self._wake = threading.Event()
+        self._th = threading.Thread(target=self._writer, daemon=True)
+        self._th.start()
+
+    def begin(self, start_at: float, **meta):
+        self.match = f"{start_at:.3f}"    # same key on every machine in the room
+        self.record("start", **meta)
+
+    def end(self, start_at: float):
+        """Events after this carry no match; a newer begin() (host rematch) is left alone."""
+        if self.match == f"{start_at:.3f}":
+            self.match = None
+
+    def record(self, ev: str, pid: int | None = None, **fields):
+        if len(self.ring) == RING_SIZE:
+            self.dropped += 1
+        self.ring.append((time.time(), self.match, pid, ev, fields))
+
+    def bound(self, pid: int | None):
+        """record() with pid filled in (still overridable per call)."""
+        return functools.partial(self.record, pid=pid)
+
+    def _writer(self):
+        while not self._stop:
+            self._wake.wait(FLUSH_S)
+            self.flush()
+
+    def flush(self):
+        lines = []
+        # self.dropped only grows (game thread); the writer reports the part not written yet
+        total = self.dropped
+        dropped, self._dropped_written = total - self._dropped_written, total
+        if dropped:
+            # imported data shows the gap instead of silently missing events
+            lines.append(json.dumps({"ts": round(time.time(), 4), "m": self.match, "pid": None,
+                                     "ev": "dropped", "n": dropped}, separators=(",", ":")))
+        while True:
+            try:
+                ts, m, pid, ev, fields = self.ring.popleft()
+            except IndexError:
+                break
+            lines.append(json.dumps({"ts": round(ts, 4), "m": m, "pid": pid, "ev": ev, **fields},
+                                    separators=(",", ":")))
+        if not lines:
+            return
+        try:
+            if self._f is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._f = open(self.path, "a", encoding="utf-8")
+            self._f.write("\n".join(lines) + "\n")
+            self._f.flush()
+        except OSError as e:
+            print("[matchlog] write failed, logging off:", e)
+            self._stop = True
+
+    def close(self):
+        self._stop = True
+        self._wake.set()
+        self._th.join(timeout=2.0)
+        self.flush()
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+
+_log: MatchLog | None = None
+
+
+def get_log() -> MatchLog | None:
+    """Process-wide log, opened on first use; None when TETRIS_MATCHLOG=0."""
+    global _log
+    if _log is None and os.environ.get(MATCHLOG_ENV, "1") != "0":
+        name = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}.jsonl"
+        _log = MatchLog(os.path.join(LOG_DIR, name))
+        atexit.register(_log.close)
+    return _log
+
+
+def begin(start_at: float, **meta):
+    log = get_log()
+    if log is not None:
+        log.begin(start_at, **meta)
+
+
+def end(start_at: float):
+    log = get_log()
+    if log is not None:
+        log.end(start_at)
+
+
+def recorder(pid: int | None = None):
+    """record callable for PlayerEngine.record / HostServer.record, or None when logging is off."""
+    log = get_log()
+    return log.bound(pid) if log is not None else None
+
+
+# ---- SQLite importer ----
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    ts REAL, match TEXT, pid INTEGER, ev TEXT,
+    lines INTEGER, n INTEGER,   -- lock: lines cleared / rows sent; garbage / atk: rows
+    data TEXT                   -- remaining fields as JSON
+);
+CREATE INDEX IF NOT EXISTS events_match ON events(match, ts);
+CREATE INDEX IF NOT EXISTS events_ev ON events(ev, match);
+CREATE INDEX IF NOT EXISTS events_pid ON events(match, pid);
+CREATE TABLE IF NOT EXISTS rankings (
+    match TEXT, place INTEGER, pid INTEGER, name TEXT,
+    PRIMARY KEY (match, place)
+);
+CREATE TABLE IF NOT EXISTS imported (file TEXT PRIMARY KEY, offset INTEGER);
+"""
+
+
+def import_logs(paths: list[str], db_path: str = DEFAULT_DB) -> int:
+    """Append new lines of each log file to db_path. Returns the number of events added."""
+    con = sqlite3.connect(db_path)
+    con.executescript(SCHEMA)
+    added = 0
+    try:
+        for path in paths:
+            key = os.path.abspath(path)
+            row = con.execute("SELECT offset FROM imported WHERE file = ?", (key,)).fetchone()
+            off = row[0] if row else 0
+            with open(path, "rb") as f:
+                f.seek(off)
+                data = f.read()
+            end = data.rfind(b"\n") + 1     # a line still being written waits for the next import
+            if end == 0:
+                continue
+
+            events, ranks = [], []
+            for line in data[:end].splitlines():
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                m, ev = rec.pop("m", None), rec.pop("ev", None)
+                ts, pid = rec.pop("ts", None), rec.pop("pid", None)
+                lines, n = rec.pop("lines", None), rec.pop("n", None)
+                events.append((ts, m, pid, ev, lines, n, json.dumps(rec, separators=(",", ":")) if rec else None))
+                if ev == "end":
+                    names = rec.get("roster") or {}
+                    for place, rp in enumerate(rec.get("ranking") or [], 1):
+                        ranks.append((m, place, rp, names.get(str(rp))))
+
+            with con:
+                con.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", events)
+                con.executemany("INSERT OR REPLACE INTO rankings VALUES (?, ?, ?, ?)", ranks)
+                con.execute("INSERT OR REPLACE INTO imported VALUES (?, ?)", (key, off + end))
+            added += len(events)
+    finally:
+        con.close()
+    return added
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Match event log tools")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="import .jsonl logs into SQLite")
+    imp.add_argument("files", nargs="*", help=f"default: {LOG_DIR}/*.jsonl")
+    imp.add_argument("--db", default=DEFAULT_DB)
+    args = ap.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(LOG_DIR, "*.jsonl")))
+    n = import_logs(files, args.db)
+    print(f"{n} events from {len(files)} file(s) -> {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,52 +1,181 @@
+import os
+import random
+import select
 import socket
 import threading
 import time
 import json
 from collections import deque
 
+from replication import REPLICATION_MODE, EVENT_TYPES, LOD_LEVELS, ReplicaSet, skyline, well_formed
+from engine import ATTACK_TABLE
+from tetris_core import string_to_board
+from transport import (
+    INPROC_PREFIX, parse_address, stream_candidates, start_stream, tcp_listener, unix_listener, InprocListener,
+    inproc_connect,
+)
+
 ATTACKS_ENABLED = True
+MAX_ATTACK = max(ATTACK_TABLE.values())     # most rows one "atk" can carry (a tetris)
+
+# Rooms above this many players run in large-room mode: every attack goes to one
+# random living opponent instead of to everyone.
+CLASSIC_ROOM = 8
+
+# Spectators get a keyframe of every board on join, then board snapshots at this
+# rate plus roster / dead / start / end. Never attacks or placement events.
+SPECTATOR_HZ = 5
+SPECTATOR_TYPES = ("join", "roster", "start", "dead", "end")
+SPECTATOR_BACKLOG = 512     # queued messages per viewer before it is resynced (see SpectatorHub)
+SPECTATOR_RESYNCS = 2       # ... and overflows in a row before it is dropped
+SPECTATOR_WRITE_WAIT_S = 0.02   # send thread: longest wait for a stuck viewer's socket
+FIRST_SPECTATOR_ID = 1001
+
+# A connecting client says {"t":"role","role":"player"|"spectator"} first;
+# older clients say nothing and are treated as players after this long.
+ROLE_WAIT_S = 0.5
+
+RX_POLL_S = 0.2     # rx thread wakes this often to notice detach()
+
+# Ingress limits. Messages are newline-terminated JSON: a line that grows past
+# MAX_FRAME_BYTES, or an inbox the host is not allowed to let grow past its
+# cap, gets the connection dropped with a reason ({"t":"kick"} to the peer).
+MAX_FRAME_BYTES = 64 * 1024
+PLAYER_INBOX_MAX = 4096     # host side: queued messages per player before it is dropped
+SPECTATOR_INBOX_MAX = 64    # spectators only ever say "role"; nobody reads the rest
+DRAIN_PER_TICK = 64         # poll_and_route handles at most this many messages per player per call
+# per-player token buckets: type -> (messages/s, burst). "ev" = replication.EVENT_TYPES,
+# "*" = anything else. About 4x what a fast bot sends; an empty bucket drops the player.
+INGRESS_LIMITS = {
+    "board": (30, 60),      # snapshot mode sends every 0.2 s
+    "ev": (240, 480),       # placement / piece / hash / garbage events
+    "atk": (60, 120),
+    "view": (20, 40),
+    "kfreq": (20, 60),
+    "hello": (2, 8),
+    "dead": (2, 8),
+    "*": (20, 40),
+}
+
+# Connector: parallel attempts over every resolved address (see Connector)
+CONNECT_STAGGER_S = 0.25    # next address starts if the earlier ones have not answered by then
+CONNECT_POLL_S = 0.05       # how often a pending connect looks at cancel()
+REJECT_WAIT_S = 1.0         # how long the host gets to say "reject" after the role message
 
 class NetPeer:
-    def __init__(self, sock: socket.socket):
+    def __init__(self, sock: socket.socket, buf: bytes = b"", inbox=()):
+        # buf / inbox: state handed over by detach() in another process (split.py)
         self.sock = sock
-        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if sock.family in (socket.AF_INET, socket.AF_INET6):
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
         self.alive = True
-        self.inbox = deque()
+        self.inbox = deque(inbox)
+        self.detached = False
+        self.reason: str | None = None      # why the connection was dropped (drop() / kick from the other end)
+        self.max_frame = MAX_FRAME_BYTES
+        self.max_inbox: int | None = None   # set by the host, see PLAYER_INBOX_MAX
+        self._buf = buf
         self._send_lock = threading.Lock()
-        threading.Thread(target=self._rx_loop, daemon=True).start()
+        self._rx = threading.Thread(target=self._rx_loop, daemon=True)
+        self._rx.start()
 
     def send(self, obj: dict):
         if not self.alive:
             return
-        data = (json.dumps(obj, separators=(",", ":")) + "\n").encode("utf-8")
+        self.send_raw(encode(obj))
+
+    def send_raw(self, data: bytes):
+        if not self.alive:
+            return
         with self._send_lock:
             try:
                 self.sock.sendall(data)
             except Exception:
                 self.alive = False
 
+    def send_some(self, data: bytes) -> int:
+        """Write what a non-blocking socket takes right now (SpectatorHub); bytes written, 0 when full."""
+        if not self.alive:
+            return 0
+        with self._send_lock:
+            try:
+                return self.sock.send(data)
+            except (BlockingIOError, InterruptedError):
+                return 0
+            except OSError:
+                self.alive = False
+                return 0
+
     def _rx_loop(self):
-        buf = b""
+        buf = self._buf
         try:
-            while self.alive:
+            while self.alive and not self.detached:
+                if not select.select([self.sock], [], [], RX_POLL_S)[0]:
+                    continue
                 chunk = self.sock.recv(4096)
                 if not chunk:
                     self.alive = False
                     break
                 buf += chunk
+                too_big = False
                 while b"\n" in buf:
                     line, buf = buf.split(b"\n", 1)
+                    if len(line) > self.max_frame:
+                        too_big = True
+                        break
                     line = line.strip()
                     if not line:
                         continue
                     try:
-                        self.inbox.append(json.loads(line.decode("utf-8")))
+                        msg = json.loads(line.decode("utf-8"))
                     except Exception:
-                        pass
+                        continue
+                    if not isinstance(msg, dict):
+                        continue
+                    if msg.get("t") == "kick":
+                        self.reason = str(msg.get("reason", "kicked"))
+                    self.inbox.append(msg)
+                if too_big or len(buf) > self.max_frame:
+                    self.drop("frame_too_large")
+                    break
+                if self.max_inbox is not None and len(self.inbox) > self.max_inbox:
+                    self.drop("backlog")
+                    break
         except Exception:
             self.alive = False
+        self._buf = buf
+
+    def detach(self) -> tuple[socket.socket, bytes, list]:
+        """
+        Stop reading and give up the connection: returns (socket, unparsed bytes,
+        unread messages) for NetPeer(sock, buf, inbox) elsewhere. Afterwards this
+        object is inert and close() leaves the socket alone.
+        """
+        self.detached = True
+        self._rx.join()
+        with self._send_lock:
+            self.alive = False
+        inbox = list(self.inbox)
+        self.inbox.clear()
+        return self.sock, self._buf, inbox
+
+    def drop(self, reason: str):
+        """Disconnect on purpose: tell the other end why (best effort, never blocks) and close."""
+        if self.reason is None:
+            self.reason = reason
+        if self.alive and self._send_lock.acquire(blocking=False):
+            try:
+                self.sock.setblocking(False)
+                self.sock.send(encode({"t": "kick", "reason": reason}))
+            except Exception:
+                pass
+            finally:
+                self._send_lock.release()
+        self.close()    # the inbox is left to its reader (poll_and_route clears it on peer.reason)
 
     def close(self):
+        if self.detached:
+            return
         self.alive = False
         try:
             self.sock.shutdown(socket.SHUT_RDWR)
@@ -58,6 +187,134 @@ class NetPeer:
             pass
 
 
+def encode(obj: dict) -> bytes:
+    return (json.dumps(obj, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class _Viewer:
+    __slots__ = ("peer", "q", "pending", "overflows")
+
+    def __init__(self, peer):
+        self.peer = peer
+        self.q: deque = deque()     # (resendable, bytes)
+        self.pending = b""          # part of a message the socket has not taken yet
+        self.overflows = 0          # backlog overflows since the queue last ran empty
+
+
+class SpectatorHub:
+    """
+    Separate fan-out for spectators. Messages are encoded once and queued per
+    viewer; a background thread writes whatever each socket takes without
+    blocking, so a slow viewer never delays the others, the host loop or
+    player traffic.
+
+    A viewer whose queue reaches SPECTATOR_BACKLOG loses its board / alive
+    snapshots (the next keyframe replaces them) and is marked unsynced, so the
+    host sends it a fresh keyframe; control messages (SPECTATOR_TYPES) are
+    kept. One that overflows SPECTATOR_RESYNCS times without catching up is
+    dropped.
+    """
+
+    def __init__(self):
+        self.viewers: dict[int, _Viewer] = {}
+        self.unsynced: set[int] = set()      # joined / overflowed, waiting for a full keyframe
+        self.next_id = FIRST_SPECTATOR_ID
+        self.running = True
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._send_loop, daemon=True).start()
+
+    def __len__(self):
+        return len(self.viewers)
+
+    def add(self, peer) -> int:
+        if isinstance(peer, NetPeer):
+            peer.sock.setblocking(False)     # written with send_some() only
+        with self._lock:
+            sid = self.next_id
+            self.next_id += 1
+            self.viewers[sid] = _Viewer(peer)
+            self.unsynced.add(sid)
+        return sid
+
+    def take_unsynced(self) -> list[int]:
+        with self._lock:
+            out = list(self.unsynced)
+            self.unsynced.clear()
+        return out
+
+    def send(self, sid: int | None, msg: dict):
+        item = (msg.get("t") not in SPECTATOR_TYPES, encode(msg))
+        with self._lock:
+            if sid is None:
+                for vsid, v in self.viewers.items():
+                    self._push(vsid, v, item)
+            elif sid in self.viewers:
+                self._push(sid, self.viewers[sid], item)
+        self._wake.set()
+
+    def broadcast(self, msg: dict):
+        if self.viewers:
+            self.send(None, msg)
+
+    def _push(self, sid: int, v: _Viewer, item: tuple):
+        # under self._lock
+        if len(v.q) < SPECTATOR_BACKLOG:
+            v.q.append(item)
+            return
+        v.overflows += 1
+        v.q = deque(it for it in v.q if not it[0])
+        if v.overflows >= SPECTATOR_RESYNCS or len(v.q) >= SPECTATOR_BACKLOG:
+            v.peer.drop("backlog")
+            return
+        self.unsynced.add(sid)      # snapshots went, a keyframe replaces them
+        if not item[0]:
+            v.q.append(item)
+
+    def _flush(self, v: _Viewer):
+        while True:
+            if not v.pending:
+                with self._lock:
+                    if not v.q:
+                        v.overflows = 0
+                        return
+                    v.pending = v.q.popleft()[1]
+            n = v.peer.send_some(v.pending)
+            if n <= 0:
+                return
+            v.pending = v.pending[n:]
+
+    def _send_loop(self):
+        while self.running:
+            with self._lock:
+                busy = [v for v in self.viewers.values() if v.pending or v.q]
+            if not busy:
+                self._wake.wait(0.5)
+                self._wake.clear()
+            else:
+                # wait until some socket can take more (or new messages arrive)
+                socks = [v.peer.sock for v in busy if isinstance(v.peer, NetPeer) and v.peer.alive]
+                if socks and len(socks) == len(busy):
+                    try:
+                        select.select([], socks, [], SPECTATOR_WRITE_WAIT_S)
+                    except (OSError, ValueError):
+                        pass
+                for v in busy:
+                    self._flush(v)
+            with self._lock:
+                for sid in [s for s, v in self.viewers.items() if not v.peer.alive]:
+                    del self.viewers[sid]
+                    self.unsynced.discard(sid)
+
+    def stop(self):
+        self.running = False
+        self._wake.set()
+        with self._lock:
+            for v in self.viewers.values():
+                v.peer.close()
+            self.viewers.clear()
+
+
 def get_local_ip() -> str:
     ip = "127.0.0.1"
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -77,28 +334,155 @@ def get_local_ip() -> str:
     return ip
 
 
-def join_connect(ip: str, port: int, timeout_s: float = 3.0) -> NetPeer:
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    s.settimeout(timeout_s)
-    s.connect((ip, port))
-    s.settimeout(None)
-    peer = NetPeer(s)
-
-    # late-join reject check
-    t0 = time.time()
-    while time.time() - t0 < 1.0:
-        if peer.inbox:
-            msg = peer.inbox.popleft()
-            if msg.get("t") == "reject":
-                reason = msg.get("reason", "unknown")
+class Connector:
+    """
+    join_connect on a background thread, so the window keeps drawing. Every
+    address the host resolves to is tried: a new attempt starts each
+    CONNECT_STAGGER_S while earlier ones are still pending and the first one
+    up wins. Poll done / status / attempts; cancel() any time. When done,
+    exactly one of peer / error is set.
+    """
+
+    def __init__(self, ip: str, port: int, timeout_s: float = 3.0, role: str = "player"):
+        self.ip = ip
+        self.port = port
+        self.timeout_s = timeout_s
+        self.role = role
+        self.status = "starting"
+        self.attempts: list[str] = []       # addresses tried so far (progress screen)
+        self.started = time.monotonic()
+        self.peer = None
+        self.error: str | None = None
+        self.done = False
+        self.cancelled = False
+        self._lock = threading.Lock()
+        self._th = threading.Thread(target=self._run, daemon=True)
+        self._th.start()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            if self.peer is not None:     # finished just before the cancel
+                self.peer.close()
+                self.peer = None
+                self.error = "cancelled"
+
+    def wait(self):
+        """Block until done; the peer, or ConnectionError."""
+        self._th.join()
+        if self.peer is None:
+            raise ConnectionError(self.error)
+        return self.peer
+
+    def _run(self):
+        peer, err = None, None
+        try:
+            peer = self._open()
+            self._handshake(peer)
+        except Exception as e:
+            err = str(e) or type(e).__name__
+            if peer is not None:
                 peer.close()
-                raise ConnectionError(f"Rejected by host: {reason}")
-            else:
-                peer.inbox.appendleft(msg)
+                peer = None
+        with self._lock:
+            if self.cancelled:
+                if peer is not None:
+                    peer.close()
+                peer, err = None, "cancelled"
+            self.peer, self.error = peer, err
+            self.done = True
+
+    def _open(self):
+        kind, target = parse_address(self.ip, self.port)
+        if kind == "inproc":
+            return inproc_connect(target)
+        self.status = "resolving"
+        cands = stream_candidates(kind, target)
+        if not cands:
+            raise ConnectionError("no address")
+        return NetPeer(self._race(cands))
+
+    def _race(self, cands: list) -> socket.socket:
+        deadline = self.started + self.timeout_s
+        pending: dict[socket.socket, str] = {}
+        errors = []
+        next_start = 0.0
+        try:
+            while not self.cancelled:
+                now = time.monotonic()
+                if now >= deadline:
+                    raise TimeoutError("timed out")
+                if cands and (now >= next_start or not pending):
+                    family, addr = cands.pop(0)
+                    if isinstance(addr, str):
+                        label = addr
+                    else:
+                        label = f"[{addr[0]}]:{addr[1]}" if family == socket.AF_INET6 else f"{addr[0]}:{addr[1]}"
+                    self.attempts.append(label)
+                    self.status = f"connecting to {label}"
+                    next_start = now + CONNECT_STAGGER_S
+                    try:
+                        pending[start_stream(family, addr)] = label
+                    except OSError as e:
+                        errors.append(f"{label}: {e.strerror or e}")
+                    continue
+                if not pending:
+                    raise ConnectionError(errors[-1] if errors else "unreachable")
+                wait = min(CONNECT_POLL_S, deadline - now)
+                if cands:
+                    wait = min(wait, max(0.0, next_start - now))
+                socks = list(pending)
+                _r, w, x = select.select([], socks, socks, wait)
+                for s in set(w) | set(x):
+                    label = pending.pop(s)
+                    err = s.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if err == 0:
+                        s.setblocking(True)
+                        return s
+                    s.close()
+                    errors.append(f"{label}: {os.strerror(err)}")
+            raise ConnectionError("cancelled")
+        finally:
+            for s in pending:
+                s.close()
+
+    def _handshake(self, peer):
+        peer.send({"t": "role", "role": self.role})
+        self.status = "waiting for host"
+        # late-join reject check: the host's first message is either a reject or the lobby
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < REJECT_WAIT_S and not self.cancelled:
+            if peer.inbox:
+                msg = peer.inbox[0]
+                if msg.get("t") == "reject":
+                    raise ConnectionError(f"Rejected by host: {msg.get('reason', 'unknown')}")
                 break
-        time.sleep(0.01)
+            if not peer.alive:
+                raise ConnectionError("closed by host")
+            time.sleep(0.01)
+
+
+def join_connect(ip: str, port: int, timeout_s: float = 3.0, role: str = "player"):
+    """ip may also be "unix:/path" or "inproc:name" (see transport.py); port is then ignored. Blocking, see Connector."""
+    return Connector(ip, port, timeout_s, role).wait()
+
 
-    return peer
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "t")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.t = now
+
+    def take(self, now: float) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.t) * self.rate)
+        self.t = now
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
 
 
 class HostServer:
@@ -107,11 +491,8 @@ class HostServer:
         self.port = port
         self.max_clients = max_clients
 
-        self._srv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._srv.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self._srv.bind((bind_ip, port))
-        self._srv.listen(8)
-        self._srv.settimeout(0.5)
+        # one accept thread per listener; TCP always, unix / inproc on request
+        self._listeners = [tcp_listener(bind_ip, port, NetPeer)]
 
         self.running = True
         self._lock = threading.Lock()
@@ -130,19 +511,204 @@ class HostServer:
 
         self.initial_player_count = 1
 
-        threading.Thread(target=self._accept_loop, daemon=True).start()
+        # "all": attacks hit every other player, "random": one random living opponent
+        self.attack_mode = "all" if max_clients + 1 <= CLASSIC_ROOM else "random"
+        self._host_alive = True
+
+        # Board/event fan-out follows subscriptions: a client sends {"t":"view","ids":[...]}
+        # for the boards on its current page and only gets traffic for those. Clients that
+        # never sent a view get everything (all_viewers).
+        self.views: dict[int, set[int]] = {}          # peer -> ids it watches
+        self.watchers: dict[int, set[int]] = {}       # id -> peers watching it
+        self.all_viewers: set[int] = set()
+        # ... at a level of detail: watchers listed here get "sky" / "sum" updates
+        # instead of the event stream (see replication.LOD_LEVELS)
+        self.lods: dict[int, dict[int, str]] = {}     # id -> {peer: level}, not "full"
+        self._lod_sent: dict[int, object] = {}        # id -> (board object / string, alive) last sent
+
+        self.spectators = SpectatorHub()
+        self.spectator_hz = SPECTATOR_HZ
+        self._spec_t = 0.0
+        self._spec_sent: dict[int, object] = {}       # id -> board object / string last sent
+
+        # opponent boards rebuilt from placement events / keyframes (main thread only)
+        self.replication = REPLICATION_MODE
+        self.replicas = ReplicaSet()
+        self.host_keyframe_wanted = False
+
+        # match log hook (matchlog.recorder()): record(ev, pid=..., **fields)
+        self.record = None
+
+        # ingress limits (see INGRESS_LIMITS); None = no rate limits (trusted harnesses)
+        self.ingress_limits: dict | None = dict(INGRESS_LIMITS)
+        self._buckets: dict[int, dict[str, TokenBucket]] = {}
+        self.dropped: dict[int, str] = {}             # pid -> reason it was disconnected
+        self._rr = 0                                  # poll_and_route: which player drains first
+
+        threading.Thread(target=self._accept_loop, args=(self._listeners[0],), daemon=True).start()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+        threading.Thread(target=self._accept_loop, args=(listener,), daemon=True).start()
+        return listener
+
+    def listen_unix(self, path: str):
+        return self.add_listener(unix_listener(path, NetPeer))
+
+    def listen_inproc(self, name: str):
+        return self.add_listener(InprocListener(name))
+
+    def inproc_address(self) -> str:
+        """In-process address of this room (opened on first use), e.g. for bot.spawn_bot."""
+        for lst in self._listeners:
+            if isinstance(lst, InprocListener):
+                return INPROC_PREFIX + lst.name
+        return INPROC_PREFIX + self.listen_inproc(f"host-{self.port}-{id(self)}").name
 
     def stop(self):
         self.running = False
-        try:
-            self._srv.close()
-        except Exception:
-            pass
+        for lst in self._listeners:
+            lst.close()
+        self.spectators.stop()
         with self._lock:
             for p in list(self.peers.values()):
                 p.close()
             self.peers.clear()
 
+    def set_room_size(self, players: int):
+        self.max_clients = players - 1
+        self.attack_mode = "all" if players <= CLASSIC_ROOM else "random"
+
+    def _route(self, src: int, msg: dict):
+        """Board traffic of player src -> only the peers that watch src."""
+        with self._lock:
+            reduced = self.lods.get(src, {})
+            targets = [self.peers.get(p) for p in self.all_viewers | self.watchers.get(src, set())
+                       if p != src and p not in reduced]
+        for peer in targets:
+            if peer is not None and peer.alive:
+                peer.send(msg)
+
+    def _set_view(self, pid: int, ids, lod=None):
+        new = set()
+        for x in ids if isinstance(ids, list) else []:
+            if isinstance(x, int) and x != pid:
+                new.add(x)
+        levels = {}
+        for k, v in (lod.items() if isinstance(lod, dict) else ()):
+            try:
+                x = int(k)
+            except (TypeError, ValueError):
+                continue
+            if x in new and v in LOD_LEVELS and v != "full":
+                levels[x] = v
+        with self._lock:
+            old = self.views.get(pid)
+            old_full = (old or set()) - {x for x, lv in self.lods.items() if pid in lv}
+            self.all_viewers.discard(pid)
+            self.views[pid] = new
+            for x in (old or set()) - new:
+                self.watchers.get(x, set()).discard(pid)
+            for x in new:
+                self.watchers.setdefault(x, set()).add(pid)
+            for x, lv in self.lods.items():
+                if x not in levels:
+                    lv.pop(pid, None)
+            for x, v in levels.items():
+                lv = self.lods.setdefault(x, {})
+                if lv.get(pid) != v:
+                    lv[pid] = v
+                    self._lod_sent.pop(x, None)    # _serve_lods sends the current state this poll
+            peer = self.peers.get(pid)
+        if peer is None:
+            return
+
+        added = (new - set(levels)) - (old_full if old is not None else set())
+        if not added:
+            return
+
+        # newly watched boards start from the host's replica right away
+        for x in sorted(added):
+            if x == 1:
+                self.host_keyframe_wanted = True
+                continue
+            if x in self.replicas.boards and x not in self.replicas._resync:
+                kf = {"t": "board", "id": x, "s": self.replicas.string_of(x), "alive": self.last_alive.get(x, True)}
+                if self.replicas.seq.get(x) is not None:
+                    kf["n"] = self.replicas.seq[x]
+                peer.send(kf)
+            else:
+                with self._lock:
+                    owner = self.peers.get(x)
+                if owner is not None and owner.alive:
+                    owner.send({"t": "kfreq", "id": x})
+
+    def _lod_msg(self, pid: int, level: str, board, alive: bool) -> dict:
+        h = skyline(board)
+        if level == "sum":
+            return {"t": "sum", "id": pid, "h": max(h), "alive": alive}
+        return {"t": "sky", "id": pid, "h": h, "alive": alive}
+
+    def _serve_lods(self, host_board_s: str, host_alive: bool):
+        with self._lock:
+            subs = {x: dict(lv) for x, lv in self.lods.items() if lv}
+            peers = dict(self.peers)
+        for x, lv in subs.items():
+            if x == 1:
+                state = (host_board_s, host_alive)
+                if self._lod_sent.get(x) == state:
+                    continue
+                board = string_to_board(host_board_s) if host_board_s else None
+                alive = host_alive
+            else:
+                board = self.replicas.boards.get(x)
+                alive = bool(self.last_alive.get(x, True))
+                last = self._lod_sent.get(x)
+                # replica boards are replaced on change: identity is enough
+                if last is not None and last[0] is board and last[1] == alive:
+                    continue
+                state = (board, alive)
+            if board is None:
+                continue
+            self._lod_sent[x] = state
+            # one payload per level, shared by every watcher at that level
+            msgs = {}
+            for p, level in lv.items():
+                if level not in msgs:
+                    msgs[level] = self._lod_msg(x, level, board, alive)
+                peer = peers.get(p)
+                if peer is not None and peer.alive:
+                    peer.send(msgs[level])
+
+    def _attack(self, src: int, n: int) -> int:
+        """Deliver n garbage rows from src; returns the rows meant for the host."""
+        if self.attack_mode == "all":
+            self._broadcast({"t": "atk", "n": n}, exclude=src)
+            if self.record is not None:
+                self.record("atk", pid=src, n=n, to="all")
+            return n if src != 1 else 0
+
+        with self._lock:
+            alive = [p for p, peer in self.peers.items()
+                     if p != src and peer.alive and self.last_alive.get(p, True)]
+        if src != 1 and self._host_alive:
+            alive.append(1)
+        if not alive:
+            return 0
+        target = random.choice(alive)
+        if self.record is not None:
+            self.record("atk", pid=src, n=n, to=[target])
+        if target == 1:
+            return n
+        with self._lock:
+            tp = self.peers.get(target)
+        if tp is not None:
+            tp.send({"t": "atk", "n": n})
+        return 0
+
+    def send_host_attack(self, n: int) -> int:
+        return self._attack(1, n)
+
     def _broadcast(self, msg: dict, exclude: int | None = None):
         with self._lock:
             items = list(self.peers.items())
@@ -151,71 +717,188 @@ class HostServer:
                 continue
             if peer.alive:
                 peer.send(msg)
+        if msg.get("t") in SPECTATOR_TYPES:
+            self.spectators.broadcast(msg)
 
-    def _accept_loop(self):
+    def _accept_loop(self, listener):
         while self.running:
             try:
-                conn, _addr = self._srv.accept()
-            except socket.timeout:
-                continue
+                peer = listener.accept()
             except Exception:
                 break
-
-            if self.started_at is not None:
-                try:
-                    conn.sendall(b'{"t":"reject","reason":"game_started"}\n')
-                except Exception:
-                    pass
-                try:
-                    conn.close()
-                except Exception:
-                    pass
+            if peer is None:
                 continue
+            # the role handshake may wait; never hold up the next accept()
+            threading.Thread(target=self._admit, args=(peer,), daemon=True).start()
+
+    def _admit(self, peer):
+        role = "player"
+        t0 = time.time()
+        while time.time() - t0 < ROLE_WAIT_S and peer.alive:
+            if peer.inbox:
+                if peer.inbox[0].get("t") == "role":
+                    role = str(peer.inbox.popleft().get("role", "player"))
+                break
+            time.sleep(0.01)
 
+        if role == "spectator":
+            peer.max_inbox = SPECTATOR_INBOX_MAX
+            sid = self.spectators.add(peer)
             with self._lock:
-                if len(self.peers) >= self.max_clients:
-                    try:
-                        conn.sendall(b'{"t":"reject","reason":"room_full"}\n')
-                    except Exception:
-                        pass
-                    try:
-                        conn.close()
-                    except Exception:
-                        pass
-                    continue
+                roster = {str(k): v for k, v in self.names.items()}
+            self.spectators.send(sid, {"t": "welcome", "id": sid, "roster": roster, "spectator": True})
+            if self.started_at is not None:
+                self.spectators.send(sid, {"t": "start", "at": self.started_at})
+            return
+
+        if self.started_at is not None:
+            peer.send({"t": "reject", "reason": "game_started"})
+            peer.close()
+            return
+
+        with self._lock:
+            if len(self.peers) >= self.max_clients:
+                peer.send({"t": "reject", "reason": "room_full"})
+                peer.close()
+                return
+
+            pid = self.next_id
+            self.next_id += 1
+            peer.max_inbox = PLAYER_INBOX_MAX
+            self.peers[pid] = peer
+            self.names[pid] = f"Player{pid}"
+            self.last_alive[pid] = True
+            self.all_viewers.add(pid)
 
-                pid = self.next_id
-                self.next_id += 1
-                peer = NetPeer(conn)
-                self.peers[pid] = peer
-                self.names[pid] = f"Player{pid}"
-                self.last_alive[pid] = True
+        roster = {str(k): v for k, v in self.names.items()}
+        peer.send({"t": "welcome", "id": pid, "roster": roster})
+        self._broadcast({"t": "join", "id": pid, "name": self.names[pid]}, exclude=None)
 
+    def send_host_event(self, msg: dict):
+        msg["id"] = 1
+        self._route(1, msg)
+
+    def reset_match(self):
+        """
+        Back to lobby state over the same connections: drop peers that left,
+        clear per-match state and discard leftover match traffic.
+        """
+        with self._lock:
+            for pid in [p for p, peer in self.peers.items() if not peer.alive]:
+                del self.peers[pid]
+                self.names.pop(pid, None)
+                self.all_viewers.discard(pid)
+                for x in self.views.pop(pid, None) or ():
+                    self.watchers.get(x, set()).discard(pid)
+                self.watchers.pop(pid, None)
+                for lv in self.lods.values():
+                    lv.pop(pid, None)
+                self.lods.pop(pid, None)
+                self._buckets.pop(pid, None)
+                self.dropped.pop(pid, None)
+            for peer in self.peers.values():
+                # a late joiner's hello is the only thing worth keeping
+                for _ in range(len(peer.inbox)):
+                    m = peer.inbox.popleft()
+                    if m.get("t") == "hello":
+                        peer.inbox.append(m)
+            self.last_alive = {pid: True for pid in self.peers}
             roster = {str(k): v for k, v in self.names.items()}
-            peer.send({"t": "welcome", "id": pid, "roster": roster})
-            self._broadcast({"t": "join", "id": pid, "name": self.names[pid]}, exclude=None)
+
+        self.started_at = None
+        self.last_board.clear()
+        self.end_sent = False
+        self.death_order = []
+        self.dead_seen = set()
+        self.last_end_msg = None
+        self.replicas = ReplicaSet()
+        self.host_keyframe_wanted = False
+        self._spec_sent = {}
+        self._lod_sent = {}
+        self.initial_player_count = len(self.names)
+        self._broadcast({"t": "roster", "roster": roster}, exclude=None)
+
+    def rematch(self, start_delay_s: float) -> float:
+        self.reset_match()
+        at = time.time() + start_delay_s
+        self.schedule_start(at)
+        return at
 
     def schedule_start(self, at: float):
         self.started_at = at
         self._broadcast({"t": "start", "at": at}, exclude=None)
 
+    def _rate_ok(self, pid: int, t, now: float) -> bool:
+        limits = self.ingress_limits
+        if limits is None:
+            return True
+        if not isinstance(t, str):
+            return False
+        key = "ev" if t in EVENT_TYPES else t if t in limits else "*"
+        buckets = self._buckets.setdefault(pid, {})
+        b = buckets.get(key)
+        if b is None:
+            rate, burst = limits[key]
+            b = buckets[key] = TokenBucket(rate, burst, now)
+        return b.take(now)
+
+    def _note_dropped(self, pid: int, reason: str):
+        self.dropped[pid] = reason
+        if self.record is not None:
+            self.record("kick", pid=pid, reason=reason)
+
+    def kick(self, pid: int, reason: str):
+        """Disconnect player pid with a reason; the match then counts it as topped out."""
+        with self._lock:
+            peer = self.peers.get(pid)
+        if peer is None:
+            return
+        peer.drop(reason)
+        if pid not in self.dropped:
+            self._note_dropped(pid, reason)
+
     def poll_and_route(self, host_name: str, host_board_s: str, host_alive: bool) -> int:
         atk_to_host = 0
         self.names[1] = host_name
+        self._host_alive = host_alive
 
-        # broadcast host board to everyone
-        self._broadcast({"t": "board", "id": 1, "s": host_board_s, "alive": host_alive}, exclude=None)
+        # host board to its watchers (events mode: host sends its own placement events)
+        if self.replication == "snapshot":
+            self._route(1, {"t": "board", "id": 1, "s": host_board_s, "alive": host_alive})
 
         with self._lock:
             items = list(self.peers.items())
+        # a different player drains first every call; each gets at most DRAIN_PER_TICK
+        # messages, the rest waits, so one flooding seat cannot starve the others
+        if items:
+            k = self._rr % len(items)
+            items = items[k:] + items[:k]
+            self._rr += 1
+        now = time.monotonic()
 
         for pid, peer in items:
-            if not peer.alive:
-                continue
+            if not peer.alive and peer.reason is not None:
+                if pid not in self.dropped:
+                    self._note_dropped(pid, peer.reason)      # rx thread dropped it (frame / backlog)
+                peer.inbox.clear()
+            if not peer.alive and not peer.inbox:
+                if not self.last_alive.get(pid):
+                    continue
+                # left mid-match: counts as topped out so the match can still end
+                peer.inbox.append({"t": "dead"})
 
-            while peer.inbox:
+            budget = DRAIN_PER_TICK
+            while peer.inbox and budget > 0:
+                budget -= 1
                 msg = peer.inbox.popleft()
                 t = msg.get("t")
+                if peer.alive and not self._rate_ok(pid, t, now):
+                    self.kick(pid, f"flood:{t}" if isinstance(t, str) else "bad_message")
+                    break
+                if (t == "board" or t in EVENT_TYPES) and not well_formed(msg):
+                    # routed to every watcher and parsed by each replica: one bad field drops the seat
+                    self.kick(pid, "bad_message")
+                    break
 
                 if t == "hello":
                     nm = str(msg.get("name", f"Player{pid}"))[:16]
@@ -228,22 +911,57 @@ class HostServer:
                     alive = bool(msg.get("alive", True))
                     self.last_board[pid] = s
                     self.last_alive[pid] = alive
+                    self.replicas.apply(pid, msg)
                     if alive is False and pid not in self.dead_seen:
                         self.dead_seen.add(pid)
                         self.death_order.append(pid)
-                    self._broadcast({"t": "board", "id": pid, "s": s, "alive": alive}, exclude=pid)
+                    fwd = {"t": "board", "id": pid, "s": s, "alive": alive}
+                    if "n" in msg:
+                        fwd["n"] = msg["n"]
+                    self._route(pid, fwd)
+
+                elif t in EVENT_TYPES:
+                    msg["id"] = pid
+                    if self.replicas.apply(pid, msg):
+                        peer.send({"t": "kfreq", "id": pid})
+                    self._route(pid, msg)
+
+                elif t == "view":
+                    self._set_view(pid, msg.get("ids"), msg.get("lod"))
+
+                elif t == "kfreq":
+                    try:
+                        target = int(msg.get("id", 0))
+                    except (TypeError, ValueError):
+                        continue
+                    if target == 1:
+                        self.host_keyframe_wanted = True
+                    else:
+                        with self._lock:
+                            tp = self.peers.get(target)
+                        if tp is not None and tp.alive:
+                            tp.send({"t": "kfreq", "id": target})
 
                 elif t == "atk" and ATTACKS_ENABLED:
-                    n = int(msg.get("n", 0))
+                    try:
+                        n = int(msg.get("n", 0))
+                    except (TypeError, ValueError):
+                        n = -1
+                    if not 0 <= n <= MAX_ATTACK:
+                        # one message, so no bucket catches it; a huge n would stall every board
+                        self.kick(pid, "bad_message")
+                        break
                     if n > 0:
-                        atk_to_host += n
-                        self._broadcast({"t": "atk", "n": n}, exclude=pid)
+                        atk_to_host += self._attack(pid, n)
 
                 elif t == "dead":
                     self.last_alive[pid] = False
+                    self.replicas.drop_piece(pid)
                     if pid not in self.dead_seen:
                         self.dead_seen.add(pid)
                         self.death_order.append(pid)
+                        if self.record is not None:
+                            self.record("dead", pid=pid)
                     self._broadcast({"t": "dead", "id": pid}, exclude=pid)
 
         # game over check (host decides)
@@ -280,6 +998,44 @@ class HostServer:
                 end_msg = {"t": "end", "winner": winner, "ranking": ranking, "roster": roster}
                 self.last_end_msg = end_msg
                 self.end_sent = True
+                if self.record is not None:
+                    self.record("end", winner=winner, ranking=ranking, roster=roster)
                 self._broadcast(end_msg, exclude=None)
 
-        return atk_to_host
\ No newline at end of file
+        if self.lods:
+            self._serve_lods(host_board_s, host_alive)
+        if len(self.spectators):
+            self._serve_spectators(host_board_s, host_alive)
+
+        return atk_to_host
+
+    def _serve_spectators(self, host_board_s: str, host_alive: bool):
+        hub = self.spectators
+        with self._lock:
+            alive = {pid: bool(a) for pid, a in self.last_alive.items()}
+        alive[1] = host_alive
+
+        def board_msg(pid):
+            if pid == 1:
+                return {"t": "board", "id": 1, "s": host_board_s, "alive": host_alive}
+            return {"t": "board", "id": pid, "s": self.replicas.string_of(pid), "alive": alive.get(pid, True)}
+
+        # late joiners: alive map + a keyframe of every board right away
+        for sid in hub.take_unsynced():
+            hub.send(sid, {"t": "alive", "m": {str(k): v for k, v in alive.items()}})
+            for pid in [1, *self.replicas.boards]:
+                hub.send(sid, board_msg(pid))
+
+        now = time.monotonic()
+        if now - self._spec_t < 1.0 / max(1, self.spectator_hz):
+            return
+        self._spec_t = now
+        # replica boards are replaced on change, so identity tells what moved;
+        # the host board arrives as a fresh string every frame, compare that one
+        current = {1: host_board_s, **self.replicas.boards}
+        for pid, b in current.items():
+            last = self._spec_sent.get(pid)
+            if last is b or (pid == 1 and last == b):
+                continue
+            self._spec_sent[pid] = b
+            hub.broadcast(board_msg(pid))
\ No newline at end of file
@@ -0,0 +1,292 @@
+import cProfile
+import csv
+import gc
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from collections import deque
+
+import pygame
+
+# Per-frame phases of common_game_loop, in the order they run.
+PHASES = ("poll_net", "events", "sim", "ghost", "opponents", "own_board", "hud", "profiler", "flip")
+
+HISTORY = 240           # frames kept for the rolling graph
+EMA_ALPHA = 0.1         # smoothing for the per-phase averages
+CAPTURE_DIR = "profiles"
+ALLOC_TOP = 30          # source lines listed in the .alloc.txt report
+
+STARTUP_LOG = os.path.join(CAPTURE_DIR, "startup.csv")
+
+# TETRIS_PROFILE=csv       -> capture phase timings to CSV from the first frame
+# TETRIS_PROFILE=cprofile  -> CSV + cProfile dump (.prof) and pstats summary (.txt)
+# TETRIS_PROFILE=alloc     -> CSV + tracemalloc: KiB allocated per phase, biggest
+#                             allocating lines at the end (.alloc.txt). Slows the game down.
+PROFILE_ENV = "TETRIS_PROFILE"
+
+
+class FrameProfiler:
+    """
+    Times the phases of one game loop frame with lap() calls.
+    F3 overlay / F4 capture are wired in game.py.
+    Always counts memory blocks per phase (sys.getallocatedblocks, net change)
+    and garbage collector pauses (gc.callbacks).
+    """
+
+    def __init__(self, tag: str, capture: str | None = None):
+        self.tag = "".join(ch for ch in tag if ch.isalnum() or ch in "-_") or "match"
+        self.show_overlay = False
+
+        self.frame_no = 0
+        self.history = deque(maxlen=HISTORY)
+        self.avg = {p: 0.0 for p in PHASES}
+        self.worst_ms = 0.0
+        self.blocks_avg = {p: 0.0 for p in PHASES}
+        self.kib_avg = {p: 0.0 for p in PHASES}
+        self.frame_blocks = 0           # net new blocks in the last frame
+        self.gc_counts = [0, 0, 0]      # collections per generation
+        self.gc_worst_ms = 0.0
+
+        self._cur = {p: 0.0 for p in PHASES}
+        self._cur_blocks = {p: 0 for p in PHASES}
+        self._cur_kib = {p: 0.0 for p in PHASES}
+        self._cur_gc_ms = 0.0
+        self._frame_t0 = 0.0
+        self._t = 0.0
+        self._blocks = 0
+        self._mem = 0
+        self._gc_t = 0.0
+        gc.callbacks.append(self._on_gc)
+
+        self._csv_file = None
+        self._csv = None
+        self._cprof = None
+        self._alloc = False
+        self._capture_t0 = 0.0
+
+        mode = capture if capture is not None else os.environ.get(PROFILE_ENV, "")
+        mode = mode.strip().lower()
+        if mode in ("csv", "1", "cprofile", "alloc"):
+            self.start_capture(with_cprofile=(mode == "cprofile"), with_alloc=(mode == "alloc"))
+
+    @property
+    def capturing(self) -> bool:
+        return self._csv is not None
+
+    # ---- timing ----
+    def begin_frame(self):
+        now = time.perf_counter()
+        self._frame_t0 = now
+        self._t = now
+        cur = self._cur
+        for p in cur:
+            cur[p] = 0.0
+            self._cur_blocks[p] = 0
+            self._cur_kib[p] = 0.0
+        self._cur_gc_ms = 0.0
+        self._blocks = sys.getallocatedblocks()
+        if self._alloc:
+            tracemalloc.reset_peak()
+            self._mem = tracemalloc.get_traced_memory()[0]
+
+    def lap(self, phase: str):
+        now = time.perf_counter()
+        self._cur[phase] += now - self._t
+        self._t = now
+        blocks = sys.getallocatedblocks()
+        self._cur_blocks[phase] += blocks - self._blocks
+        self._blocks = blocks
+        if self._alloc:
+            # peak above the phase's starting point ~ what the phase allocated
+            mem, peak = tracemalloc.get_traced_memory()
+            self._cur_kib[phase] += (peak - self._mem) / 1024.0
+            tracemalloc.reset_peak()
+            self._mem = mem
+
+    def _on_gc(self, phase: str, info: dict):
+        if phase == "start":
+            self._gc_t = time.perf_counter()
+            return
+        ms = (time.perf_counter() - self._gc_t) * 1000.0
+        self._cur_gc_ms += ms
+        self.gc_counts[info["generation"]] += 1
+        if ms > self.gc_worst_ms:
+            self.gc_worst_ms = ms
+
+    def end_frame(self, dt: float):
+        total_ms = (time.perf_counter() - self._frame_t0) * 1000.0
+        self.frame_no += 1
+        self.history.append(total_ms)
+        if total_ms > self.worst_ms:
+            self.worst_ms = total_ms
+
+        for p, v in self._cur.items():
+            self.avg[p] += (v * 1000.0 - self.avg[p]) * EMA_ALPHA
+            self.blocks_avg[p] += (self._cur_blocks[p] - self.blocks_avg[p]) * EMA_ALPHA
+            self.kib_avg[p] += (self._cur_kib[p] - self.kib_avg[p]) * EMA_ALPHA
+        self.frame_blocks = sum(self._cur_blocks.values())
+
+        if self._csv is not None:
+            row = [self.frame_no, f"{(self._frame_t0 - self._capture_t0) * 1000.0:.3f}", f"{dt * 1000.0:.3f}"]
+            row.extend(f"{self._cur[p] * 1000.0:.3f}" for p in PHASES)
+            row.append(f"{total_ms:.3f}")
+            row.extend((self.frame_blocks, f"{self._cur_gc_ms:.3f}"))
+            if self._alloc:
+                row.extend(f"{self._cur_kib[p]:.1f}" for p in PHASES)
+            self._csv.writerow(row)
+
+    # ---- capture ----
+    def _capture_path(self, ext: str) -> str:
+        return os.path.join(CAPTURE_DIR, f"{self._capture_stamp}_{self.tag}.{ext}")
+
+    def start_capture(self, with_cprofile: bool = False, with_alloc: bool = False):
+        if self.capturing:
+            return
+        try:
+            os.makedirs(CAPTURE_DIR, exist_ok=True)
+            self._capture_stamp = time.strftime("%Y%m%d_%H%M%S")
+            self._csv_file = open(self._capture_path("csv"), "w", newline="", encoding="utf-8")
+        except OSError:
+            self._csv_file = None
+            return
+        self._csv = csv.writer(self._csv_file)
+        head = ["frame", "t_ms", "dt_ms", *(f"{p}_ms" for p in PHASES), "total_ms", "blocks", "gc_ms"]
+        if with_alloc:
+            head.extend(f"{p}_kib" for p in PHASES)
+            tracemalloc.start()
+            self._alloc = True
+        self._csv.writerow(head)
+        self._capture_t0 = time.perf_counter()
+        if with_cprofile:
+            self._cprof = cProfile.Profile()
+            self._cprof.enable()
+
+    def stop_capture(self):
+        if self._cprof is not None:
+            self._cprof.disable()
+            try:
+                self._cprof.dump_stats(self._capture_path("prof"))
+                with open(self._capture_path("txt"), "w", encoding="utf-8") as f:
+                    st = pstats.Stats(self._cprof, stream=f)
+                    st.sort_stats("cumulative").print_stats(40)
+            except OSError:
+                pass
+            self._cprof = None
+        if self._alloc:
+            self._alloc = False
+            try:
+                top = tracemalloc.take_snapshot().statistics("lineno")[:ALLOC_TOP]
+                with open(self._capture_path("alloc.txt"), "w", encoding="utf-8") as f:
+                    f.write(f"live memory by line at the end of the capture (top {ALLOC_TOP})\n")
+                    for st in top:
+                        f.write(f"{st}\n")
+            except OSError:
+                pass
+            tracemalloc.stop()
+        if self._csv_file is not None:
+            try:
+                self._csv_file.close()
+            except OSError:
+                pass
+        self._csv_file = None
+        self._csv = None
+
+    def toggle_capture(self):
+        if self.capturing:
+            self.stop_capture()
+        else:
+            mode = os.environ.get(PROFILE_ENV, "").strip().lower()
+            self.start_capture(with_cprofile=(mode == "cprofile"), with_alloc=(mode == "alloc"))
+
+    def close(self):
+        self.stop_capture()
+        try:
+            gc.callbacks.remove(self._on_gc)
+        except ValueError:
+            pass
+
+    # ---- overlay ----
+    def draw(self, surf: pygame.Surface, font: pygame.font.Font):
+        if not self.show_overlay:
+            return
+        line_h = font.get_linesize()
+        graph_h = 60
+        box_w = max(340, HISTORY + 20)
+        box_h = line_h * (len(PHASES) + 3) + graph_h + 24
+        x0 = surf.get_width() - box_w - 20
+        y0 = 20
+
+        pygame.draw.rect(surf, (0, 0, 0), pygame.Rect(x0, y0, box_w, box_h))
+        pygame.draw.rect(surf, (70, 70, 86), pygame.Rect(x0, y0, box_w, box_h), 1)
+
+        last = self.history[-1] if self.history else 0.0
+        rec = "  REC" if self.capturing else ""
+        head = f"frame {last:5.2f}ms  worst {self.worst_ms:5.1f}{rec}"
+        surf.blit(font.render(head, True, (240, 240, 250)), (x0 + 10, y0 + 6))
+        y = y0 + 6 + line_h
+        n0, n1, n2 = self.gc_counts
+        mem = f"blocks/frame {self.frame_blocks:+d}  gc {n0}/{n1}/{n2} worst {self.gc_worst_ms:.1f}ms"
+        surf.blit(font.render(mem, True, (240, 240, 250)), (x0 + 10, y))
+        y += line_h
+        for p in PHASES:
+            txt = f"{p:<10}{self.avg[p]:7.2f} ms {self.blocks_avg[p]:+7.0f} bl"
+            if self._alloc:
+                txt += f" {self.kib_avg[p]:6.1f} KiB"
+            surf.blit(font.render(txt, True, (190, 190, 205)), (x0 + 10, y))
+            y += line_h
+
+        # rolling graph: one bar per frame, 33ms = full height, line at 16.7ms
+        gy = y + 8
+        gx = x0 + 10
+        pygame.draw.rect(surf, (18, 18, 22), pygame.Rect(gx, gy, HISTORY, graph_h))
+        for i, ms in enumerate(self.history):
+            bh = min(graph_h, int(ms / 33.3 * graph_h))
+            col = (90, 200, 90) if ms <= 16.7 else ((230, 200, 60) if ms <= 33.3 else (230, 70, 70))
+            pygame.draw.line(surf, col, (gx + i, gy + graph_h), (gx + i, gy + graph_h - bh))
+        ref_y = gy + graph_h - int(16.7 / 33.3 * graph_h)
+        pygame.draw.line(surf, (120, 120, 140), (gx, ref_y), (gx + HISTORY, ref_y))
+
+
+class StartupReport:
+    """
+    Wall time of each startup step (process start -> first menu frame on screen).
+    finish() prints one line and appends the run to profiles/startup.csv so
+    slow starts show up next to the previous ones.
+    """
+
+    def __init__(self, t0: float):
+        self.t0 = t0
+        self._last = t0
+        self.steps: list[tuple[str, float]] = []
+        self.done = False
+
+    def mark(self, step: str):
+        now = time.perf_counter()
+        self.steps.append((step, (now - self._last) * 1000.0))
+        self._last = now
+
+    def summary(self) -> str:
+        parts = "  ".join(f"{step} {ms:.0f}ms" for step, ms in self.steps)
+        return f"[startup] {parts}  total {(self._last - self.t0) * 1000.0:.0f}ms"
+
+    def finish(self, step: str):
+        if self.done:
+            return
+        self.mark(step)
+        self.done = True
+        print(self.summary())
+        try:
+            os.makedirs(CAPTURE_DIR, exist_ok=True)
+            new = not os.path.exists(STARTUP_LOG)
+            with open(STARTUP_LOG, "a", newline="", encoding="utf-8") as f:
+                w = csv.writer(f)
+                if new:
+                    w.writerow(["when", "step", "ms"])
+                when = time.strftime("%Y-%m-%d %H:%M:%S")
+                for step_name, ms in self.steps:
+                    w.writerow([when, step_name, f"{ms:.2f}"])
+                w.writerow([when, "total", f"{(self._last - self.t0) * 1000.0:.2f}"])
+        except OSError:
+            pass
@@ -0,0 +1,173 @@
+import time
+
+import pygame
+
+from tetris_core import W, H, HIDDEN, COLORS
+
+try:
+    import numpy as np
+    import pygame.surfarray
+except ImportError:  # numpy opsiyonel: yoksa draw.rect yoluna düşülür
+    np = None
+
+BOARD_BG = (18, 18, 22)
+EMPTY_CELL = (30, 30, 36)
+UNKNOWN_CELL = (200, 200, 200)
+
+TASK_COST_EMA = 0.2     # smoothing of the per-task draw cost estimate
+
+# Indexed palette for the surfarray rasterizer: 0 = background/gap, 1 = empty-cell outline,
+# then one entry per tetris_core.COLORS key, last = unknown cell value.
+IDX_BG = 0
+IDX_EMPTY = 1
+PALETTE = [BOARD_BG, EMPTY_CELL, *COLORS.values(), UNKNOWN_CELL]
+IDX_UNKNOWN = len(PALETTE) - 1
+CELL_INDEX = {None: IDX_EMPTY, **{k: i + 2 for i, k in enumerate(COLORS)}}
+
+
+def board_surface_size(csize: int) -> tuple[int, int]:
+    return W * csize + 4, H * csize + 4
+
+
+def draw_board_cells(surf: pygame.Surface, b, ox: int, oy: int, csize: int):
+    # (ox, oy) = top-left of the first visible cell; the 2px frame sits outside it
+    pygame.draw.rect(surf, BOARD_BG, pygame.Rect(ox - 2, oy - 2, W * csize + 4, H * csize + 4))
+    for yy in range(H):
+        row = b[yy + HIDDEN]
+        for xx in range(W):
+            v = row[xx]
+            if v is None:
+                pygame.draw.rect(
+                    surf, EMPTY_CELL,
+                    (ox + xx * csize, oy + yy * csize, csize - 1, csize - 1),
+                    1
+                )
+            else:
+                pygame.draw.rect(
+                    surf, COLORS.get(v, UNKNOWN_CELL),
+                    (ox + xx * csize, oy + yy * csize, csize - 1, csize - 1)
+                )
+
+
+class _GridMask:
+    """
+    Per cell size: the 2px-framed index buffer, an 8-bit palettized scratch surface
+    and the tiled gap / outline masks. Built once per csize.
+    """
+
+    def __init__(self, csize: int):
+        c = csize
+        tile = np.zeros((c, c), dtype=np.uint8)   # 0 = inner, 1 = outline, 2 = gap
+        tile[[0, c - 2], :] = 1
+        tile[:, [0, c - 2]] = 1
+        tile[c - 1, :] = 2
+        tile[:, c - 1] = 2
+        full = np.tile(tile, (W, H))              # surfarray order: [x][y]
+        self.gap = full == 2
+        self.not_outline = full != 1
+        self.frame = np.full(board_surface_size(c), IDX_BG, dtype=np.uint8)
+        self.scratch = pygame.Surface(board_surface_size(c), depth=8)
+        self.scratch.set_palette(PALETTE)
+
+
+_grid_masks: dict[int, "_GridMask"] = {}
+
+
+def board_indices(b):
+    # (W, H) uint8 palette indices of the visible rows, surfarray [x][y] order
+    get = CELL_INDEX.get
+    flat = np.fromiter(
+        (get(v, IDX_UNKNOWN) for row in b[HIDDEN:HIDDEN + H] for v in row),
+        dtype=np.uint8, count=W * H,
+    )
+    return flat.reshape(H, W).T
+
+
+def raster_board(surf: pygame.Surface, b, csize: int):
+    """
+    Same pixels as draw_board_cells(surf, b, 2, 2, csize), in a fixed number of
+    numpy / C-level operations regardless of cell size.
+    """
+    gm = _grid_masks.get(csize)
+    if gm is None:
+        gm = _grid_masks[csize] = _GridMask(csize)
+    c = csize
+
+    big = np.repeat(np.repeat(board_indices(b), c, axis=0), c, axis=1)   # integer nearest-neighbour
+    big[(big == IDX_EMPTY) & gm.not_outline] = IDX_BG                     # empty cell: outline only
+    big[gm.gap] = IDX_BG                                                  # 1px gridline
+    gm.frame[2:-2, 2:-2] = big
+
+    pygame.surfarray.blit_array(gm.scratch, gm.frame)
+    surf.blit(gm.scratch, (0, 0))
+
+
+class BoardSurfaceCache:
+    """
+    One pre-rendered surface per board key (player id).
+    A board is redrawn only when its object, version or cell size changes;
+    receivers replace the board object on every content change, the local
+    board bumps its version instead.
+    """
+
+    def __init__(self):
+        self._entries: dict = {}
+
+    def get(self, key, b, csize: int, version=None) -> pygame.Surface:
+        ent = self._entries.get(key)
+        if ent is not None and ent[0] is b and ent[1] == version and ent[2] == csize:
+            return ent[3]
+
+        surf = ent[3] if ent is not None and ent[2] == csize else pygame.Surface(board_surface_size(csize))
+        if np is not None:
+            raster_board(surf, b, csize)
+        else:
+            draw_board_cells(surf, b, 2, 2, csize)
+        self._entries[key] = (b, version, csize, surf)
+        return surf
+
+    def blit(self, dst: pygame.Surface, key, b, ox: int, oy: int, csize: int, version=None):
+        dst.blit(self.get(key, b, csize, version), (ox - 2, oy - 2))
+
+    def prune(self, keep):
+        for key in [k for k in self._entries if k not in keep]:
+            del self._entries[key]
+
+    def clear(self):
+        self._entries.clear()
+
+
+class DrawScheduler:
+    """
+    Round-robin over deferrable draw tasks (key, fn, args) that paint onto a
+    retained surface. run() starts where the last frame stopped and calls tasks
+    while their estimated cost still fits before the deadline; the ones that do
+    not fit keep what they drew last time. At least one task runs per frame, so
+    everything is refreshed eventually however late the frame is.
+    """
+
+    def __init__(self):
+        self.cursor = 0
+        self.cost: dict = {}
+        self.stale = 0          # tasks skipped in the last run
+
+    def run(self, tasks: list, deadline: float | None, force: bool = False) -> int:
+        """deadline=None / force=True: run everything. Returns the number of tasks run."""
+        n = len(tasks)
+        if n == 0:
+            return 0
+        start = self.cursor % n
+        done = 0
+        for k in range(n):
+            key, fn, args = tasks[(start + k) % n]
+            t0 = time.perf_counter()
+            if done and not force and deadline is not None and t0 + self.cost.get(key, 0.0) > deadline:
+                break
+            fn(*args)
+            dt = time.perf_counter() - t0
+            c = self.cost.get(key)
+            self.cost[key] = dt if c is None else c + (dt - c) * TASK_COST_EMA
+            done += 1
+        self.cursor = (start + done) % n
+        self.stale = n - done
+        return done
@@ -0,0 +1,313 @@
+import math
+import time
+import zlib
+
+from tetris_core import (
+    W, H, TETROS,
+    empty_board, can_place, lock_piece, clear_lines, add_garbage,
+    board_to_string, string_to_board,
+)
+
+# "events":   send "piece locked at (rot, x, y)" / "garbage with holes" and rebuild
+#             opponent boards locally, with periodic hash checks + keyframes on mismatch
+# "snapshot": stream board_to_string() (the old behaviour)
+REPLICATION_MODE = "events"
+
+HASH_EVERY = 8            # send a board hash after every Nth event
+RESYNC_RETRY_S = 1.0      # re-ask for a keyframe if the first request went unanswered
+
+# Active piece stream, adaptive: the sender runs the receivers' extrapolation
+# (extrapolate_piece) and only sends when the real piece left it: a move, a
+# rotation, soft drop, a new piece. Plain falling costs nothing, a busy player
+# gets up to PIECE_HZ updates a second; a heartbeat covers lost state.
+PIECE_HZ = 12
+PIECE_HEARTBEAT_S = 1.0
+MAX_EXTRAPOLATE_ROWS = 22
+MIN_PIECE_INTERVAL = 0.01  # "iv" below this (100 rows/s) is not a real gravity interval
+
+# Wire format (per player, "id" is added by the host when routing):
+#   {"t":"pl","n":seq,"p":"T","r":rot,"x":x,"y":y}   piece locked (line clears implied)
+#   {"t":"gb","n":seq,"h":[holes]}                  garbage rows pushed in
+#   {"t":"hash","n":seq,"h":crc32}                  board hash right after event seq
+#   {"t":"board","n":seq,"s":...,"alive":...}       keyframe (n omitted in snapshot mode)
+#   {"t":"kfreq","id":pid}                          ask pid for a keyframe
+#   {"t":"pc","n":seq,"p":"T","r":rot,"x":x,"y":y,"g":phase,"iv":interval}
+#                                                   active piece; phase = fraction of the
+#                                                   current gravity interval already elapsed
+EVENT_TYPES = ("pl", "gb", "hash", "pc")
+
+# Level of detail a receiver asks for per opponent ({"t":"view","ids":[...],"lod":{"5":"sky"}},
+# ids not in "lod" are "full"). Small thumbnails do not need the event stream:
+#   "full": everything above
+#   "sky":  {"t":"sky","id":pid,"h":[W column heights],"alive":...}   on change
+#   "sum":  {"t":"sum","id":pid,"h":max height,"alive":...}           on change
+LOD_LEVELS = ("full", "sky", "sum")
+LOD_TYPES = ("sky", "sum")
+
+BOARD_CELLS = frozenset("." + "".join(TETROS) + "G")
+
+
+def _int(v) -> bool:
+    return isinstance(v, int) and not isinstance(v, bool)
+
+
+def _finite(v) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool) and math.isfinite(v)
+
+
+def well_formed(msg: dict) -> bool:
+    """
+    Field check for what a player sends ("board" + EVENT_TYPES) before anything
+    parses it; the host kicks with bad_message on False, replicas ignore the message.
+    """
+    t = msg.get("t")
+    n = msg.get("n")
+    if n is not None and not _int(n):
+        return False
+    if t == "board":
+        s = msg.get("s", "")
+        return isinstance(s, str) and (s == "" or len(s) == W * H and BOARD_CELLS.issuperset(s))
+    if t not in EVENT_TYPES or n is None:
+        return False
+    if t in ("pl", "pc"):
+        if msg.get("p") not in TETROS or not all(_int(msg.get(k)) for k in ("r", "x", "y")):
+            return False
+        if t == "pc":
+            g, iv = msg.get("g", 0.0), msg.get("iv", 0.0)
+            return _finite(g) and _finite(iv) and (iv == 0 or iv >= MIN_PIECE_INTERVAL)
+        return True
+    if t == "gb":
+        h = msg.get("h") or []
+        return isinstance(h, list) and all(_int(v) for v in h)
+    return True     # hash: "h" is only compared
+
+
+def board_hash(board) -> int:
+    return zlib.crc32(board_to_string(board).encode("ascii"))
+
+
+def skyline(board) -> list[int]:
+    """Column heights (0 = empty column), counted from the floor."""
+    rows = len(board)
+    out = []
+    for x in range(W):
+        h = 0
+        for y in range(rows):
+            if board[y][x] is not None:
+                h = rows - y
+                break
+        out.append(h)
+    return out
+
+
+def skyline_board(heights) -> list:
+    """Stand-in board for a thumbnail: every column solid up to its height."""
+    b = empty_board()
+    rows = len(b)
+    for x, h in enumerate(heights):
+        for y in range(rows - min(max(0, h), rows), rows):
+            b[y][x] = "G"
+    return b
+
+
+def extrapolate_piece(board, p, r, x, y, phase: float, interval: float, dt: float) -> int:
+    """Row the piece is on dt seconds after (phase, interval) was sampled: one row per interval, stops on the stack."""
+    rows = phase + dt / interval if interval > 0 else 0.0
+    if not rows > 0:    # also NaN
+        rows = 0.0
+    for _ in range(int(min(rows, MAX_EXTRAPOLATE_ROWS))):
+        if not can_place(board, p, r, x, y + 1):
+            break
+        y += 1
+    return y
+
+
+class EventStream:
+    """Local side: turns PlayerEngine lock/garbage hooks into replication messages."""
+
+    def __init__(self, send):
+        self.send = send
+        self.seq = 0
+        self.keyframe_wanted = False
+        self._piece_sent = None     # (seq, piece, rot, x, y, phase, interval) last sent
+        self._piece_t = 0.0
+
+    def _after_event(self, board):
+        if self.seq % HASH_EVERY == 0:
+            self.send({"t": "hash", "n": self.seq, "h": board_hash(board)})
+
+    def on_lock(self, board, piece, rot, x, y):
+        self.seq += 1
+        self.send({"t": "pl", "n": self.seq, "p": piece, "r": rot, "x": x, "y": y})
+        self._after_event(board)
+
+    def on_garbage(self, board, holes):
+        self.seq += 1
+        self.send({"t": "gb", "n": self.seq, "h": list(holes)})
+        self._after_event(board)
+
+    def piece(self, eng, now: float):
+        """Called once per frame with the local PlayerEngine; sends only what receivers cannot predict."""
+        if not eng.alive:
+            return
+        since = now - self._piece_t
+        if since < 1.0 / PIECE_HZ:
+            return
+        sent = self._piece_sent
+        if sent is not None and since < PIECE_HEARTBEAT_S and sent[:4] == (self.seq, eng.cur, eng.rot, eng.px):
+            # same piece, same column: receivers are right as long as gravity alone explains the row
+            if extrapolate_piece(eng.board, *sent[1:], since) == eng.py:
+                return
+        phase, interval = eng.gravity_phase()
+        self._piece_sent = (self.seq, eng.cur, eng.rot, eng.px, eng.py, phase, interval)
+        self._piece_t = now
+        self.send({"t": "pc", "n": self.seq, "p": eng.cur, "r": eng.rot, "x": eng.px, "y": eng.py,
+                   "g": round(phase, 3), "iv": round(interval, 4)})
+
+    def keyframe(self, board, alive: bool):
+        self.keyframe_wanted = False
+        self.send({"t": "board", "n": self.seq, "s": board_to_string(board), "alive": alive})
+
+
+class ReplicaSet:
+    """
+    Remote side: one rebuilt board per player id. Boards are copied on every
+    change, so a new object means new content (render cache relies on it).
+    """
+
+    def __init__(self):
+        self.boards: dict[int, list] = {}
+        self.seq: dict[int, int | None] = {}
+        # pid -> (piece, rot, x, y, phase, interval, received_at)
+        self.pieces: dict[int, tuple] = {}
+        self._last_s: dict[int, str] = {}
+        self._resync: dict[int, float] = {}    # pid -> time of last keyframe request
+        self.lod: dict[int, str] = {}          # pid -> "sky" / "sum" while not on the full stream
+        self._lod_h: dict[int, tuple] = {}
+
+    def ensure(self, pid: int):
+        if pid not in self.boards:
+            self.boards[pid] = empty_board()
+            self.seq[pid] = 0
+
+    def string_of(self, pid: int) -> str:
+        b = self.boards.get(pid)
+        return board_to_string(b) if b is not None else ""
+
+    def drop_piece(self, pid: int):
+        self.pieces.pop(pid, None)
+
+    def piece_at(self, pid: int, now: float):
+        """
+        Opponent's active piece extrapolated to `now`: it keeps falling one row per
+        gravity interval until it rests on the replicated stack. None if unknown.
+        """
+        st = self.pieces.get(pid)
+        b = self.boards.get(pid)
+        if st is None or b is None:
+            return None
+        p, r, x, y, phase, interval, t0 = st
+        return p, r, x, extrapolate_piece(b, p, r, x, y, phase, interval, now - t0)
+
+    def _out_of_sync(self, pid: int) -> bool:
+        now = time.monotonic()
+        last = self._resync.get(pid)
+        if last is not None and now - last < RESYNC_RETRY_S:
+            return False
+        self._resync[pid] = now
+        return True
+
+    def apply(self, pid: int, msg: dict) -> bool:
+        """
+        Apply one message for pid. Returns True when the caller should send
+        {"t":"kfreq","id":pid} because the replica can no longer be trusted.
+        """
+        t = msg.get("t")
+
+        if t in LOD_TYPES:
+            h = msg.get("h")
+            if t == "sum":
+                heights = [h] * W if isinstance(h, int) else None
+            else:
+                heights = h if isinstance(h, list) and len(h) == W and all(isinstance(v, int) for v in h) else None
+            if heights is None:
+                return False
+            key = tuple(heights)
+            if self._lod_h.get(pid) != key or pid not in self.boards:
+                self._lod_h[pid] = key
+                self.boards[pid] = skyline_board(heights)
+            self.lod[pid] = t
+            self.seq[pid] = None
+            self._last_s.pop(pid, None)    # the next keyframe must rebuild the real board
+            self._resync.pop(pid, None)
+            self.pieces.pop(pid, None)
+            return False
+
+        if not well_formed(msg):
+            return False
+
+        if t == "board":
+            self.lod.pop(pid, None)
+            self._lod_h.pop(pid, None)
+            s = msg.get("s", "")
+            if self._last_s.get(pid) != s or pid not in self.boards:
+                self._last_s[pid] = s
+                self.boards[pid] = string_to_board(s)
+                self.pieces.pop(pid, None)
+            n = msg.get("n")
+            self.seq[pid] = int(n) if n is not None else None
+            self._resync.pop(pid, None)
+            return False
+
+        if pid in self.lod:
+            return False    # stragglers from before the switch to a reduced level
+        self.ensure(pid)
+        if pid in self._resync:
+            # waiting for a keyframe: drop events, nag again after RESYNC_RETRY_S
+            return self._out_of_sync(pid)
+
+        try:
+            n = int(msg.get("n"))
+        except (TypeError, ValueError):
+            return False
+        seq = self.seq.get(pid)
+
+        if t == "hash":
+            if seq == n and board_hash(self.boards[pid]) != msg.get("h"):
+                return self._out_of_sync(pid)
+            return False
+
+        if t == "pc":
+            # only trust a piece that belongs to the board we have
+            p, r, x, y = msg.get("p"), msg.get("r"), msg.get("x"), msg.get("y")
+            if seq == n and 0 <= r < 4:
+                phase = min(1.0, max(0.0, float(msg.get("g", 0.0))))
+                interval = float(msg.get("iv", 0.0))
+                self.pieces[pid] = (p, r, x, y, phase, interval, time.monotonic())
+            return False
+
+        if seq is None or n != seq + 1:
+            return self._out_of_sync(pid)
+
+        b = [row[:] for row in self.boards[pid]]
+        if t == "pl":
+            p, r, x, y = msg.get("p"), msg.get("r"), msg.get("x"), msg.get("y")
+            if p not in TETROS or not isinstance(r, int) or not isinstance(x, int) or not isinstance(y, int) \
+                    or not 0 <= r < 4 or not can_place(b, p, r, x, y):
+                return self._out_of_sync(pid)
+            lock_piece(b, p, r, x, y)
+            clear_lines(b)
+            self.pieces.pop(pid, None)     # the lock is the correction for any extrapolation
+        elif t == "gb":
+            holes = msg.get("h") or []
+            if not all(isinstance(hh, int) and 0 <= hh < W for hh in holes):
+                return self._out_of_sync(pid)
+            add_garbage(b, len(holes), holes)
+            self.pieces.pop(pid, None)
+        else:
+            return False
+
+        self.boards[pid] = b
+        self.seq[pid] = n
+        self._last_s.pop(pid, None)
+        return False
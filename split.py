@@ -0,0 +1,462 @@
+"""
+Two-process client (TETRIS_SPLIT=1): a worker process owns the connection, the
+PlayerEngine and the opponent replicas; the game window process only draws.
+
+    window process                            worker process
+    common_game_loop(engine=RemoteEngine)     NetPeer + PlayerEngine + ReplicaSet
+      key events  --- Pipe ("in", t, op) --->   applied at the sim tick of t
+      snapshot    <-- shared memory ---------   after inputs / at PUBLISH_HZ
+
+The shared block is a seqlock: [seq u32][len u32][marshal payload]. The writer
+makes seq odd, copies the payload, then stores the next even seq with the
+length; a reader that saw an odd seq, or a different seq after copying, reads
+again. One writer, any number of readers, nobody waits on a lock.
+"""
+import itertools
+import marshal
+import multiprocessing
+import os
+import struct
+import time
+from multiprocessing import shared_memory
+
+import matchlog
+from engine import PlayerEngine, FixedStep
+from net import NetPeer
+from replication import REPLICATION_MODE, EVENT_TYPES, LOD_TYPES, EventStream, ReplicaSet
+from tetris_core import empty_board, can_place, board_to_string, string_to_board
+
+SPLIT_CLIENT = os.environ.get("TETRIS_SPLIT") == "1"
+
+SNAPSHOT_BYTES = 1 << 20
+PUBLISH_HZ = 240            # snapshot rate while no input arrives (= engine.SIM_HZ)
+READ_RETRIES = 64
+FIRST_SNAPSHOT_S = 2.0      # RemoteEngine waits this long for the worker to start the match
+NEXT_SHOWN = 8
+BOARD_SEND_S = 0.20         # snapshot replication mode: own board every this often
+
+# PlayerEngine methods the window may call through the pipe
+INPUT_OPS = ("press_left", "press_right", "release_left", "release_right",
+             "rotate", "do_hold", "hard_drop", "set_soft_drop")
+
+_HEAD = struct.Struct("<II")    # seq, payload length
+
+
+class SnapshotBlock:
+    def __init__(self, buf):
+        self.buf = buf
+        self.seq = 0        # writer: last published, reader: last read
+
+    def publish(self, data: bytes):
+        n = len(data)
+        if _HEAD.size + n > len(self.buf):
+            raise ValueError(f"snapshot too large: {n} bytes")
+        _HEAD.pack_into(self.buf, 0, self.seq + 1, 0)     # odd: write in progress
+        self.buf[_HEAD.size:_HEAD.size + n] = data
+        self.seq += 2
+        _HEAD.pack_into(self.buf, 0, self.seq, n)
+
+    def read(self) -> bytes | None:
+        """Newest payload, None if nothing new since the last read."""
+        for _ in range(READ_RETRIES):
+            seq, n = _HEAD.unpack_from(self.buf, 0)
+            if seq == self.seq:
+                return None
+            if seq & 1:
+                time.sleep(0)
+                continue
+            data = bytes(self.buf[_HEAD.size:_HEAD.size + n])
+            if _HEAD.unpack_from(self.buf, 0)[0] == seq:
+                self.seq = seq
+                return data
+        return None
+
+
+# ---- worker process ----
+
+class _Worker:
+    """main.run_client without the window: same message handling, same engine hooks."""
+
+    def __init__(self, peer: NetPeer, my_id: int, roster: dict, start_at: float, autoplay: bool):
+        self.peer = peer
+        self.my_id = my_id
+        self.roster = roster
+        self.at = None              # start time of the running / last match
+        self.next_at = start_at     # set until that match begins; inbox waits meanwhile
+        self.eng = None
+        self.view = None            # opponent ids the window shows (None = all)
+        self.bot = None
+        if autoplay:
+            from bot import Bot     # only TETRIS_BOT=1 pays for the bot import
+            self.bot = Bot()
+        self._own_s = (None, "")
+        self._opp_s: dict[int, tuple] = {}
+
+    def begin(self, at: float):
+        self.at, self.next_at = at, None
+        self.replicas = ReplicaSet()
+        self.alive_map = {}
+        self.end = None
+        self.stream = EventStream(self.peer.send) if REPLICATION_MODE == "events" else None
+        eng = PlayerEngine(send_atk=lambda n: self.peer.send({"t": "atk", "n": n}),
+                           send_dead=lambda: self.peer.send({"t": "dead"}))
+        matchlog.begin(at, role="client", me=self.my_id)
+        eng.record = matchlog.recorder(self.my_id)
+        if self.stream is not None:
+            eng.on_lock = self.stream.on_lock
+            eng.on_garbage = self.stream.on_garbage
+        self.eng = eng
+        self.stepper = FixedStep(time.perf_counter())
+        self.last_board_send = 0.0
+        self._own_s = (None, "")
+        self._opp_s.clear()
+
+    def drain(self) -> int:
+        atks_for_me = 0
+        # after "start" the rest of the inbox belongs to the next match
+        while self.peer.inbox and self.next_at is None:
+            msg = self.peer.inbox.popleft()
+            t = msg.get("t")
+
+            if t == "roster":
+                self.roster.clear()
+                self.roster.update({int(k): v for k, v in msg.get("roster", {}).items()})
+                for pid in self.roster:
+                    if pid != self.my_id:
+                        self.replicas.ensure(pid)
+
+            elif t == "join":
+                pid = int(msg.get("id"))
+                self.roster[pid] = str(msg.get("name", f"Player{pid}"))
+                if pid != self.my_id:
+                    self.replicas.ensure(pid)
+
+            elif t == "start":
+                if self.end is not None:
+                    self.next_at = float(msg.get("at", time.time()))
+
+            elif self.end is not None:
+                continue    # match over: only the roster and the rematch call matter
+
+            elif t == "board" or t in LOD_TYPES:
+                pid = int(msg.get("id"))
+                self.replicas.apply(pid, msg)
+                self.alive_map[pid] = bool(msg.get("alive", True))
+
+            elif t in EVENT_TYPES:
+                pid = int(msg.get("id"))
+                if pid != self.my_id and self.replicas.apply(pid, msg):
+                    self.peer.send({"t": "kfreq", "id": pid})
+
+            elif t == "kfreq":
+                if self.stream is not None:
+                    self.stream.keyframe_wanted = True
+
+            elif t == "dead":
+                pid = int(msg.get("id"))
+                self.alive_map[pid] = False
+                self.replicas.drop_piece(pid)
+
+            elif t == "atk":
+                atks_for_me += max(0, int(msg.get("n", 0)))
+
+            elif t == "end":
+                self.end = {"winner": msg.get("winner"), "ranking": msg.get("ranking", []),
+                            "roster": {int(k): v for k, v in msg.get("roster", {}).items()}}
+        return atks_for_me
+
+    def handle(self, op: tuple):
+        if op[0] == "in":
+            _, t, name, args = op
+            if self.eng is None or self.end is not None or name not in INPUT_OPS:
+                return
+            for _ in range(self.stepper.advance(t)):
+                self.eng.tick()
+            getattr(self.eng, name)(*args)
+        elif op[0] == "view":
+            _, ids, lod = op
+            self.view = set(ids)
+            self.peer.send({"t": "view", "ids": ids, "lod": lod})
+
+    def step(self, now: float):
+        if self.eng is None:
+            return
+        eng = self.eng
+        gained = self.drain()
+        if self.end is not None:
+            return
+        if eng.alive and gained:
+            eng.add_pending_garbage(gained)
+
+        if self.stream is not None:
+            if self.stream.keyframe_wanted:
+                self.stream.keyframe(eng.board, eng.alive)
+            self.stream.piece(eng, now)
+        elif now - self.last_board_send > BOARD_SEND_S:
+            self.last_board_send = now
+            self.peer.send({"t": "board", "s": board_to_string(eng.board), "alive": eng.alive})
+
+        for _ in range(self.stepper.advance(now)):
+            eng.tick()
+        if self.bot is not None:
+            self.bot.update(eng, now)
+
+    def _board_s(self, pid: int, b) -> str:
+        # replica boards are replaced on change, so the object identifies the content
+        cached = self._opp_s.get(pid)
+        if cached is None or cached[0] is not b:
+            cached = self._opp_s[pid] = (b, board_to_string(b))
+        return cached[1]
+
+    def snapshot(self) -> dict:
+        snap = {"at": self.at, "next": self.next_at, "net": self.peer.alive, "roster": self.roster}
+        eng = self.eng
+        if eng is None:
+            return snap
+        if self._own_s[0] != eng.board_ver:     # own board is edited in place: key on the version
+            self._own_s = (eng.board_ver, board_to_string(eng.board))
+
+        r = self.replicas
+        mono = time.monotonic()
+        opp, pieces = {}, {}
+        for pid in (self.view if self.view is not None else r.boards):
+            b = r.boards.get(pid)
+            if b is None:
+                continue
+            opp[pid] = self._board_s(pid, b)
+            pc = r.piece_at(pid, mono)
+            if pc is not None:
+                pieces[pid] = pc
+
+        snap.update(
+            board=self._own_s[1], piece=(eng.cur, eng.rot, eng.px, eng.py),
+            vis=eng.visual_pos(self.stepper.alpha), hold=eng.hold,
+            queue=tuple(itertools.islice(eng.next_queue, NEXT_SHOWN)), alive=eng.alive, lines=eng.lines,
+            opp=opp, pieces=pieces, alive_map=self.alive_map, end=self.end,
+        )
+        return snap
+
+
+def _worker_main(sock, buf, inbox, shm, conn, my_id, roster, start_at, autoplay):
+    peer = NetPeer(sock, buf, inbox)
+    block = SnapshotBlock(shm.buf)
+    w = _Worker(peer, my_id, roster, start_at, autoplay)
+    interval = 1.0 / PUBLISH_HZ
+    last_pub = 0.0
+    try:
+        while True:
+            dirty = False
+            while conn.poll():
+                op = conn.recv()
+                if op[0] == "quit":
+                    return
+                w.handle(op)
+                dirty = True
+            if w.next_at is not None and time.time() >= w.next_at:
+                w.begin(w.next_at)
+                dirty = True
+
+            now = time.perf_counter()
+            w.step(now)
+            if dirty or now - last_pub >= interval:
+                block.publish(marshal.dumps(w.snapshot()))
+                last_pub = now
+            # sleeps until the next publish unless an input arrives first
+            conn.poll(max(0.0, last_pub + interval - time.perf_counter()))
+    except (EOFError, OSError):
+        pass    # window process is gone
+    finally:
+        peer.close()
+        shm.close()
+
+
+# ---- window process ----
+
+class ClientProcess:
+    """
+    Window-side handle for one room session: takes over the peer (which must be
+    a socket NetPeer), starts the worker and reads its snapshots.
+    """
+
+    def __init__(self, peer: NetPeer, my_id: int, roster: dict, start_at: float, autoplay: bool = False):
+        self.shm = shared_memory.SharedMemory(create=True, size=SNAPSHOT_BYTES)
+        self.block = SnapshotBlock(self.shm.buf)
+        self.snap: dict = {}
+        # spawn everywhere: the window process runs SDL threads, forking it is not safe
+        ctx = multiprocessing.get_context("spawn")
+        self.conn, child = ctx.Pipe()
+        sock, buf, inbox = peer.detach()
+        self.proc = ctx.Process(
+            target=_worker_main, name="tetris-worker", daemon=True,
+            args=(sock, buf, inbox, self.shm, child, my_id, dict(roster), start_at, autoplay),
+        )
+        self.proc.start()
+        child.close()
+        sock.close()    # the worker has its own handle now
+        self._closed = False
+
+    def poll(self) -> dict:
+        data = self.block.read()
+        if data is not None:
+            try:
+                self.snap = marshal.loads(data)
+            except (EOFError, ValueError, TypeError):
+                pass    # torn read that slipped past the seq check: keep the last one
+        return self.snap
+
+    def send(self, op: tuple):
+        try:
+            self.conn.send(op)
+        except (OSError, ValueError):
+            pass
+
+    def set_view(self, ids, lod):
+        self.send(("view", list(ids), lod))
+
+    def rematch(self, _pressed):
+        """ui.show_ranking_screen callback: next start time, 0.0 once the host is gone."""
+        snap = self.poll()
+        if snap.get("next"):
+            return snap["next"]
+        return None if snap.get("net", True) and self.proc.is_alive() else 0.0
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self.send(("quit",))
+        self.proc.join(timeout=2.0)
+        if self.proc.is_alive():
+            self.proc.terminate()
+        self.conn.close()
+        self.block.buf = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class _SnapshotStep:
+    """FixedStep stand-in: the worker runs the ticks, advance() only picks up its snapshot."""
+
+    alpha = 0.0     # snapshots carry the interpolated position already
+
+    def __init__(self, eng: "RemoteEngine"):
+        self.eng = eng
+        self.last = time.perf_counter()
+
+    def advance(self, now: float) -> int:
+        self.last = now
+        self.eng.refresh()
+        return 0
+
+
+class RemoteEngine:
+    """
+    PlayerEngine look-alike for common_game_loop(engine=...): state is the
+    worker's latest snapshot of the match that starts at start_at, input
+    methods forward to the worker, stamped with the time the key was sampled.
+    """
+
+    def __init__(self, cp: ClientProcess, start_at: float):
+        self.cp = cp
+        self.start_at = start_at
+        self.stepper = _SnapshotStep(self)
+        self.record = None
+
+        self.board = empty_board()
+        self.board_ver = 0
+        self.cur, self.rot, self.px, self.py = "I", 0, 0, 0
+        self.hold = None
+        self.next_queue = ()
+        self.alive = False
+        self.lines = 0
+        self._board_s = None
+        self._vis = (0.0, 0.0)
+
+        self.roster: dict[int, str] = {}
+        self.opp_boards: dict[int, list] = {}
+        self.opp_pieces: dict[int, tuple] = {}
+        self._opp_s: dict[int, str] = {}
+        self.alive_map: dict[int, bool] = {}
+        self.end_packet = {"active": False, "winner": None, "ranking": [], "roster": {}}
+
+        deadline = time.perf_counter() + FIRST_SNAPSHOT_S
+        while not self.refresh() and time.perf_counter() < deadline and cp.proc.is_alive():
+            time.sleep(0.001)
+
+    def refresh(self) -> bool:
+        """Copy the newest snapshot in. False until the worker has started this match."""
+        snap = self.cp.poll()
+        if snap.get("at") != self.start_at or "board" not in snap:
+            return False
+        s = snap["board"]
+        if s != self._board_s:
+            self._board_s = s
+            self.board = string_to_board(s)
+            self.board_ver += 1
+        self.cur, self.rot, self.px, self.py = snap["piece"]
+        self._vis = snap["vis"]
+        self.hold = snap["hold"]
+        self.next_queue = snap["queue"]
+        self.alive = snap["alive"]
+        self.lines = snap["lines"]
+
+        boards = {}
+        for pid, s in snap["opp"].items():
+            b = self.opp_boards.get(pid)
+            if b is None or self._opp_s.get(pid) != s:     # new object only on change (render cache)
+                self._opp_s[pid] = s
+                b = string_to_board(s)
+            boards[pid] = b
+        self.opp_boards = boards
+        self.opp_pieces = snap["pieces"]
+        self.alive_map = snap["alive_map"]
+        if snap["roster"] != self.roster:
+            self.roster.clear()
+            self.roster.update(snap["roster"])
+        end = snap["end"]
+        if end is not None and not self.end_packet["active"]:
+            self.end_packet.update(end, active=True)
+        return True
+
+    # ---- PlayerEngine interface used by common_game_loop ----
+    def tick(self):
+        pass
+
+    def add_pending_garbage(self, n: int):
+        pass    # the worker reads attacks off the wire itself
+
+    def ghost_y(self) -> int:
+        gpy = self.py
+        while can_place(self.board, self.cur, self.rot, self.px, gpy + 1):
+            gpy += 1
+        return gpy
+
+    def visual_pos(self, _alpha: float) -> tuple[float, float]:
+        return self._vis
+
+    def _input(self, name: str, *args):
+        self.cp.send(("in", self.stepper.last, name, args))
+
+    def press_left(self):
+        self._input("press_left")
+
+    def press_right(self):
+        self._input("press_right")
+
+    def release_left(self):
+        self._input("release_left")
+
+    def release_right(self):
+        self._input("release_right")
+
+    def rotate(self, dir_: int):
+        self._input("rotate", dir_)
+
+    def do_hold(self):
+        self._input("do_hold")
+
+    def hard_drop(self):
+        self._input("hard_drop")
+
+    def set_soft_drop(self, on: bool):
+        self._input("set_soft_drop", on)
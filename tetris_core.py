@@ -87,13 +87,17 @@ def clear_lines(board):
             y += 1
     return cleared
 
-def add_garbage(board, n):
-    for _ in range(n):
-        hole = random.randrange(W)
+def add_garbage(board, n, holes=None):
+    # holes: replay exact garbage (replication); returns the holes used
+    used = []
+    for i in range(n):
+        hole = holes[i] if holes is not None else random.randrange(W)
         row = ["G"] * W
         row[hole] = None
         board.pop(0)
         board.append(row)
+        used.append(hole)
+    return used
 
 def board_to_string(board):
     out = []
@@ -0,0 +1,208 @@
+import errno
+import json
+import os
+import queue
+import socket
+import threading
+from collections import deque
+
+# Addresses accepted wherever a host IP is typed / passed:
+#   "192.168.1.20" (+ port)   TCP, the default
+#   "unix:/tmp/tetris.sock"   Unix domain socket (same newline-JSON stream, no TCP stack)
+#   "inproc:name"             in-process queue pair: no socket, no JSON, no rx thread
+UNIX_PREFIX = "unix:"
+INPROC_PREFIX = "inproc:"
+
+ACCEPT_TIMEOUT_S = 0.5
+# connect_ex() results that mean "in progress" (Windows reports WSAEWOULDBLOCK)
+CONNECT_PENDING = {0, errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN, getattr(errno, "WSAEWOULDBLOCK", 10035)}
+LISTEN_BACKLOG = 16
+
+
+def parse_address(ip: str, port: int) -> tuple[str, object]:
+    ip = ip.strip()
+    if ip.startswith(UNIX_PREFIX):
+        return "unix", ip[len(UNIX_PREFIX):]
+    if ip.startswith(INPROC_PREFIX):
+        return "inproc", ip[len(INPROC_PREFIX):]
+    return "tcp", (ip, port)
+
+
+def stream_candidates(kind: str, target) -> list[tuple[int, object]]:
+    """
+    (family, sockaddr) pairs worth trying for a "tcp" / "unix" target. A host
+    name can resolve to several; families alternate so a dead IPv6 route does
+    not queue up in front of every IPv4 address.
+    """
+    if kind == "unix":
+        return [(socket.AF_UNIX, target)]
+    host, port = target
+    by_family: dict[int, list] = {}
+    for family, _type, _proto, _name, addr in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM):
+        lst = by_family.setdefault(family, [])
+        if addr not in lst:
+            lst.append(addr)
+    out = []
+    while any(by_family.values()):
+        for family, lst in by_family.items():
+            if lst:
+                out.append((family, lst.pop(0)))
+    return out
+
+
+def start_stream(family: int, addr) -> socket.socket:
+    """Non-blocking connect: the socket turns writable once it is up (or failed, see SO_ERROR)."""
+    s = socket.socket(family, socket.SOCK_STREAM)
+    s.setblocking(False)
+    try:
+        err = s.connect_ex(addr)
+    except OSError:
+        s.close()
+        raise
+    if err not in CONNECT_PENDING:
+        s.close()
+        raise OSError(err, os.strerror(err))
+    return s
+
+
+class SocketListener:
+    """accept() -> make_peer(conn), None on timeout; raises OSError once closed."""
+
+    def __init__(self, sock: socket.socket, make_peer, path: str | None = None):
+        self.sock = sock
+        self.make_peer = make_peer
+        self.path = path
+        self.sock.settimeout(ACCEPT_TIMEOUT_S)
+
+    def accept(self):
+        try:
+            conn, _addr = self.sock.accept()
+        except socket.timeout:
+            return None
+        return self.make_peer(conn)
+
+    def close(self):
+        try:
+            self.sock.close()
+        except Exception:
+            pass
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+def tcp_listener(bind_ip: str, port: int, make_peer) -> SocketListener:
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    s.bind((bind_ip, port))
+    s.listen(LISTEN_BACKLOG)
+    return SocketListener(s, make_peer)
+
+
+def unix_listener(path: str, make_peer) -> SocketListener:
+    try:
+        os.unlink(path)     # stale socket file from a previous run
+    except OSError:
+        pass
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.bind(path)
+    s.listen(LISTEN_BACKLOG)
+    return SocketListener(s, make_peer, path=path)
+
+
+class LocalPeer:
+    """
+    One end of an in-process queue pair with NetPeer's interface (alive, inbox,
+    reason, send, send_raw, send_some, drop, close). send() appends a shallow copy of the message straight
+    to the other end's inbox.
+    """
+
+    def __init__(self):
+        self.alive = True
+        self.inbox = deque()
+        self.reason: str | None = None
+        self.other: "LocalPeer | None" = None
+
+    def send(self, obj: dict):
+        other = self.other
+        if not self.alive or other is None:
+            return
+        if not other.alive:
+            self.alive = False
+            return
+        other.inbox.append(dict(obj))
+
+    def send_raw(self, data: bytes):
+        for line in data.splitlines():
+            if line.strip():
+                self.send(json.loads(line))
+
+    def send_some(self, data: bytes) -> int:
+        self.send_raw(data)
+        return len(data)
+
+    def drop(self, reason: str):
+        if self.reason is None:
+            self.reason = reason
+        other = self.other
+        if self.alive and other is not None and other.alive:
+            other.reason = reason
+        self.send({"t": "kick", "reason": reason})
+        self.close()
+
+    def close(self):
+        self.alive = False
+        if self.other is not None:
+            self.other.alive = False
+
+
+def local_pair() -> tuple[LocalPeer, LocalPeer]:
+    a, b = LocalPeer(), LocalPeer()
+    a.other, b.other = b, a
+    return a, b
+
+
+_inproc: dict[str, "InprocListener"] = {}
+_inproc_lock = threading.Lock()
+
+
+class InprocListener:
+    def __init__(self, name: str):
+        self.name = name
+        self._pending: queue.Queue = queue.Queue()
+        self._closed = False
+        with _inproc_lock:
+            if name in _inproc:
+                raise OSError(f"inproc address in use: {name}")
+            _inproc[name] = self
+
+    def connect(self) -> LocalPeer:
+        if self._closed:
+            raise ConnectionRefusedError(self.name)
+        client, server = local_pair()
+        self._pending.put(server)
+        return client
+
+    def accept(self):
+        if self._closed:
+            raise OSError("listener closed")
+        try:
+            return self._pending.get(timeout=ACCEPT_TIMEOUT_S)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._closed = True
+        with _inproc_lock:
+            if _inproc.get(self.name) is self:
+                del _inproc[self.name]
+
+
+def inproc_connect(name: str) -> LocalPeer:
+    with _inproc_lock:
+        lst = _inproc.get(name)
+    if lst is None:
+        raise ConnectionRefusedError(f"no inproc listener: {name}")
+    return lst.connect()
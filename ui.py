@@ -1,18 +1,176 @@
+import json
+import os
 import time
+from bisect import bisect_right
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import accumulate
+
 import pygame
 
+from killcam import KillcamView
+from tetris_core import W, H
+
 MAX_PLAYERS = 8
 DEFAULT_PORT = 5000
 
+# Host lobby cycles through these with TAB; above MAX_PLAYERS is the large-room
+# (battle royale) mode: opponent grid + targeted routing, see net.HostServer.
+ROOM_SIZES = (8, 16, 32, 64)
+
+# Idle screens sleep on the event queue and only redraw when something changed.
+IDLE_WAKE_S = 1.0       # upper bound on a sleep with nothing to do
+NET_POLL_S = 0.1        # lobby: how often to look at the inbox / roster while idle
+BLINK_S = 0.5           # text cursor half-period
+CONNECT_FAIL_SHOW_S = 2.0   # connect screen: how long a failure stays up without a key press
+
+def wait_events(timeout_s: float) -> list:
+    """Block until an event arrives or timeout_s passes, then return every pending event."""
+    ms = int(timeout_s * 1000)
+    if ms <= 0:
+        return pygame.event.get()
+    first = pygame.event.wait(ms)
+    if first.type == pygame.NOEVENT:
+        return []
+    return [first] + pygame.event.get()
+
+FONT_NAME = "consolas"
+# name -> resolved font file (null = pygame's default font). Finding it means
+# scanning every installed font, so it is done once per machine, not per start.
+FONT_CACHE = os.path.join(os.path.expanduser("~"), ".cache", "8player-tetris", "fonts.json")
+
+
+def init_pygame():
+    """Only the subsystems the game uses (pygame.init() also starts audio, joystick, ...)."""
+    pygame.display.init()
+    pygame.font.init()
+    # pygame forgets its quit callbacks once they ran: register again on every init
+    pygame.register_quit(_on_quit)
+
+
+_font_paths: dict[str, str | None] = {}
+
+def _load_font_cache():
+    try:
+        with open(FONT_CACHE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return
+    for name, path in data.items():
+        if path is None or os.path.isfile(path):    # font uninstalled since: scan again
+            _font_paths.setdefault(name, path)
+
+def font_path(name: str = FONT_NAME) -> str | None:
+    if not _font_paths:
+        _load_font_cache()
+    if name not in _font_paths:
+        _font_paths[name] = pygame.font.match_font(name)
+        try:
+            os.makedirs(os.path.dirname(FONT_CACHE), exist_ok=True)
+            with open(FONT_CACHE, "w", encoding="utf-8") as f:
+                json.dump(_font_paths, f)
+        except OSError:
+            pass
+    return _font_paths[name]
+
+def warm_fonts(name: str = FONT_NAME) -> bool:
+    """Resolve the UI font before the first screen. True if the disk cache had it."""
+    if not _font_paths:
+        _load_font_cache()
+    hit = name in _font_paths
+    font_path(name)
+    return hit
+
+# Font registry shared by every screen: one Font per (name, size) for the whole
+# session. They die with pygame.quit(), so the registry goes with them (_on_quit).
+_fonts: dict = {}
+
+def sys_font(size: int, name: str = FONT_NAME) -> pygame.font.Font:
+    f = _fonts.get((name, size))
+    if f is None:
+        f = _fonts[(name, size)] = pygame.font.Font(font_path(name), size)
+    return f
+
+def until_next_blink() -> float:
+    return BLINK_S - (time.time() % BLINK_S)
+
+def clip_list(ids: list, rows: int) -> tuple[list, int]:
+    """At most `rows` entries; when some are cut, the last row is left for a "+N more" line."""
+    if len(ids) <= rows:
+        return ids, 0
+    keep = max(0, rows - 1)
+    return ids[:keep], len(ids) - keep
+
+# ---------------------------
+# TEXT CACHE
+# ---------------------------
+
+# LRU of rendered text surfaces keyed by (font, text, colour); bounded both by
+# entry count and by total pixel bytes, oldest entries are evicted first.
+TEXT_CACHE_MAX_ENTRIES = 512
+TEXT_CACHE_MAX_BYTES = 8 * 1024 * 1024
+
+_text_cache: OrderedDict = OrderedDict()
+_text_cache_bytes = 0
+
+def render_text(font: pygame.font.Font, text: str, color) -> pygame.Surface:
+    global _text_cache_bytes
+    key = (font, text, tuple(color))
+    surf = _text_cache.get(key)
+    if surf is not None:
+        _text_cache.move_to_end(key)
+        return surf
+
+    surf = font.render(text, True, color)
+    _text_cache[key] = surf
+    _text_cache_bytes += surf.get_width() * surf.get_height() * surf.get_bytesize()
+    while len(_text_cache) > 1 and (len(_text_cache) > TEXT_CACHE_MAX_ENTRIES
+                                    or _text_cache_bytes > TEXT_CACHE_MAX_BYTES):
+        _k, old = _text_cache.popitem(last=False)
+        _text_cache_bytes -= old.get_width() * old.get_height() * old.get_bytesize()
+    return surf
+
+def clear_text_cache():
+    global _text_cache_bytes
+    _text_cache.clear()
+    _text_cache_bytes = 0
+    _glyph_widths.clear()
+    fit_text.cache_clear()
+
+def _on_quit():
+    # Font objects die with pygame.quit(); so does every cache keyed by them
+    _fonts.clear()
+    clear_text_cache()
+
+# font -> {char: advance width}
+_glyph_widths: dict = {}
+
+def _text_prefix_widths(font: pygame.font.Font, text: str) -> list[int]:
+    gw = _glyph_widths.get(font)
+    if gw is None:
+        gw = _glyph_widths[font] = {}
+    widths = []
+    for ch in text:
+        w = gw.get(ch)
+        if w is None:
+            w = gw[ch] = font.size(ch)[0]
+        widths.append(w)
+    return list(accumulate(widths))
+
+@lru_cache(maxsize=1024)
 def fit_text(font: pygame.font.Font, text: str, max_w: int) -> str:
     if font.size(text)[0] <= max_w:
         return text
-    if max_w <= font.size("…")[0]:
+    ell_w = font.size("…")[0]
+    if max_w <= ell_w:
         return "…"
-    t = text
-    while t and font.size(t + "…")[0] > max_w:
-        t = t[:-1]
-    return t + "…"
+    # binary search on cached glyph widths, then correct for kerning with real measurements
+    n = bisect_right(_text_prefix_widths(font, text), max_w - ell_w)
+    while n > 0 and font.size(text[:n] + "…")[0] > max_w:
+        n -= 1
+    while n < len(text) and font.size(text[:n + 1] + "…")[0] <= max_w:
+        n += 1
+    return text[:n] + "…"
 
 class TextInput:
     def __init__(self, rect: pygame.Rect, font: pygame.font.Font, label: str, max_len: int = 16):
@@ -35,14 +193,17 @@ class TextInput:
                 if len(self.text) < self.max_len and e.unicode and e.unicode.isprintable():
                     self.text += e.unicode
 
+    def cursor_visible(self) -> bool:
+        return self.active and (time.time() / BLINK_S) % 2 < 1
+
     def draw(self, surf):
         pygame.draw.rect(surf, (30, 30, 36), self.rect, border_radius=8)
         pygame.draw.rect(surf, (120, 120, 140) if self.active else (70, 70, 86), self.rect, 2, border_radius=8)
-        lab = self.font.render(self.label, True, (210, 210, 220))
+        lab = render_text(self.font, self.label, (210, 210, 220))
         surf.blit(lab, (self.rect.x, self.rect.y - 26))
-        txt = self.font.render(self.text if self.text else "", True, (240, 240, 250))
+        txt = render_text(self.font, self.text if self.text else "", (240, 240, 250))
         surf.blit(txt, (self.rect.x + 10, self.rect.y + (self.rect.height - txt.get_height()) // 2))
-        if self.active and (time.time() * 2) % 2 < 1:
+        if self.cursor_visible():
             cx = self.rect.x + 10 + txt.get_width() + 2
             cy = self.rect.y + (self.rect.height - txt.get_height()) // 2
             pygame.draw.rect(surf, (240, 240, 250), pygame.Rect(cx, cy, 2, txt.get_height()))
@@ -61,24 +222,28 @@ class Button:
         br = (160, 160, 190) if enabled else (70, 70, 86)
         pygame.draw.rect(surf, bg, self.rect, border_radius=10)
         pygame.draw.rect(surf, br, self.rect, 2, border_radius=10)
-        t = self.font.render(self.text, True, (240, 240, 250) if enabled else (150, 150, 160))
+        t = render_text(self.font, self.text, (240, 240, 250) if enabled else (150, 150, 160))
         surf.blit(t, (self.rect.centerx - t.get_width() // 2, self.rect.centery - t.get_height() // 2))
 
-def main_menu_screen() -> str:
+def main_menu_screen(after_first_frame=None) -> str:
     pygame.display.set_caption("LAN Tetris")
     screen = pygame.display.set_mode((1000, 600))
     clock = pygame.time.Clock()
-    big = pygame.font.SysFont("consolas", 44)
-    font = pygame.font.SysFont("consolas", 20)
+    big = sys_font(44)
+    font = sys_font(20)
     btn_y_offset = 80
 
     host_btn = Button(pygame.Rect(60, 200 + btn_y_offset, 240, 70), font, "HOST")
     join_btn = Button(pygame.Rect(60, 290 + btn_y_offset, 240, 70), font, "JOIN")
+    watch_btn = Button(pygame.Rect(320, 290 + btn_y_offset, 240, 70), font, "WATCH")
     quit_btn = Button(pygame.Rect(60, 380 + btn_y_offset, 240, 70), font, "QUIT")
 
+    dirty = True
     while True:
         clock.tick(60)
-        for e in pygame.event.get():
+        events = wait_events(0 if dirty else IDLE_WAKE_S)
+        dirty = dirty or bool(events)
+        for e in events:
             if e.type == pygame.QUIT:
                 return
                 raise SystemExit
@@ -86,6 +251,8 @@ def main_menu_screen() -> str:
                 return "host"
             if join_btn.is_clicked(e):
                 return "join"
+            if watch_btn.is_clicked(e):
+                return "watch"
             if quit_btn.is_clicked(e):
                 pygame.quit()
                 raise SystemExit
@@ -94,32 +261,45 @@ def main_menu_screen() -> str:
                     return "host"
                 if e.key == pygame.K_j:
                     return "join"
+                if e.key == pygame.K_w:
+                    return "watch"
                 if e.key == pygame.K_ESCAPE:
                     pygame.quit()
                     raise SystemExit
 
+        if not dirty:
+            continue
+        dirty = False
+
         screen.fill((12, 12, 16))
-        screen.blit(big.render("LAN TETRIS", True, (240, 240, 250)), (60, 80))
-        screen.blit(font.render("H: Host  |  J: Join  |  ESC: Quit", True, (160, 160, 175)), (60, 140))
-        screen.blit(font.render("Controls (in-game):", True, (160, 160, 175)), (60, 165))
-        screen.blit(font.render("Z=CCW, X/Up=CW | C=Hold | Space=HardDrop | Down=SoftDrop", True, (160, 160, 175)), (60, 190))
+        screen.blit(render_text(big, "LAN TETRIS", (240, 240, 250)), (60, 80))
+        screen.blit(render_text(font, "H: Host  |  J: Join  |  W: Watch  |  ESC: Quit", (160, 160, 175)), (60, 140))
+        screen.blit(render_text(font, "Controls (in-game):", (160, 160, 175)), (60, 165))
+        screen.blit(render_text(font, "Z=CCW, X/Up=CW | C=Hold | Space=HardDrop | Down=SoftDrop", (160, 160, 175)), (60, 190))
         host_btn.draw(screen, True)
         join_btn.draw(screen, True)
+        watch_btn.draw(screen, True)
         quit_btn.draw(screen, True)
         pygame.display.flip()
+        if after_first_frame is not None:
+            after_first_frame()
+            after_first_frame = None
 
 def host_lobby_screen(server, local_ip: str, port: int, start_delay_s: float) -> tuple[str, float]:
     screen = pygame.display.set_mode((1000, 650))
     pygame.display.set_caption("Tetris Lobby (Host)")
     clock = pygame.time.Clock()
-    font = pygame.font.SysFont("consolas", 20)
-    big = pygame.font.SysFont("consolas", 34)
+    font = sys_font(20)
+    big = sys_font(34)
     input_y_offset = 60
     nick_input = TextInput(pygame.Rect(60, 270 + input_y_offset, 420, 52),font,"Nickname (Host)",16)
     nick_input.active = True
 
     start_btn = Button(pygame.Rect(60, 460, 220, 56), font, "START (Enter)")
     back_btn = Button(pygame.Rect(300, 460, 140, 56), font, "BACK")
+    room_btn = Button(pygame.Rect(60, 530, 380, 48), font, "")
+    bot_btn = Button(pygame.Rect(460, 460, 80, 56), font, "+BOT")
+    room_i = ROOM_SIZES.index(server.max_clients + 1) if server.max_clients + 1 in ROOM_SIZES else 0
 
     info_lines = [
         f"Your IP: {local_ip}",
@@ -127,14 +307,25 @@ def host_lobby_screen(server, local_ip: str, port: int, start_delay_s: float) ->
         "Give your IP to friends.",
         "They choose JOIN and enter your IP.",
         "After START: no new joins.",
+        "F2 / +BOT: fill a seat with a bot.",
     ]
 
+    dirty = True
+    last_roster = None
+    last_blink = None
     while True:
         clock.tick(60)
+        events = wait_events(0 if dirty else min(NET_POLL_S, until_next_blink()))
+
         with server._lock:
             roster = dict(server.names)
+        blink = nick_input.cursor_visible()
+        if events or roster != last_roster or blink != last_blink:
+            dirty = True
+        last_roster = roster
+        last_blink = blink
 
-        for e in pygame.event.get():
+        for e in events:
             if e.type == pygame.QUIT:
                 server.stop()
                 pygame.quit()
@@ -146,6 +337,19 @@ def host_lobby_screen(server, local_ip: str, port: int, start_delay_s: float) ->
                 server.stop()
                 return "", 0.0
 
+            if room_btn.is_clicked(e) or (e.type == pygame.KEYDOWN and e.key == pygame.K_TAB):
+                # never shrink below the players already in the room
+                for _ in ROOM_SIZES:
+                    room_i = (room_i + 1) % len(ROOM_SIZES)
+                    if ROOM_SIZES[room_i] >= len(roster):
+                        break
+                server.set_room_size(ROOM_SIZES[room_i])
+
+            if bot_btn.is_clicked(e) or (e.type == pygame.KEYDOWN and e.key == pygame.K_F2):
+                if len(roster) < ROOM_SIZES[room_i]:
+                    import bot      # only the host lobby needs bots (bot -> net)
+                    bot.spawn_bot(server.inproc_address(), name=f"Bot{server.next_id}")
+
             if start_btn.is_clicked(e) or (e.type == pygame.KEYDOWN and e.key in (pygame.K_RETURN, pygame.K_KP_ENTER)):
                 name = nick_input.text.strip()[:16] or "Host"
                 server.names[1] = name
@@ -156,29 +360,40 @@ def host_lobby_screen(server, local_ip: str, port: int, start_delay_s: float) ->
                 server.schedule_start(start_at)
                 return name, start_at
 
+        if not dirty:
+            continue
+        dirty = False
+
         screen.fill((12, 12, 16))
-        screen.blit(big.render("LOBBY (HOST)", True, (240, 240, 250)), (60, 60))
+        screen.blit(render_text(big, "LOBBY (HOST)", (240, 240, 250)), (60, 60))
 
         y = 120
         for line in info_lines:
-            screen.blit(font.render(line, True, (200, 200, 210)), (60, y))
+            screen.blit(render_text(font, line, (200, 200, 210)), (60, y))
             y += 28
 
         nick_input.draw(screen)
         start_btn.draw(screen, True)
         back_btn.draw(screen, True)
+        room = ROOM_SIZES[room_i]
+        bot_btn.draw(screen, len(roster) < room)
+        room_btn.text = f"ROOM: {room} players (Tab)" + (" - BATTLE" if room > MAX_PLAYERS else "")
+        room_btn.draw(screen, True)
 
         pygame.draw.rect(screen, (18, 18, 22), pygame.Rect(560, 100, 380, 500), border_radius=10)
         pygame.draw.rect(screen, (70, 70, 86), pygame.Rect(560, 100, 380, 500), 2, border_radius=10)
-        screen.blit(font.render("Connected players:", True, (220, 220, 230)), (575, 115))
+        screen.blit(render_text(font, f"Connected players: {len(roster)}/{room}", (220, 220, 230)), (575, 115))
 
         y2 = 155
         line_h = 30
         max_w = 380 - 30
-        for pid in sorted(roster.keys())[:MAX_PLAYERS]:
+        shown, more = clip_list(sorted(roster.keys()), (600 - 10 - y2) // line_h)
+        for pid in shown:
             nm = fit_text(font, str(roster[pid]), max_w - 50)
-            screen.blit(font.render(f"{pid}: {nm}", True, (200, 200, 210)), (575, y2))
+            screen.blit(render_text(font, f"{pid}: {nm}", (200, 200, 210)), (575, y2))
             y2 += line_h
+        if more:
+            screen.blit(render_text(font, f"+{more} more", (150, 150, 165)), (575, y2))
 
         pygame.display.flip()
 
@@ -186,8 +401,8 @@ def join_connect_screen() -> tuple[str, int, str]:
     screen = pygame.display.set_mode((1000, 650))
     pygame.display.set_caption("Join (Enter IP)")
     clock = pygame.time.Clock()
-    font = pygame.font.SysFont("consolas", 20)
-    big = pygame.font.SysFont("consolas", 34)
+    font = sys_font(20)
+    big = sys_font(34)
 
     ip_input = TextInput(pygame.Rect(60, 200, 420, 52), font, "Host IP", 32)
     ip_input.active = True
@@ -199,9 +414,17 @@ def join_connect_screen() -> tuple[str, int, str]:
     back_btn = Button(pygame.Rect(520, 270, 220, 56), font, "BACK")
     err = ""
 
+    dirty = True
+    last_blink = None
     while True:
         clock.tick(60)
-        for e in pygame.event.get():
+        events = wait_events(0 if dirty else until_next_blink())
+        blink = (ip_input.cursor_visible(), port_input.cursor_visible(), nick_input.cursor_visible())
+        if events or blink != last_blink:
+            dirty = True
+        last_blink = blink
+
+        for e in events:
             if e.type == pygame.QUIT:
                 pygame.quit()
                 raise SystemExit
@@ -228,9 +451,13 @@ def join_connect_screen() -> tuple[str, int, str]:
                 nick = nick_input.text.strip()[:16] or "Player"
                 return ip, port, nick
 
+        if not dirty:
+            continue
+        dirty = False
+
         screen.fill((12, 12, 16))
-        screen.blit(big.render("JOIN", True, (240, 240, 250)), (60, 70))
-        screen.blit(font.render("Host IP gir ve CONNECT.", True, (160, 160, 175)), (60, 130))
+        screen.blit(render_text(big, "JOIN", (240, 240, 250)), (60, 70))
+        screen.blit(render_text(font, "Host IP gir ve CONNECT.", (160, 160, 175)), (60, 130))
 
         ip_input.draw(screen)
         port_input.draw(screen)
@@ -240,15 +467,76 @@ def join_connect_screen() -> tuple[str, int, str]:
         back_btn.draw(screen, True)
 
         if err:
-            screen.blit(font.render(err, True, (240, 120, 120)), (60, 570))
+            screen.blit(render_text(font, err, (240, 120, 120)), (60, 570))
+        pygame.display.flip()
+
+def connect_screen(conn, host_ip: str, port: int):
+    """
+    Progress of a net.Connector, drawn every frame while it works in the
+    background. Returns the peer, or None (cancelled with ESC / CANCEL, or
+    failed: the reason stays up for CONNECT_FAIL_SHOW_S or until a key / click).
+    """
+    screen = pygame.display.set_mode((900, 300))
+    pygame.display.set_caption("Connecting")
+    clock = pygame.time.Clock()
+    font = sys_font(18)
+    small = sys_font(15)
+    cancel_btn = Button(pygame.Rect(680, 220, 180, 48), font, "CANCEL")
+    failed_at = None
+
+    while True:
+        clock.tick(60)
+        for e in pygame.event.get():
+            if e.type == pygame.QUIT:
+                conn.cancel()
+                pygame.quit()
+                raise SystemExit
+            if failed_at is not None:
+                if e.type in (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN):
+                    return None
+            elif cancel_btn.is_clicked(e) or (e.type == pygame.KEYDOWN and e.key == pygame.K_ESCAPE):
+                conn.cancel()
+                return None
+
+        if failed_at is None and conn.done:
+            if conn.peer is not None:
+                return conn.peer
+            failed_at = time.time()
+            cancel_btn.text = "BACK"
+        if failed_at is not None and time.time() - failed_at >= CONNECT_FAIL_SHOW_S:
+            return None
+
+        screen.fill((12, 12, 16))
+        if failed_at is None:
+            elapsed = time.monotonic() - conn.started
+            dots = "." * (int(elapsed * 3) % 4)
+            screen.blit(render_text(font, "CONNECTING" + dots, (240, 240, 250)), (30, 40))
+            screen.blit(render_text(font, f"{host_ip}:{port}", (200, 200, 210)), (30, 80))
+            screen.blit(render_text(small, fit_text(small, conn.status, 820), (160, 160, 175)), (30, 120))
+            # time left until the connect timeout
+            bar = pygame.Rect(30, 160, 620, 8)
+            pygame.draw.rect(screen, (50, 50, 62), bar)
+            done = min(1.0, elapsed / conn.timeout_s) if conn.timeout_s > 0 else 1.0
+            pygame.draw.rect(screen, (160, 160, 190), pygame.Rect(bar.x, bar.y, int(bar.width * done), bar.height))
+            if len(conn.attempts) > 1:
+                tried = fit_text(small, "tried: " + ", ".join(conn.attempts), 620)
+                screen.blit(render_text(small, tried, (120, 120, 135)), (30, 185))
+            hint = "ESC = cancel"
+        else:
+            screen.blit(render_text(font, "CONNECT FAILED", (240, 120, 120)), (30, 40))
+            screen.blit(render_text(font, f"{host_ip}:{port}", (200, 200, 210)), (30, 80))
+            screen.blit(render_text(small, fit_text(small, conn.error or "", 820), (200, 160, 160)), (30, 120))
+            hint = "any key = back"
+        screen.blit(render_text(small, hint, (120, 120, 135)), (30, 240))
+        cancel_btn.draw(screen, True)
         pygame.display.flip()
 
 def client_lobby_screen(peer, host_ip: str, port: int, nickname: str) -> tuple[float, int]:
     screen = pygame.display.set_mode((1000, 650))
     pygame.display.set_caption("Tetris Lobby (Client)")
     clock = pygame.time.Clock()
-    font = pygame.font.SysFont("consolas", 20)
-    big = pygame.font.SysFont("consolas", 34)
+    font = sys_font(20)
+    big = sys_font(34)
 
     my_id = None
     roster = {1: "Host"}
@@ -270,8 +558,12 @@ def client_lobby_screen(peer, host_ip: str, port: int, nickname: str) -> tuple[f
     ready_btn = Button(pygame.Rect(60, 520, 220, 56), font, "READY")
     back_btn = Button(pygame.Rect(300, 520, 140, 56), font, "BACK")
 
+    dirty = True
     while True:
         clock.tick(60)
+        events = wait_events(0 if dirty else NET_POLL_S)
+        if events or peer.inbox:
+            dirty = True
 
         while peer.inbox:
             msg = peer.inbox.popleft()
@@ -286,7 +578,7 @@ def client_lobby_screen(peer, host_ip: str, port: int, nickname: str) -> tuple[f
             elif t == "start":
                 started_at = float(msg.get("at", time.time()))
 
-        for e in pygame.event.get():
+        for e in events:
             if e.type == pygame.QUIT:
                 peer.close()
                 pygame.quit()
@@ -306,57 +598,84 @@ def client_lobby_screen(peer, host_ip: str, port: int, nickname: str) -> tuple[f
                 peer.send({"t": "hello", "name": nickname})
             return started_at, my_id
 
+        if not dirty:
+            continue
+        dirty = False
+
         screen.fill((12, 12, 16))
-        screen.blit(big.render("LOBBY (CLIENT)", True, (240, 240, 250)), (60, 60))
-        screen.blit(font.render(f"Connected to: {host_ip}:{port}   (your id: {my_id})", True, (200, 200, 210)), (60, 120))
-        screen.blit(font.render(f"Your nickname: {nickname}", True, (200, 200, 210)), (60, 150))
-        screen.blit(font.render("Press READY, wait for host START.", True, (160, 160, 175)), (60, 190))
+        screen.blit(render_text(big, "LOBBY (CLIENT)", (240, 240, 250)), (60, 60))
+        screen.blit(render_text(font, f"Connected to: {host_ip}:{port}   (your id: {my_id})", (200, 200, 210)), (60, 120))
+        screen.blit(render_text(font, f"Your nickname: {nickname}", (200, 200, 210)), (60, 150))
+        screen.blit(render_text(font, "Press READY, wait for host START.", (160, 160, 175)), (60, 190))
 
         ready_btn.draw(screen, True)
         back_btn.draw(screen, True)
 
         pygame.draw.rect(screen, (18, 18, 22), pygame.Rect(560, 100, 380, 510), border_radius=10)
         pygame.draw.rect(screen, (70, 70, 86), pygame.Rect(560, 100, 380, 510), 2, border_radius=10)
-        screen.blit(font.render("Connected players:", True, (220, 220, 230)), (575, 115))
+        screen.blit(render_text(font, "Connected players:", (220, 220, 230)), (575, 115))
 
         y2 = 155
         line_h = 30
         max_w = 380 - 30
-        for pid in sorted(roster.keys())[:MAX_PLAYERS]:
+        shown, more = clip_list(sorted(roster.keys()), (610 - 10 - y2) // line_h)
+        for pid in shown:
             nm = str(roster[pid]) + (" (YOU)" if pid == my_id else "")
             nm = fit_text(font, nm, max_w - 50)
-            screen.blit(font.render(f"{pid}: {nm}", True, (200, 200, 210)), (575, y2))
+            screen.blit(render_text(font, f"{pid}: {nm}", (200, 200, 210)), (575, y2))
             y2 += line_h
+        if more:
+            screen.blit(render_text(font, f"+{more} more", (150, 150, 165)), (575, y2))
 
         pygame.display.flip()
 
 def countdown_screen(start_at: float, title: str = "Game starting"):
     screen = pygame.display.get_surface()
     clock = pygame.time.Clock()
-    big = pygame.font.SysFont("consolas", 44)
-    font = pygame.font.SysFont("consolas", 20)
+    big = sys_font(44)
+    font = sys_font(20)
 
+    shown = None
     while True:
         clock.tick(60)
-        for e in pygame.event.get():
+        left = start_at - time.time()
+        # wake on the next 0.1s tick (or the start moment), whichever is first
+        events = wait_events(min(left, left % 0.1 + 0.001) if left > 0 else 0)
+        for e in events:
             if e.type == pygame.QUIT:
                 pygame.quit()
                 raise SystemExit
         left = start_at - time.time()
         if left <= 0:
             return
+        label = f"{left:0.1f}s"
+        if label == shown and not events:
+            continue
+        shown = label
         screen.fill((12, 12, 16))
-        screen.blit(big.render(title, True, (240, 240, 250)), (60, 60))
-        screen.blit(big.render(f"{left:0.2f}s", True, (240, 240, 250)), (60, 120))
-        screen.blit(font.render("Everyone will start together.", True, (160, 160, 175)), (60, 200))
+        screen.blit(render_text(big, title, (240, 240, 250)), (60, 60))
+        screen.blit(render_text(big, label, (240, 240, 250)), (60, 120))
+        screen.blit(render_text(font, "Everyone will start together.", (160, 160, 175)), (60, 200))
         pygame.display.flip()
 
-def show_ranking_screen(end_packet: dict, my_id: int):
+def show_ranking_screen(end_packet: dict, my_id: int, rematch=None, is_host: bool = False,
+                        killcam=None) -> float:
+    """
+    Without `rematch`: any of ESC / Enter / Space leaves (returns 0.0).
+    With it the room stays open: rematch(pressed) is polled every NET_POLL_S
+    (pressed = host hit R/Enter) and returns the next start time once a rematch
+    is scheduled, 0.0 when the room is gone, None while still waiting.
+    killcam: killcam.MatchHistory of the match, replayed next to the ranking.
+    """
     screen = pygame.display.get_surface()
     clock = pygame.time.Clock()
-    big = pygame.font.SysFont("consolas", 44)
-    font = pygame.font.SysFont("consolas", 22)
-    small = pygame.font.SysFont("consolas", 18)
+    big = sys_font(44)
+    font = sys_font(22)
+    small = sys_font(18)
+    view = None
+    if killcam is not None and len(killcam.frames) >= 2:
+        killcam.freeze()
+        view = KillcamView(killcam)
 
     winner = end_packet.get("winner")
     ranking = end_packet.get("ranking", [])
@@ -365,31 +684,67 @@ def show_ranking_screen(end_packet: dict, my_id: int):
     def name_of(pid):
         return str(roster.get(pid, f"Player{pid}"))
 
+    dirty = True
     while True:
-        clock.tick(60)
-        for e in pygame.event.get():
+        dt = clock.tick(60) / 1000.0
+        playing = view is not None and view.playing
+        events = wait_events(0 if dirty or playing else (IDLE_WAKE_S if rematch is None else NET_POLL_S))
+        dirty = dirty or playing or bool(events)
+        pressed = False
+        if view is not None:
+            view.advance(dt)
+        for e in events:
             if e.type == pygame.QUIT:
-                return
-            if e.type == pygame.KEYDOWN and e.key in (pygame.K_ESCAPE, pygame.K_RETURN, pygame.K_SPACE):
-                return
+                return 0.0
+            if view is not None and view.handle(e):
+                continue
+            if e.type != pygame.KEYDOWN:
+                continue
+            if rematch is None and e.key in (pygame.K_ESCAPE, pygame.K_RETURN, pygame.K_SPACE):
+                return 0.0
+            if e.key == pygame.K_ESCAPE:
+                return 0.0
+            if e.key in (pygame.K_r, pygame.K_RETURN, pygame.K_KP_ENTER):
+                pressed = True
+
+        if rematch is not None:
+            start_at = rematch(pressed)
+            if start_at is not None:
+                return start_at
+
+        if not dirty:
+            continue
+        dirty = False
 
         screen.fill((12, 12, 16))
-        screen.blit(big.render("GAME OVER", True, (240, 240, 250)), (60, 50))
+        screen.blit(render_text(big, "GAME OVER", (240, 240, 250)), (60, 50))
 
         if winner is not None:
-            screen.blit(font.render(f"WINNER: {winner} - {name_of(winner)}", True, (200, 255, 200)), (60, 120))
+            screen.blit(render_text(font, f"WINNER: {winner} - {name_of(winner)}", (200, 255, 200)), (60, 120))
         else:
-            screen.blit(font.render("Winner yok (tek kisi bitti).", True, (200, 200, 210)), (60, 120))
+            screen.blit(render_text(font, "Winner yok (tek kisi bitti).", (200, 200, 210)), (60, 120))
 
-        screen.blit(font.render("RANKING:", True, (220, 220, 230)), (60, 170))
+        screen.blit(render_text(font, "RANKING:", (220, 220, 230)), (60, 170))
         y = 210
-        for i, pid in enumerate(ranking, start=1):
+        shown, more = clip_list(ranking, (screen.get_height() - 70 - y) // 26)
+        for i, pid in enumerate(shown, start=1):
             you = " (YOU)" if pid == my_id else ""
-            screen.blit(small.render(f"{i}. {pid} - {name_of(pid)}{you}", True, (200, 200, 210)), (60, y))
+            screen.blit(render_text(small, f"{i}. {pid} - {name_of(pid)}{you}", (200, 200, 210)), (60, y))
             y += 26
+        if more:
+            screen.blit(render_text(small, f"+{more} more", (150, 150, 165)), (60, y))
+
+        if view is not None:
+            sw, sh = screen.get_size()
+            view.draw(screen, pygame.Rect(int(sw * 0.42), 110, int(sw * 0.55), sh - 200), small)
 
-        screen.blit(small.render("ESC / Enter / Space: CIKIS", True, (150, 150, 170)),
-                    (60, screen.get_height() - 60))
+        if rematch is None:
+            hint = "ESC / Enter / Space: CIKIS"
+        elif is_host:
+            hint = "R / Enter: REMATCH   ESC: CIKIS (oda kapanir)"
+        else:
+            hint = "Host rematch bekleniyor...   ESC: CIKIS"
+        screen.blit(render_text(small, hint, (150, 150, 170)), (60, screen.get_height() - 60))
         pygame.display.flip()
 
 
@@ -397,10 +752,12 @@ def show_ranking_screen(end_packet: dict, my_id: int):
 # IN-GAME HUD / LAYOUT
 # ---------------------------
 
+@lru_cache(maxsize=8)
 def compute_game_layout(w: int, h: int) -> dict:
     """
     Paint mock'undaki gibi:
     [sol oyuncular] [MAIN BOARD] [NEXT+HOLD] [RANK PANEL]
+    Pencere boyutuna göre cache'lenir; dönen dict/Rect'ler paylaşılır, değiştirme.
     """
     pad = 16
     gap = 14
@@ -475,6 +832,90 @@ def compute_game_layout(w: int, h: int) -> dict:
     }
 
 
+# Opponent grid for rooms above 7 opponents: boards shrink down to GRID_MIN_CELL px
+# per cell, past that the grid pages (PgUp/PgDn) instead of shrinking further.
+GRID_MIN_CELL = 4
+GRID_GAP = 6
+GRID_HEAD_H = 14     # name line above each grid slot
+SLOT_PAD = 16        # board padding in a classic opponent slot
+GRID_PAD = 2         # ... in a grid slot
+
+# Cell size of an opponent slot (px) -> level of detail it subscribes at
+# (replication.LOD_LEVELS). From LOD_FULL_CELL up colours, holes and the falling
+# piece are still visible, so those slots get the full stream (that covers every
+# slot down to GRID_MIN_CELL); only smaller ones fall back to column heights,
+# and below LOD_SKY_CELL the board does not even fit its slot.
+LOD_FULL_CELL = 4
+LOD_SKY_CELL = 2
+
+
+def _grid_cell(w: int, h: int, k: int) -> tuple[int, int, int]:
+    """Best (cell size, cols, rows) for k boards in a w x h area."""
+    best = (0, 1, k)
+    for cols in range(1, k + 1):
+        rows = -(-k // cols)
+        sw = (w - GRID_GAP * (cols - 1)) // cols
+        sh = (h - GRID_GAP * (rows - 1)) // rows
+        c = min((sw - 4) // 10, (sh - GRID_HEAD_H - 4) // 20)
+        if c > best[0]:
+            best = (c, cols, rows)
+    return best
+
+
+@lru_cache(maxsize=32)
+def compute_opponent_slots(w: int, h: int, n: int) -> tuple[tuple, bool]:
+    """
+    One page of opponent slots for n opponents -> (slots, grid).
+    Up to 7: the fixed 3+4 slots of compute_game_layout. More: an even grid over
+    the left panel with as many slots per page as fit at GRID_MIN_CELL.
+    Cache'li; dönen Rect'leri değiştirme.
+    """
+    layout = compute_game_layout(w, h)
+    if n <= 7:
+        return tuple(layout["left_big"] + layout["left_small"]), False
+
+    lr = layout["left_rect"]
+    # bottom strip keeps the page indicator
+    return compute_grid_slots(lr.x + 10, lr.y + 10, lr.width - 20, lr.height - 44, n), True
+
+
+@lru_cache(maxsize=32)
+def compute_grid_slots(x: int, y: int, w: int, h: int, n: int) -> tuple:
+    """One page of board slots for n boards in the given area (paged below GRID_MIN_CELL)."""
+    per_page = 1
+    for k in range(n, 0, -1):
+        if _grid_cell(w, h, k)[0] >= GRID_MIN_CELL:
+            per_page = k
+            break
+    _c, cols, rows = _grid_cell(w, h, per_page)
+    sw = (w - GRID_GAP * (cols - 1)) // cols
+    sh = (h - GRID_GAP * (rows - 1)) // rows
+    return tuple(
+        pygame.Rect(x + (i % cols) * (sw + GRID_GAP), y + (i // cols) * (sh + GRID_GAP), sw, sh)
+        for i in range(per_page)
+    )
+
+
+def lod_for_cell(c: int) -> str:
+    if c >= LOD_FULL_CELL:
+        return "full"
+    return "sky" if c >= LOD_SKY_CELL else "sum"
+
+
+@lru_cache(maxsize=32)
+def compute_slot_lods(w: int, h: int, n: int) -> tuple:
+    """Level of detail per slot of compute_opponent_slots (board fitted like game.py does)."""
+    slots, grid = compute_opponent_slots(w, h, n)
+    out = []
+    for r in slots:
+        if grid:
+            aw, ah = r.width - 2 * GRID_PAD, r.height - GRID_HEAD_H - 2 * GRID_PAD
+        else:
+            aw, ah = r.width - 2 * SLOT_PAD, r.height - 2 * SLOT_PAD
+        out.append(lod_for_cell(min(max(10, aw) // W, max(10, ah) // H)))
+    return tuple(out)
+
+
 def draw_panel(surf, rect: pygame.Rect, title: str, font: pygame.font.Font,
                border=(220, 40, 40), fill=(10, 10, 14), title_color=(220, 40, 40)):
     pygame.draw.rect(surf, fill, rect, border_radius=10)